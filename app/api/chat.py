@@ -1,36 +1,350 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.connection import get_db
-from app.schemas.chat import ChatRequest, ChatResponse, Source
-from app.services.embedding_service import EmbeddingService
+from app.database.connection import get_read_db, ReadSessionLocal
+from app.database.embedding_store import EmbeddingStore
+from app.schemas.chat import ChatMode, ChatRequest, ChatResponse, Source, BatchChatRequest, BatchChatResult
+from app.services.embedding_service import EmbeddingService, get_embedding_service
 from app.services.vector_search import VectorSearch
 from app.services.llm_service import LLMService
-from app.models.chat_history import ChatHistory
+from app.services.query_filters import extract_filters, normalize_filters
+from app.services.answer_cache import get_answer_cache
+from app.services.admission import Overloaded, Priority, Ticket, get_llm_scheduler, get_rate_limiter
+from app.services.conversation import ConversationMemory, history_writer
+from app.utils.metrics import timed, CACHE_LOOKUPS, CHAT_MODES
+from config import settings
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import math
+import time
 import uuid
 
 router = APIRouter()
 
-@router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
-    embed = EmbeddingService()
+_DONE = object()
+
+def _check_rate(request: ChatRequest, http: Request):
+    """429 jika sesi (atau IP klien tanpa sesi) melewati token bucket"""
+    key = str(request.session_id) if request.session_id else (http.client.host if http.client else "-")
+    wait = get_rate_limiter().check(key)
+    if wait:
+        raise HTTPException(429, "Terlalu banyak pertanyaan, coba lagi sebentar",
+                            headers={"Retry-After": str(math.ceil(wait))})
+
+async def _llm_slot(mode: ChatMode = ChatMode.ANSWER, started: float = None) -> Optional[Ticket]:
+    """Slot generate.
+
+    answer: 503 + Retry-After jika antrian LLM penuh atau terlalu lama.
+    auto: None (layani sumber saja) jika antrian penuh atau CHAT_AUTO_BUDGET_MS
+    sejak request masuk habis sebelum slot didapat.
+    """
+    timeout = None
+    if mode == ChatMode.AUTO:
+        timeout = settings.CHAT_AUTO_BUDGET_MS / 1000 - (time.monotonic() - started)
+        if timeout <= 0:
+            return None
+    try:
+        return await get_llm_scheduler().acquire(Priority.INTERACTIVE, timeout=timeout)
+    except Overloaded as e:
+        if mode == ChatMode.AUTO:
+            return None
+        raise HTTPException(503, "Server sedang sibuk, coba lagi nanti",
+                            headers={"Retry-After": str(e.retry_after)})
+
+def _cache_scope(request: ChatRequest) -> str:
+    return request.filters.model_dump_json() if request.filters else ""
+
+async def _standalone_query(request: ChatRequest, db: AsyncSession, llm: LLMService) -> Tuple[uuid.UUID, str]:
+    """Session id final + pertanyaan mandiri (pertanyaan lanjutan ditulis ulang dari riwayat)"""
+    # Mode retrieve tidak menyentuh LLM sama sekali, pertanyaan dipakai apa adanya
+    if request.session_id is None or request.mode == ChatMode.RETRIEVE:
+        return request.session_id or uuid.uuid4(), request.query
+
+    memory = ConversationMemory(llm)
+    with timed("history.load"):
+        conversation = await memory.load(db, request.session_id)
+    await db.close()  # rewrite bisa memanggil LLM, koneksi tidak perlu ditahan
+    return request.session_id, await memory.rewrite(request.query, conversation)
+
+async def _retrieve(request: ChatRequest, db: AsyncSession, qemb: List[float], query: str,
+                    store: EmbeddingStore) -> List[Dict]:
     search = VectorSearch()
-    llm = LLMService()
-    
-    qemb = await embed.generate_embedding(request.query)
-    chunks = await search.search_similar(qemb, db)
-    
+
+    if request.filters:
+        filters = normalize_filters(request.filters.model_dump())
+        auto_filters = False
+    else:
+        filters = normalize_filters(extract_filters(query)) if settings.AUTO_QUERY_FILTERS else {}
+        auto_filters = bool(filters)
+
+    chunks = await search.search_similar(qemb, db, query_text=query, filters=filters, store=store)
+    if not chunks and auto_filters:
+        # Filter tebakan terlalu sempit (metadata chunk sering tidak lengkap), ulangi tanpa filter
+        chunks = await search.search_similar(qemb, db, query_text=query, store=store)
+    # Kembalikan koneksi ke pool sekarang, jangan ditahan selama generate LLM
+    await db.close()
+
     if not chunks:
         raise HTTPException(404, "No relevant hadis found")
-    
-    answer = await llm.generate_response(request.query, chunks)
-    sources = [Source(chunk_id=c['chunk_id'], text=c['text'][:200], 
-                      page_number=c['page_number'], similarity_score=c['similarity']) 
-               for c in chunks]
-    
-    sid = request.session_id or str(uuid.uuid4())
-    hist = ChatHistory(session_id=uuid.UUID(sid) if request.session_id else uuid.uuid4(),
-                       user_query=request.query, bot_response=answer, sources=[])
-    db.add(hist)
-    await db.commit()
-    
-    return ChatResponse(answer=answer, sources=sources, session_id=sid)
\ No newline at end of file
+    return chunks
+
+def _sources(chunks: List[Dict], full_text: bool = False) -> List[Source]:
+    return [Source(chunk_id=c['chunk_id'], text=c['text'] if full_text else c['text'][:200],
+                   page_number=c['page_number'], similarity_score=c['similarity'],
+                   metadata=c.get('metadata') or {})
+            for c in chunks]
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/", response_model=ChatResponse)
+async def chat(request: ChatRequest, http: Request, db: AsyncSession = Depends(get_read_db),
+               embed: EmbeddingService = Depends(get_embedding_service)):
+    started = time.monotonic()
+    _check_rate(request, http)
+    llm = LLMService()
+    cache = get_answer_cache() if settings.ANSWER_CACHE_ENABLED and request.mode != ChatMode.RETRIEVE else None
+    scope = _cache_scope(request)
+    sid, query = await _standalone_query(request, db, llm)
+    served = request.mode
+
+    # Pertanyaan identik: lewati embedding, retrieval dan LLM sekaligus
+    hit = cache.get_exact(query, scope) if cache else None
+    if hit:
+        answer, chunks = hit
+        CACHE_LOOKUPS.labels("exact_hit").inc()
+    else:
+        with timed("embed"):
+            qemb = await embed.generate_embedding(query)
+        chunks = await _retrieve(request, db, qemb, query, embed.store)
+
+        answer = cache.get_similar(qemb, chunks, scope) if cache else None
+        if answer is not None:
+            CACHE_LOOKUPS.labels("semantic_hit").inc()
+        elif request.mode != ChatMode.RETRIEVE:
+            if cache:
+                CACHE_LOOKUPS.labels("miss").inc()
+            # Hanya generate baru yang antri slot LLM; cache hit di atas tidak
+            ticket = await _llm_slot(request.mode, started)
+            if ticket is None:
+                served = ChatMode.RETRIEVE
+            else:
+                with ticket:
+                    answer = await llm.generate_response(query, chunks)
+                if cache and not answer.startswith(LLMService.ERROR_PREFIX):
+                    cache.put(query, qemb, chunks, answer, scope)
+
+    served = ChatMode.ANSWER if answer is not None else served
+    CHAT_MODES.labels(request.mode.value, served.value).inc()
+    sources = _sources(chunks, full_text=request.mode != ChatMode.ANSWER)
+
+    # Disimpan di background (batch), bukan commit di jalur respons; tanpa jawaban tidak dicatat
+    if answer is not None:
+        history_writer.write(sid, request.query, answer, [s.model_dump() for s in sources],
+                             rewritten_query=query)
+
+    return ChatResponse(answer=answer, sources=sources, session_id=str(sid), mode=served)
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, http: Request, db: AsyncSession = Depends(get_read_db),
+                      embed: EmbeddingService = Depends(get_embedding_service)):
+    """Server-Sent Events: event `sources` dulu, lalu `token` bertahap, ditutup `done`.
+
+    Tanpa jawaban (mode retrieve, atau auto yang turun ke retrieve) langsung
+    `sources` lalu `done`; `done` membawa mode yang dilayani.
+    """
+    started = time.monotonic()
+    _check_rate(request, http)
+    llm = LLMService()
+    cache = get_answer_cache() if settings.ANSWER_CACHE_ENABLED and request.mode != ChatMode.RETRIEVE else None
+    scope = _cache_scope(request)
+    sid, query = await _standalone_query(request, db, llm)
+
+    qemb, cached = None, None
+    hit = cache.get_exact(query, scope) if cache else None
+    if hit:
+        cached, chunks = hit
+        CACHE_LOOKUPS.labels("exact_hit").inc()
+    else:
+        with timed("embed"):
+            qemb = await embed.generate_embedding(query)
+        chunks = await _retrieve(request, db, qemb, query, embed.store)
+        cached = cache.get_similar(qemb, chunks, scope) if cache else None
+        if cache:
+            CACHE_LOOKUPS.labels("semantic_hit" if cached is not None else "miss").inc()
+    sources = [s.model_dump() for s in _sources(chunks, full_text=request.mode != ChatMode.ANSWER)]
+
+    # Slot diambil sebelum header dikirim supaya antrian penuh masih bisa dijawab 503
+    ticket = None
+    if cached is None and request.mode != ChatMode.RETRIEVE:
+        ticket = await _llm_slot(request.mode, started)
+    generate = ticket is not None
+    served = ChatMode.ANSWER if cached is not None or generate else ChatMode.RETRIEVE
+    CHAT_MODES.labels(request.mode.value, served.value).inc()
+
+    async def events():
+        yield _sse("sources", sources)
+
+        if cached is not None:
+            # Cache hit: kirim jawaban utuh sebagai satu token
+            answer = cached
+            yield _sse("token", {"text": cached})
+        elif generate:
+            parts = []
+            try:
+                async for token in llm.stream_response(query, chunks):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+            except Exception as e:
+                yield _sse("error", {"detail": f"{LLMService.ERROR_PREFIX}: {str(e)}"})
+                return
+            finally:
+                ticket.release()
+            answer = "".join(parts).strip()
+            if cache:
+                cache.put(query, qemb, chunks, answer, scope)
+        else:
+            answer = None
+
+        if answer is not None:
+            history_writer.write(sid, request.query, answer, sources, rewritten_query=query)
+        yield _sse("done", {"session_id": str(sid), "mode": served.value})
+
+    # background: slot tetap dilepas jika klien putus sebelum stream sempat dimulai
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(ticket.release) if ticket else None)
+
+async def _retrieve_many(request: BatchChatRequest, queries: List[str], qembs: List[List[float]],
+                         store: EmbeddingStore) -> List[List[Dict]]:
+    """_retrieve untuk satu potong batch: satu search_many per kelompok filter"""
+    search = VectorSearch()
+    groups: Dict[str, Tuple[Dict, List[int]]] = {}
+    auto = []
+    for i, query in enumerate(queries):
+        if request.filters:
+            filters = normalize_filters(request.filters.model_dump())
+        else:
+            filters = normalize_filters(extract_filters(query)) if settings.AUTO_QUERY_FILTERS else {}
+            if filters:
+                auto.append(i)
+        key = json.dumps(filters, sort_keys=True, default=str)
+        groups.setdefault(key, (filters, []))[1].append(i)
+
+    results: List[List[Dict]] = [[] for _ in queries]
+    async with ReadSessionLocal() as db:
+        for filters, idxs in groups.values():
+            found = await search.search_many([qembs[i] for i in idxs], db, [queries[i] for i in idxs],
+                                             filters=filters, store=store)
+            for i, chunks in zip(idxs, found):
+                results[i] = chunks
+
+        # Sama seperti _retrieve: filter tebakan tanpa hasil diulang tanpa filter
+        retry = [i for i in auto if not results[i]]
+        if retry:
+            found = await search.search_many([qembs[i] for i in retry], db, [queries[i] for i in retry],
+                                             store=store)
+            for i, chunks in zip(retry, found):
+                results[i] = chunks
+    return results
+
+async def _batch_results(request: BatchChatRequest, embed: EmbeddingService):
+    llm = LLMService()
+    cache = get_answer_cache() if settings.ANSWER_CACHE_ENABLED else None
+    scope = _cache_scope(request)
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(settings.CHAT_BATCH_LLM_CONCURRENCY)
+    tasks = set()
+
+    async def answer(item: BatchChatResult, qemb: List[float], chunks: List[Dict]):
+        try:
+            text = cache.get_similar(qemb, chunks, scope) if cache else None
+            if text is None:
+                # Prioritas BATCH: chat interaktif didahulukan saat berebut slot
+                with await get_llm_scheduler().acquire(Priority.BATCH):
+                    text = await llm.generate_response(item.query, chunks)
+                if text.startswith(LLMService.ERROR_PREFIX):
+                    item.error = text
+                    return
+                if cache:
+                    cache.put(item.query, qemb, chunks, text, scope)
+            item.answer = text
+        except Exception as e:
+            # Antrian LLM penuh (Overloaded) atau error lain: gagal per item,
+            # jangan sampai gather membatalkan sisa batch
+            item.error = f"Generasi gagal: {e}"
+        finally:
+            slots.release()
+            results.put_nowait(item)
+
+    async def produce():
+        try:
+            for start in range(0, len(request.queries), settings.CHAT_BATCH_SIZE):
+                items = [BatchChatResult(index=start + i, id=q.id, query=q.query)
+                         for i, q in enumerate(request.queries[start:start + settings.CHAT_BATCH_SIZE])]
+
+                # Pertanyaan identik yang sudah pernah dijawab tidak perlu embedding & retrieval
+                pending = []
+                for item in items:
+                    hit = cache.get_exact(item.query, scope) if cache and request.generate else None
+                    if hit:
+                        item.answer, chunks = hit
+                        item.sources = _sources(chunks)
+                        results.put_nowait(item)
+                    else:
+                        pending.append(item)
+                if not pending:
+                    continue
+
+                try:
+                    with timed("embed"):
+                        qembs = await embed.generate_embeddings_batch([item.query for item in pending])
+                    found = await _retrieve_many(request, [item.query for item in pending], qembs, embed.store)
+                except Exception as e:
+                    for item in pending:
+                        item.error = f"Retrieval gagal: {e}"
+                        results.put_nowait(item)
+                    continue
+
+                for item, qemb, chunks in zip(pending, qembs, found):
+                    item.sources = _sources(chunks)
+                    if not chunks:
+                        item.error = "No relevant hadis found"
+                        results.put_nowait(item)
+                    elif not request.generate:
+                        results.put_nowait(item)
+                    else:
+                        # Menunggu slot di sini juga menahan retrieval potongan berikutnya
+                        await slots.acquire()
+                        task = asyncio.create_task(answer(item, qemb, chunks))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*list(tasks))
+        finally:
+            results.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await results.get()) is not _DONE:
+            yield item.model_dump_json() + "\n"
+        await producer
+    finally:
+        # Klien memutus koneksi: hentikan retrieval & generate yang tersisa
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+@router.post("/batch")
+async def chat_batch(request: BatchChatRequest, embed: EmbeddingService = Depends(get_embedding_service)):
+    """Banyak pertanyaan sekaligus, hasil di-stream sebagai NDJSON (satu BatchChatResult per baris).
+
+    Tiap CHAT_BATCH_SIZE pertanyaan memakai satu panggilan embedding dan satu
+    SQL retrieval per kelompok filter; generate LLM berjalan paralel paling
+    banyak CHAT_BATCH_LLM_CONCURRENCY. Tanpa sesi/riwayat chat.
+    """
+    if len(request.queries) > settings.CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(413, f"Maksimal {settings.CHAT_BATCH_MAX_QUERIES} pertanyaan per batch")
+    return StreamingResponse(_batch_results(request, embed), media_type="application/x-ndjson")
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.upload import save_pdf
+from app.database.connection import get_db
+from app.models.document import HadisDocument, DocumentStatus, DocumentJob
+from app.services.documents import (list_documents, count_chunks, delete_document,
+                                    can_rechunk, enqueue_job)
+from app.services.ingestion_worker import ingestion_worker
+from app.services.pdf_processor import PDFProcessor
+from app.schemas.document import DocumentResponse, RechunkRequest, DeleteDocumentResponse
+from typing import List, Optional
+import os
+
+router = APIRouter()
+
+def _response(doc: HadisDocument, chunks: int) -> DocumentResponse:
+    processed = doc.processed_pages or 0
+    return DocumentResponse(
+        document_id=doc.id,
+        filename=doc.filename,
+        status=doc.status.value,
+        upload_date=doc.upload_date,
+        total_pages=doc.total_pages,
+        processed_pages=processed,
+        progress=min(processed / doc.total_pages, 1.0) if doc.total_pages else 0.0,
+        error=doc.error,
+        collection=doc.collection,
+        job=doc.job.value,
+        chunks=chunks
+    )
+
+async def _get_idle(db: AsyncSession, document_id: int) -> HadisDocument:
+    doc = await db.get(HadisDocument, document_id)
+    if doc is None:
+        raise HTTPException(404, "Document not found")
+    if doc.status == DocumentStatus.PROCESSING:
+        raise HTTPException(409, "Dokumen sedang diproses")
+    return doc
+
+@router.get("/", response_model=List[DocumentResponse])
+async def list_all(status: Optional[DocumentStatus] = None, collection: Optional[str] = None,
+                   limit: int = 100, offset: int = 0, db: AsyncSession = Depends(get_db)):
+    rows = await list_documents(db, status, collection, min(limit, 1000), offset)
+    return [_response(r["document"], r["chunks"]) for r in rows]
+
+@router.get("/{document_id}", response_model=DocumentResponse)
+async def get_document(document_id: int, db: AsyncSession = Depends(get_db)):
+    doc = await db.get(HadisDocument, document_id)
+    if doc is None:
+        raise HTTPException(404, "Document not found")
+    return _response(doc, await count_chunks(db, document_id))
+
+@router.delete("/{document_id}", response_model=DeleteDocumentResponse)
+async def delete(document_id: int, db: AsyncSession = Depends(get_db)):
+    """Hapus dokumen beserta chunk dan embedding-nya"""
+    doc = await _get_idle(db, document_id)
+    return DeleteDocumentResponse(document_id=document_id, deleted_chunks=await delete_document(db, doc))
+
+@router.post("/{document_id}/rechunk", response_model=DocumentResponse, status_code=202)
+async def rechunk(document_id: int, request: RechunkRequest = RechunkRequest(),
+                  db: AsyncSession = Depends(get_db)):
+    """Chunk ulang dari teks halaman tersimpan dengan setting chunker terbaru (job background)"""
+    doc = await _get_idle(db, document_id)
+    if not can_rechunk(doc):
+        raise HTTPException(409, "Teks halaman tidak tersimpan di page cache, gunakan replace dengan PDF-nya")
+    await enqueue_job(db, doc, DocumentJob.RECHUNK, collection=request.collection)
+    ingestion_worker.notify()
+    return _response(doc, await count_chunks(db, document_id))
+
+@router.put("/{document_id}", response_model=DocumentResponse, status_code=202)
+async def replace(document_id: int, response: Response, file: UploadFile = File(...),
+                  db: AsyncSession = Depends(get_db)):
+    """Ganti PDF dokumen; hanya chunk yang berubah yang di-embed dan ditukar (job background)"""
+    doc = await _get_idle(db, document_id)
+    path, content_hash = save_pdf(file)
+    if content_hash == doc.content_hash:
+        os.remove(path)
+        response.status_code = 200
+        return _response(doc, await count_chunks(db, document_id))
+
+    try:
+        await PDFProcessor().get_page_count(path)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(400, f"PDF tidak valid: {e}")
+
+    await enqueue_job(db, doc, DocumentJob.REPLACE, file_path=path)
+    ingestion_worker.notify()
+    return _response(doc, await count_chunks(db, document_id))
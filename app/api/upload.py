@@ -1,74 +1,91 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.connection import get_db
 from app.models.document import HadisDocument, DocumentStatus
-from app.models.chunk import HadisChunk
 from app.services.pdf_processor import PDFProcessor
-from app.services.chunker import HadisChunker
-from app.services.embedding_service import EmbeddingService
-from app.schemas.upload import UploadResponse
+from app.services.ingestion_worker import ingestion_worker
+from app.schemas.upload import UploadResponse, UploadStatusResponse
 from config import settings
-import os, shutil
+from typing import Optional, Tuple
+import hashlib, os, uuid
 
 router = APIRouter()
 
-@router.post("/", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+def save_pdf(file: UploadFile) -> Tuple[str, str]:
+    """Simpan upload ke UPLOAD_DIR; (path, SHA-256 isi file)"""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(400, "Only PDF")
-    
+
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    path = os.path.join(settings.UPLOAD_DIR, file.filename)
+    # File disimpan sampai job selesai, jadi nama harus unik
+    path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}_{file.filename}")
+    digest = hashlib.sha256()
     with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    
-    try:
-        pdf = PDFProcessor()
-        chunker = HadisChunker()
-        embed = EmbeddingService()
-        
-        data = await pdf.extract_text(path)
-        doc = HadisDocument(filename=file.filename, total_pages=data['total_pages'])
-        db.add(doc)
-        await db.flush()
-        
-        for page in data['pages']:
-            for chunk_data in await chunker.chunk_text(page['text'], page['page_number']):
-                emb = await embed.generate_embedding(chunk_data['text'])
-                chunk = HadisChunk(
-                    document_id=doc.id,
-                    chunk_text=chunk_data['text'],
-                    chunk_index=chunk_data['chunk_index'],
-                    page_number=chunk_data['page_number'],
-                    embedding=emb,
-                    chunk_metadata={}  # ← Ganti jadi chunk_metadata
-                )
-                db.add(chunk)
-        
-        doc.status = DocumentStatus.COMPLETED
-        await db.commit()
-        
+        for block in iter(lambda: file.file.read(1 << 20), b""):
+            digest.update(block)
+            f.write(block)
+    return path, digest.hexdigest()
+
+@router.post("/", response_model=UploadResponse, status_code=202)
+async def upload_pdf(response: Response, file: UploadFile = File(...),
+                     collection: Optional[str] = Form(None), db: AsyncSession = Depends(get_db)):
+    """Simpan PDF dan daftarkan job ingest; proses berjalan di background"""
+    path, content_hash = save_pdf(file)
+
+    # File identik (byte per byte) yang sudah diproses/diantrikan tidak di-ingest ulang
+    existing = (await db.execute(
+        select(HadisDocument)
+        .where(HadisDocument.content_hash == content_hash, HadisDocument.status != DocumentStatus.FAILED)
+        .order_by(HadisDocument.id)
+        .limit(1)
+    )).scalar_one_or_none()
+    if existing is not None:
+        os.remove(path)
+        response.status_code = 200
         return UploadResponse(
-            document_id=doc.id,
-            filename=doc.filename,
-            status=doc.status.value,
-            upload_date=doc.upload_date
+            document_id=existing.id,
+            filename=existing.filename,
+            status=existing.status.value,
+            upload_date=existing.upload_date,
+            total_pages=existing.total_pages,
+            duplicate=True
         )
+
+    try:
+        total_pages = await PDFProcessor().get_page_count(path)
     except Exception as e:
-        await db.rollback()
-        raise HTTPException(500, str(e))
-    finally:
         os.remove(path)
+        raise HTTPException(400, f"PDF tidak valid: {e}")
+
+    doc = HadisDocument(filename=file.filename, total_pages=total_pages, file_path=path,
+                        content_hash=content_hash, collection=collection)
+    db.add(doc)
+    await db.commit()
+    ingestion_worker.notify()
+
+    return UploadResponse(
+        document_id=doc.id,
+        filename=doc.filename,
+        status=doc.status.value,
+        upload_date=doc.upload_date,
+        total_pages=doc.total_pages
+    )
+
+@router.get("/{document_id}", response_model=UploadStatusResponse)
+async def upload_status(document_id: int, db: AsyncSession = Depends(get_db)):
+    doc = await db.get(HadisDocument, document_id)
+    if doc is None:
+        raise HTTPException(404, "Document not found")
 
-        for page in data['pages']:
-            for chunk_data in await chunker.chunk_text(page['text'], page['page_number']):
-                emb = await embed.generate_embedding(chunk_data['text'])
-                chunk = HadisChunk(
-                    document_id=doc.id,
-                    chunk_text=chunk_data['text'],
-                    chunk_index=chunk_data['chunk_index'],
-                    page_number=chunk_data['page_number'],
-                    embedding=emb,
-                    chunk_metadata=chunk_data.get('metadata', {})  # ← Simpan metadata
-                )
-                db.add(chunk)
\ No newline at end of file
+    processed = doc.processed_pages or 0
+    return UploadStatusResponse(
+        document_id=doc.id,
+        filename=doc.filename,
+        status=doc.status.value,
+        upload_date=doc.upload_date,
+        total_pages=doc.total_pages,
+        processed_pages=processed,
+        progress=min(processed / doc.total_pages, 1.0) if doc.total_pages else 0.0,
+        error=doc.error
+    )
@@ -0,0 +1,16 @@
+from typing import Iterable, List, Sequence
+from pgvector.asyncpg import register_vector
+from sqlalchemy.ext.asyncio import AsyncSession
+
+async def copy_records(db: AsyncSession, table: str, columns: List[str], records: Iterable[Sequence]):
+    """Bulk insert lewat asyncpg COPY (binary, termasuk kolom vector)"""
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+    
+    # Codec binary vector hanya dipasang selama COPY; ORM tetap memakai format teks
+    await register_vector(driver)
+    try:
+        await driver.copy_records_to_table(table, records=records, columns=columns)
+    finally:
+        await driver.reset_type_codec('vector', schema='public')
@@ -1,16 +1,65 @@
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from app.database.indexes import ensure_vector_index, search_param_sql, iterative_scan_sql
+from app.database.upgrade import upgrade_schema
 from config import settings
 
-DATABASE_URL = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(DATABASE_URL, echo=False)
+def _async_url(url: str) -> str:
+    return url.replace("postgresql://", "postgresql+asyncpg://")
+
+def _set_vector_search_params(dbapi_connection, connection_record):
+    # Default ef_search/probes per koneksi, jadi tidak perlu SET tiap query
+    statements = [sql for sql in (search_param_sql(), iterative_scan_sql()) if sql]
+    if statements:
+        cursor = dbapi_connection.cursor()
+        for sql in statements:
+            cursor.execute(sql)
+        cursor.close()
+
+def make_engine(url: str):
+    """Engine async dengan pool dari config.
+
+    Dialect asyncpg mem-prepare tiap statement dan menyimpannya per koneksi
+    (DB_STATEMENT_CACHE_SIZE), jadi query retrieval yang teks SQL-nya tetap
+    hanya di-parse/plan sekali per koneksi.
+    """
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+    new_engine = create_async_engine(
+        _async_url(url),
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": cache_size, "statement_cache_size": cache_size},
+    )
+    event.listen(new_engine.sync_engine, "connect", _set_vector_search_params)
+    return new_engine
+
+engine = make_engine(settings.DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+# Jalur baca (chat/search) bisa diarahkan ke replika; tanpa DATABASE_READ_URL sama dengan engine tulis
+read_engine = make_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
+ReadSessionLocal = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_read_db():
+    """Session read-only untuk endpoint yang tidak menulis (chat)"""
+    async with ReadSessionLocal() as session:
+        yield session
+
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        # Worker yang start bersamaan (tanpa preload) menjalankan DDL bergiliran
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('hadis_init_db'))"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+        await ensure_vector_index(conn)
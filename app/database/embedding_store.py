@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table, select
+from app.database.indexes import VECTOR_INDEX_NAME
+from app.models.chunk import HadisChunk
+from app.models.embedding_version import EmbeddingVersion, EmbeddingVersionStatus
+from config import settings
+
+# Tabel per versi dibuat saat migrasi, bukan lewat Base.metadata.create_all
+version_metadata = MetaData()
+
+@lru_cache(maxsize=None)
+def version_table(version: int, dim: int) -> Table:
+    return Table(
+        f"hadis_chunk_embeddings_v{version}", version_metadata,
+        Column("chunk_id", Integer, ForeignKey(HadisChunk.id, ondelete="CASCADE"), primary_key=True),
+        Column("embedding", Vector(dim), nullable=False),
+    )
+
+@dataclass(frozen=True)
+class EmbeddingStore:
+    """Lokasi vector satu versi embedding beserta model yang menghasilkannya"""
+    version: int
+    model: str
+    dim: int
+
+    @property
+    def is_base(self) -> bool:
+        return self.version == 0
+
+    @property
+    def table(self) -> Table:
+        return HadisChunk.__table__ if self.is_base else version_table(self.version, self.dim)
+
+    @property
+    def table_name(self) -> str:
+        return self.table.name
+
+    @property
+    def index_name(self) -> str:
+        return VECTOR_INDEX_NAME if self.is_base else f"ix_{self.table_name}"
+
+    @property
+    def column(self):
+        return HadisChunk.embedding if self.is_base else self.table.c.embedding
+
+    def join(self, query):
+        """Tambahkan join ke tabel vector (query harus sudah FROM hadis_chunks)"""
+        if self.is_base:
+            return query
+        return query.join(self.table, self.table.c.chunk_id == HadisChunk.id)
+
+    @classmethod
+    def base(cls) -> "EmbeddingStore":
+        return cls(0, settings.EMBEDDING_MODEL, HadisChunk.embedding.type.dim)
+
+    @classmethod
+    def from_version(cls, row: Optional[EmbeddingVersion]) -> "EmbeddingStore":
+        return cls(row.id, row.model, row.dim) if row else cls.base()
+
+
+_current: Optional[EmbeddingStore] = None
+
+def current_store() -> EmbeddingStore:
+    """Versi yang sedang dipakai proses ini (versi 0 sampai use_store dipanggil)"""
+    return _current or EmbeddingStore.base()
+
+def use_store(store: EmbeddingStore):
+    global _current
+    _current = store
+
+async def active_store(db) -> EmbeddingStore:
+    """Versi aktif menurut registry di DB"""
+    row = (await db.execute(
+        select(EmbeddingVersion).where(EmbeddingVersion.status == EmbeddingVersionStatus.ACTIVE)
+    )).scalar_one_or_none()
+    return EmbeddingStore.from_version(row)
@@ -0,0 +1,57 @@
+from typing import Optional
+from sqlalchemy import text
+from config import settings
+
+VECTOR_INDEX_NAME = "ix_hadis_chunks_embedding"
+
+def _index_kind() -> str:
+    return settings.VECTOR_INDEX_TYPE.lower()
+
+def vector_index_ddl(table: str = "hadis_chunks", column: str = "embedding",
+                     name: str = VECTOR_INDEX_NAME, concurrently: bool = False) -> Optional[str]:
+    """DDL index ANN (cosine) sesuai config, None jika index dimatikan"""
+    kind = _index_kind()
+    if kind == "hnsw":
+        params = f"m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)}"
+    elif kind == "ivfflat":
+        params = f"lists = {int(settings.IVFFLAT_LISTS)}"
+    else:
+        return None
+
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON {table} USING {kind} ({column} vector_cosine_ops) WITH ({params})"
+    )
+
+def search_param_sql(value: Optional[int] = None) -> Optional[str]:
+    """SET untuk recall/kecepatan query ANN (ef_search atau probes)"""
+    kind = _index_kind()
+    if kind == "hnsw":
+        return f"SET hnsw.ef_search = {int(value or settings.HNSW_EF_SEARCH)}"
+    if kind == "ivfflat":
+        return f"SET ivfflat.probes = {int(value or settings.IVFFLAT_PROBES)}"
+    return None
+
+def iterative_scan_sql() -> Optional[str]:
+    """Iterative index scan (pgvector >= 0.8) supaya query ber-filter tetap dapat top-k dari index"""
+    kind = _index_kind()
+    if kind not in ("hnsw", "ivfflat") or not settings.VECTOR_ITERATIVE_SCAN:
+        return None
+    return f"SET {kind}.iterative_scan = {settings.VECTOR_ITERATIVE_SCAN}"
+
+async def ensure_vector_index(conn, **kwargs):
+    """Buat index vector jika belum ada"""
+    ddl = vector_index_ddl(**kwargs)
+    if ddl:
+        await conn.execute(text(ddl))
+
+async def rebuild_vector_index(conn, name: str = VECTOR_INDEX_NAME, **kwargs):
+    """Buat ulang index, misal setelah ganti parameter atau IVFFlat perlu lists baru"""
+    await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    await ensure_vector_index(conn, name=name, **kwargs)
+
+async def set_search_params(db, value: Optional[int] = None):
+    """Override ef_search/probes hanya untuk transaksi berjalan"""
+    sql = search_param_sql(value)
+    if sql:
+        await db.execute(text(sql.replace("SET ", "SET LOCAL ", 1)))
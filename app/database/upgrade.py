@@ -0,0 +1,45 @@
+from sqlalchemy import text
+
+# DDL idempotent untuk database yang dibuat sebelum kolom/index ini ada:
+# create_all hanya membuat tabel baru, tidak menambah kolom ke tabel lama.
+# Enum disimpan sebagai nama member (INGEST, COMPLETED, ...).
+SCHEMA_UPGRADES = [
+    # hadis_documents: antrian job ingest, upload duplikat, profil chunker
+    "DO $$ BEGIN CREATE TYPE documentjob AS ENUM ('INGEST', 'RECHUNK', 'REPLACE'); "
+    "EXCEPTION WHEN duplicate_object THEN NULL; END $$",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS job documentjob NOT NULL DEFAULT 'INGEST'",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS file_path VARCHAR",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS processed_pages INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS error TEXT",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE hadis_documents ADD COLUMN IF NOT EXISTS collection VARCHAR",
+    # Dokumen lama yang sudah selesai: progress 100%, bukan 0%
+    "UPDATE hadis_documents SET processed_pages = total_pages "
+    "WHERE status = 'COMPLETED' AND processed_pages = 0 AND total_pages IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_documents_status ON hadis_documents (status)",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_documents_content_hash ON hadis_documents (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_documents_collection ON hadis_documents (collection)",
+
+    # hadis_chunks: dedup embedding, pencarian lexical, filter metadata
+    "ALTER TABLE hadis_chunks ADD COLUMN IF NOT EXISTS text_hash VARCHAR(64)",
+    "ALTER TABLE hadis_chunks ADD COLUMN IF NOT EXISTS lexical_text TEXT",
+    "ALTER TABLE hadis_chunks ADD COLUMN IF NOT EXISTS search_vector TSVECTOR "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(lexical_text, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_text_hash ON hadis_chunks (text_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_search_vector ON hadis_chunks USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_document_page ON hadis_chunks (document_id, page_number)",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_meta_perawi ON hadis_chunks (lower(chunk_metadata ->> 'perawi'))",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_meta_kitab ON hadis_chunks (lower(chunk_metadata ->> 'kitab'))",
+    "CREATE INDEX IF NOT EXISTS ix_hadis_chunks_meta_derajat ON hadis_chunks (lower(chunk_metadata ->> 'derajat'))",
+
+    # chat_history: query hasil rewrite & giliran terakhir per sesi
+    "ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS rewritten_query TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_chat_history_session_timestamp ON chat_history (session_id, timestamp)",
+]
+
+async def upgrade_schema(conn):
+    """Tambahkan kolom & index yang belum ada di tabel lama (aman dijalankan tiap startup)"""
+    for ddl in SCHEMA_UPGRADES:
+        await conn.execute(text(ddl))
@@ -0,0 +1,97 @@
+import asyncio
+from sqlalchemy import text
+from app.database.connection import engine, read_engine, init_db
+from app.services.embedding_service import get_embedding_service, embedding_version_watcher
+from app.services.context_builder import get_context_builder
+from app.services.llm_service import get_ollama_client
+from app.services.memory_index import get_memory_index
+from app.services.reranker import get_reranker
+from config import settings
+
+class Readiness:
+    """Status worker untuk /health/ready: siap setelah warmup, tidak siap lagi saat shutdown"""
+
+    def __init__(self):
+        self.ready = False
+        self.preloaded = False  # master sudah init_db + memuat model sebelum fork
+
+readiness = Readiness()
+
+def _fork_safe_backend() -> bool:
+    # Session ONNX Runtime membuat thread pool saat dibuat; thread tidak ikut fork
+    return settings.EMBEDDING_BACKEND.lower() in ("torch", "torch-int8")
+
+def preload():
+    """Di proses master sebelum fork (serve.py): skema DB, versi embedding aktif, bobot model.
+
+    Tidak ada inference di sini (thread pool runtime tidak aman di-fork);
+    warmup() per worker yang menjalankan inference pertama. Koneksi DB
+    master ditutup supaya tidak terbawa ke worker.
+    """
+    async def prepare():
+        await init_db()
+        await embedding_version_watcher.load()
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+    asyncio.run(prepare())
+    if _fork_safe_backend():
+        get_embedding_service(check_dim=False)
+        get_reranker()
+    else:
+        print(f"EMBEDDING_BACKEND={settings.EMBEDDING_BACKEND}: model dimuat per worker")
+    get_context_builder()
+    readiness.preloaded = True
+
+async def _warm_pool(target, n: int):
+    async def ping():
+        async with target.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    # Dibuka bersamaan supaya benar-benar n koneksi terpisah masuk pool
+    await asyncio.gather(*(ping() for _ in range(n)))
+
+async def _warm_ollama():
+    try:
+        # Prompt kosong hanya memuat model ke memori Ollama
+        await get_ollama_client().generate(model=settings.OLLAMA_MODEL, prompt="",
+                                           keep_alive=settings.OLLAMA_KEEP_ALIVE)
+        print(f"✓ Ollama {settings.OLLAMA_MODEL} dimuat")
+    except Exception as e:
+        # Mode retrieve tetap bisa melayani; generate pertama yang akan menunggu
+        print(f"✗ Warmup Ollama gagal: {e}")
+
+async def warmup():
+    """Per worker, di lifespan startup: semua biaya cold start dibayar sebelum ready"""
+    if not readiness.preloaded:
+        await init_db()
+        await embedding_version_watcher.load()
+
+    pools = [engine] + ([read_engine] if read_engine is not engine else [])
+    n = min(settings.WARMUP_DB_CONNECTIONS, settings.DB_POOL_SIZE)
+    tasks = [_warm_pool(target, n) for target in pools if n > 0]
+    if settings.WARMUP_OLLAMA:
+        tasks.append(_warm_ollama())
+    warm_io = asyncio.gather(*tasks)
+
+    embed = await asyncio.to_thread(get_embedding_service)
+    await embed.warmup()
+    reranker = await asyncio.to_thread(get_reranker)
+    await reranker.rerank("warmup", [{"chunk_id": 0, "text": "warmup", "page_number": 1,
+                                      "similarity": 0.0, "metadata": {}}])
+    get_context_builder()
+    if settings.VECTOR_BACKEND == "memory":
+        await get_memory_index().refresh()
+
+    await warm_io
+    print("✓ Worker siap")
+
+async def check_ready() -> bool:
+    if not readiness.ready:
+        return False
+    try:
+        async with read_engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), 2.0)
+        return True
+    except Exception:
+        return False
@@ -1,17 +1,62 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
-from app.database.connection import init_db
+from app.database.connection import engine, read_engine
+from app.lifecycle import readiness, warmup, check_ready
+from app.services.embedding_service import embedding_version_watcher
+from app.services.ingestion_worker import ingestion_worker
+from app.services.conversation import history_writer
+from app.services.pdf_processor import shutdown_pdf_pool
+from app.utils.metrics import MetricsMiddleware, render_metrics
+from config import settings
 
-app = FastAPI(title="Chatbot Hadis")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model, pool DB, Ollama & index disiapkan sebelum worker menerima request
+    await warmup()
+    # Worker ingest juga melanjutkan job yang terputus sebelum restart
+    if settings.INGEST_IN_PROCESS:
+        ingestion_worker.start()
+    history_writer.start()
+    embedding_version_watcher.start()
+    readiness.ready = True
+    yield
+    # Keluar dari load balancer dulu, baru hentikan background task
+    readiness.ready = False
+    await ingestion_worker.stop()
+    await history_writer.stop()
+    await embedding_version_watcher.stop()
+    shutdown_pdf_pool()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
-app.include_router(router, prefix="/api")
+app = FastAPI(title="Chatbot Hadis", lifespan=lifespan)
 
-@app.on_event("startup")
-async def startup():
-    await init_db()
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["Server-Timing"])
+app.add_middleware(MetricsMiddleware)
+app.include_router(router, prefix="/api")
 
 @app.get("/")
 async def root():
-    return {"status": "running"}
\ No newline at end of file
+    return {"status": "running"}
+
+@app.get("/health/live", include_in_schema=False)
+async def live():
+    """Proses hidup dan event loop merespons"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def ready(response: Response):
+    """Warmup selesai dan DB terjangkau; 503 selama startup/shutdown"""
+    if not await check_ready():
+        response.status_code = 503
+        return {"status": "not_ready"}
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
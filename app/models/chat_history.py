@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime
+from sqlalchemy import Column, Integer, Text, DateTime, Index
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from app.database.connection import Base
 from datetime import datetime
@@ -9,6 +9,20 @@ class ChatHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(UUID(as_uuid=True), default=uuid.uuid4, index=True)
     user_query = Column(Text, nullable=False)
+    rewritten_query = Column(Text)  # pertanyaan mandiri hasil rewrite (jika berbeda)
     bot_response = Column(Text, nullable=False)
     sources = Column(JSONB)
-    timestamp = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Ambil giliran terakhir satu sesi (ConversationMemory.load)
+        Index("ix_chat_history_session_timestamp", "session_id", "timestamp"),
+    )
+
+class ChatSession(Base):
+    """Ringkasan bergulir percakapan; giliran s.d. summarized_until sudah diringkas"""
+    __tablename__ = "chat_sessions"
+    session_id = Column(UUID(as_uuid=True), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_until = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Computed, Index, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -15,4 +15,21 @@ class HadisChunk(Base):
     embedding = Column(Vector(384))
     chunk_metadata = Column(JSONB)  # ← Ganti dari metadata ke chunk_metadata
     created_at = Column(DateTime, default=datetime.utcnow)
-    document = relationship("HadisDocument", back_populates="chunks")
\ No newline at end of file
+    
+    # SHA-256 teks ternormalisasi (text_hash): chunk identik memakai ulang embedding
+    text_hash = Column(String(64), index=True)
+    
+    # Index lexical: teks ternormalisasi (normalize_text) -> tsvector 'simple'
+    lexical_text = Column(Text)
+    search_vector = Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(lexical_text, ''))", persisted=True))
+    
+    document = relationship("HadisDocument", back_populates="chunks")
+    
+    __table_args__ = (
+        Index("ix_hadis_chunks_search_vector", "search_vector", postgresql_using="gin"),
+        # Filter metadata di SQL (lihat VectorSearch._filter_clauses)
+        Index("ix_hadis_chunks_document_page", "document_id", "page_number"),
+        Index("ix_hadis_chunks_meta_perawi", text("lower(chunk_metadata ->> 'perawi')")),
+        Index("ix_hadis_chunks_meta_kitab", text("lower(chunk_metadata ->> 'kitab')")),
+        Index("ix_hadis_chunks_meta_derajat", text("lower(chunk_metadata ->> 'derajat')")),
+    )
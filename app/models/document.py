@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
 from datetime import datetime
@@ -9,11 +9,26 @@ class DocumentStatus(str, enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class DocumentJob(str, enum.Enum):
+    INGEST = "ingest"    # upload baru: chunk ditulis per batch, resume per halaman
+    RECHUNK = "rechunk"  # chunk ulang dari teks halaman tersimpan, ditukar sekaligus
+    REPLACE = "replace"  # seperti rechunk, teks dari PDF pengganti di file_path
+
 class HadisDocument(Base):
     __tablename__ = "hadis_documents"
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     upload_date = Column(DateTime, default=datetime.utcnow)
     total_pages = Column(Integer)
-    status = Column(Enum(DocumentStatus), default=DocumentStatus.PROCESSING)
+    collection = Column(String, index=True)  # kunci CHUNKER_PROFILES
+    status = Column(Enum(DocumentStatus), default=DocumentStatus.PROCESSING, index=True)
+    content_hash = Column(String(64), index=True)  # SHA-256 file PDF, untuk upload duplikat
+    
+    # State job ingest (tabel dokumen sekaligus jadi antrian job)
+    job = Column(Enum(DocumentJob), default=DocumentJob.INGEST, nullable=False)
+    file_path = Column(String)
+    processed_pages = Column(Integer, default=0, nullable=False)
+    error = Column(Text)
+    claimed_by = Column(String)
+    heartbeat_at = Column(DateTime)
     chunks = relationship("HadisChunk", back_populates="document", cascade="all, delete-orphan")
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index, text
+from app.database.connection import Base
+from datetime import datetime
+import enum
+
+class EmbeddingVersionStatus(str, enum.Enum):
+    BUILDING = "building"  # backfill / index belum selesai
+    READY = "ready"        # lengkap & ter-index, bisa diaktifkan (atau rollback)
+    ACTIVE = "active"      # dipakai VectorSearch & ingest; paling banyak satu
+    RETIRED = "retired"    # tabel sudah di-drop
+
+class EmbeddingVersion(Base):
+    """Registry versi embedding: model yang menghasilkan tiap tabel vector.
+
+    Versi 0 (tanpa baris di sini) adalah kolom hadis_chunks.embedding dengan
+    settings.EMBEDDING_MODEL; versi N disimpan di hadis_chunk_embeddings_vN.
+    """
+    __tablename__ = "embedding_versions"
+    id = Column(Integer, primary_key=True)
+    model = Column(String, nullable=False)
+    dim = Column(Integer, nullable=False)
+    status = Column(Enum(EmbeddingVersionStatus), default=EmbeddingVersionStatus.BUILDING, index=True)
+
+    # Titik resume backfill: chunk id terakhir yang sudah di-embed
+    cursor = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime)
+
+    __table_args__ = (
+        # Paling banyak satu versi aktif (Enum disimpan sebagai nama member)
+        Index("uq_embedding_versions_active", "status", unique=True, postgresql_where=text("status = 'ACTIVE'")),
+    )
@@ -0,0 +1,23 @@
+"""Template prompt untuk memori percakapan (rewrite pertanyaan & ringkasan)."""
+
+REWRITE = """Tulis ulang pertanyaan lanjutan di bawah menjadi satu pertanyaan yang lengkap dan bisa dipahami tanpa riwayat percakapan. Gunakan bahasa yang sama. Jawab hanya dengan pertanyaan tersebut.
+
+RIWAYAT PERCAKAPAN:
+{riwayat}
+
+PERTANYAAN LANJUTAN: {pertanyaan}
+PERTANYAAN LENGKAP:"""
+
+SUMMARY = """Ringkas percakapan tanya-jawab hadis berikut dalam maksimal 80 kata. Pertahankan topik, nama perawi, kitab, dan nomor hadis yang dibahas.
+
+RINGKASAN SEBELUMNYA:
+{ringkasan}
+
+PERCAKAPAN BARU:
+{percakapan}
+
+RINGKASAN:"""
+
+SUMMARY_LINE = "Ringkasan: {}\n"
+
+TURN = "Pengguna: {pertanyaan}\nAsisten: {jawaban}\n"
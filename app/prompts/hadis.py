@@ -0,0 +1,49 @@
+"""Template prompt jawaban hadis.
+
+SYSTEM_PREFIX sengaja statis dan diletakkan paling awal: byte-nya identik di
+setiap request, jadi Ollama bisa memakai ulang KV-cache prefix ini dan hanya
+perlu prefill bagian konteks + pertanyaan.
+"""
+
+SYSTEM_PREFIX = """Anda adalah asisten ahli hadis Islam yang membantu menjawab pertanyaan tentang hadis dengan akurat dan terpercaya.
+
+INSTRUKSI:
+1. Jawab berdasarkan HANYA konteks hadis yang diberikan di bawah
+2. Jika ada informasi perawi, kitab, atau nomor hadis, sebutkan dalam jawaban
+3. Jika konteks tidak cukup untuk menjawab, katakan dengan jujur
+4. Gunakan bahasa yang sopan dan mudah dipahami
+5. Jika relevan, sebutkan derajat hadis (shahih/hasan/dhaif)
+
+"""
+
+SOURCE_HEADER = "=== Sumber {nomor} (Halaman {halaman}) ===\n"
+
+SOURCE_FIELDS = (
+    ("kitab", "Kitab: {}\n"),
+    ("nomor_hadis", "Nomor Hadis: {}\n"),
+    ("perawi", "Perawi: HR. {}\n"),
+    ("derajat", "Derajat: {}\n"),
+)
+
+SOURCE_TEXT = "\nTeks:\n{teks}\n"
+
+QUESTION = """KONTEKS HADIS:
+{konteks}
+PERTANYAAN: {pertanyaan}
+
+JAWABAN:"""
+
+def render_source(nomor: int, chunk: dict, text: str) -> str:
+    """Satu blok sumber: header halaman, metadata yang ada, lalu teks"""
+    meta = chunk.get('metadata', {})
+    halaman = chunk['page_number']
+    if meta.get('page_end'):
+        halaman = f"{halaman}-{meta['page_end']}"
+
+    parts = [SOURCE_HEADER.format(nomor=nomor, halaman=halaman)]
+    parts.extend(template.format(meta[key]) for key, template in SOURCE_FIELDS if meta.get(key))
+    parts.append(SOURCE_TEXT.format(teks=text))
+    return "".join(parts)
+
+def render_prompt(query: str, sources: list) -> str:
+    return SYSTEM_PREFIX + QUESTION.format(konteks="\n".join(sources), pertanyaan=query)
@@ -1,17 +1,54 @@
+from enum import Enum
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
+from uuid import UUID
+
+class SearchFilters(BaseModel):
+    kitab: Optional[str] = None
+    perawi: Optional[str] = None
+    derajat: Optional[str] = None
+    document_id: Optional[int] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
+class ChatMode(str, Enum):
+    RETRIEVE = "retrieve"  # sumber saja (teks lengkap), tanpa LLM
+    ANSWER = "answer"      # sumber + jawaban LLM
+    AUTO = "auto"          # answer, turun ke retrieve jika LLM penuh / budget habis
 
 class ChatRequest(BaseModel):
     query: str
-    session_id: Optional[str] = None
+    session_id: Optional[UUID] = None
+    filters: Optional[SearchFilters] = None
+    mode: ChatMode = ChatMode.ANSWER
 
 class Source(BaseModel):
     chunk_id: int
-    text: str
+    text: str  # dipotong 200 karakter di mode answer, lengkap di mode lain
     page_number: int
     similarity_score: float
+    metadata: Dict = {}
 
 class ChatResponse(BaseModel):
-    answer: str
+    answer: Optional[str] = None  # None jika yang dilayani mode retrieve
     sources: List[Source]
-    session_id: str
\ No newline at end of file
+    session_id: str
+    mode: ChatMode = ChatMode.ANSWER  # mode yang benar-benar dilayani
+
+class BatchQuery(BaseModel):
+    query: str
+    id: Optional[str] = None  # dikembalikan apa adanya di hasil
+
+class BatchChatRequest(BaseModel):
+    queries: List[BatchQuery]
+    filters: Optional[SearchFilters] = None  # berlaku untuk semua pertanyaan
+    generate: bool = True  # False: hanya retrieval (evaluasi retriever)
+
+class BatchChatResult(BaseModel):
+    """Satu baris NDJSON; urutan baris mengikuti selesainya, pakai index untuk mengurutkan"""
+    index: int
+    id: Optional[str] = None
+    query: str
+    answer: Optional[str] = None
+    sources: List[Source] = []
+    error: Optional[str] = None
@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+from app.schemas.upload import UploadStatusResponse
+
+class DocumentResponse(UploadStatusResponse):
+    collection: Optional[str] = None
+    job: str  # job terakhir/berjalan: ingest | rechunk | replace
+    chunks: int
+
+class RechunkRequest(BaseModel):
+    # Ganti profil CHUNKER_PROFILES; None = tetap memakai koleksi dokumen
+    collection: Optional[str] = None
+
+class DeleteDocumentResponse(BaseModel):
+    document_id: int
+    deleted_chunks: int
@@ -1,8 +1,16 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class UploadResponse(BaseModel):
     document_id: int
     filename: str
     status: str
-    upload_date: datetime
\ No newline at end of file
+    upload_date: datetime
+    total_pages: Optional[int] = None
+    duplicate: bool = False  # True jika file identik sudah pernah di-upload
+
+class UploadStatusResponse(UploadResponse):
+    processed_pages: int
+    progress: float
+    error: Optional[str] = None
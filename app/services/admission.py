@@ -0,0 +1,160 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.utils.metrics import ADMISSIONS
+from config import settings
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # chat & rewrite: antrian terbatas + deadline
+    BATCH = 1        # /chat/batch: menunggu tanpa batas, kalah dari chat
+    BACKGROUND = 2   # ringkasan sesi
+
+class Overloaded(Exception):
+    """Slot LLM tidak tersedia (antrian penuh / melewati deadline)"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket:
+    """Slot generate yang sedang dipegang; release() aman dipanggil berulang"""
+
+    def __init__(self, scheduler: "LLMScheduler"):
+        self._scheduler = scheduler
+        self._start = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release(time.monotonic() - self._start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class LLMScheduler:
+    """Batasi generate LLM bersamaan di depan satu instance Ollama.
+
+    Paling banyak max_concurrency slot dipegang sekaligus. Peminta lain
+    menunggu menurut prioritas (FIFO dalam prioritas yang sama). Peminta
+    INTERACTIVE dibatasi queue_size dan timeout, lalu ditolak dengan
+    Overloaded beserta perkiraan Retry-After, supaya latensi ekor tetap
+    terbatas, bukan semua request timeout bersama. Pekerjaan murah (cache
+    hit, retrieval saja) tidak pernah lewat scheduler.
+    """
+
+    def __init__(self, max_concurrency: int = None, queue_size: int = None, timeout: float = None):
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.queue_size = settings.LLM_QUEUE_SIZE if queue_size is None else queue_size
+        self.timeout = timeout or settings.LLM_QUEUE_TIMEOUT
+        self.active = 0
+        self._waiters = []  # heap (priority, seq, future)
+        self._interactive_waiting = 0
+        self._seq = itertools.count()
+        self._seconds: Optional[float] = None  # rata-rata bergerak lama satu slot dipegang
+
+    def retry_after(self) -> int:
+        per_slot = self._seconds or 5.0
+        return max(1, math.ceil(per_slot * (len(self._waiters) + 1) / self.max_concurrency))
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: float = None) -> Ticket:
+        """timeout (INTERACTIVE) memperpendek LLM_QUEUE_TIMEOUT untuk peminta ini"""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            ADMISSIONS.labels("admitted").inc()
+            return Ticket(self)
+
+        interactive = priority == Priority.INTERACTIVE
+        if interactive and self._interactive_waiting >= self.queue_size:
+            ADMISSIONS.labels("queue_full").inc()
+            raise Overloaded("queue_full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        if interactive:
+            self._interactive_waiting += 1
+        try:
+            deadline = min(self.timeout, timeout or self.timeout) if interactive else None
+            await asyncio.wait_for(asyncio.shield(future), deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot sudah diberikan tepat saat menyerah: kembalikan
+                self._release(None)
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSIONS.labels("timeout").inc()
+            raise Overloaded("timeout", self.retry_after())
+        finally:
+            if interactive:
+                self._interactive_waiting -= 1
+
+        ADMISSIONS.labels("queued").inc()
+        return Ticket(self)
+
+    def _release(self, elapsed: Optional[float]):
+        if elapsed is not None:
+            self._seconds = elapsed if self._seconds is None else 0.8 * self._seconds + 0.2 * elapsed
+        # Slot langsung dipindah ke penunggu berikutnya (yang belum menyerah)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+class SessionRateLimiter:
+    """Token bucket per kunci (session_id / IP), in-process, LRU terbatas"""
+
+    def __init__(self, per_minute: float = None, burst: int = None, max_keys: int = 100_000):
+        self.rate = (settings.RATE_LIMIT_PER_MINUTE if per_minute is None else per_minute) / 60
+        self.burst = burst or settings.RATE_LIMIT_BURST
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [token, waktu terakhir]
+
+    def check(self, key: str, cost: float = 1.0) -> float:
+        """0 jika diizinkan (token dipotong), selain itu detik sampai cukup token"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        ADMISSIONS.labels("rate_limited").inc()
+        return (cost - bucket[0]) / self.rate
+
+
+_scheduler: Optional[LLMScheduler] = None
+_rate_limiter: Optional[SessionRateLimiter] = None
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+def get_rate_limiter() -> SessionRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = SessionRateLimiter()
+    return _rate_limiter
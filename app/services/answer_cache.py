@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.utils.text import normalize_text
+from config import settings
+
+JOURNAL_MAX_BYTES = 1 << 20
+
+class AnswerCache:
+    """Cache jawaban LLM per proses (LRU + TTL).
+
+    Dua jalur hit:
+    - exact: teks pertanyaan ternormalisasi sama -> tanpa embedding & retrieval
+    - semantic: cosine embedding pertanyaan >= threshold DAN himpunan chunk
+      hasil retrieval identik -> tanpa generate LLM
+
+    Invalidasi lintas worker memakai file stamp yang sekaligus jurnal:
+    invalidate() mengganti file (inode baru -> semua worker mengosongkan
+    cache), evict_chunks() menambah satu baris id chunk sehingga worker lain
+    hanya membuang jawaban yang mengutip chunk tersebut.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None, threshold: float = None,
+                 stamp_path: str = None):
+        self.max_size = max_size or settings.ANSWER_CACHE_SIZE
+        self.ttl = ttl or settings.ANSWER_CACHE_TTL
+        self.threshold = threshold or settings.ANSWER_CACHE_SIMILARITY
+        self.stamp_path = stamp_path or os.path.join(settings.UPLOAD_DIR, ".answer_cache_stamp")
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        # File jurnal dibuat di awal supaya semua worker mulai dari inode yang sama
+        os.makedirs(os.path.dirname(self.stamp_path) or ".", exist_ok=True)
+        open(self.stamp_path, "a").close()
+        self._stamp = self._read_stamp()
+
+    @staticmethod
+    def make_key(query: str, scope: str = "") -> str:
+        # scope membedakan filter pencarian yang berbeda untuk pertanyaan yang sama
+        return f"{scope}\x00{normalize_text(query).lower()}"
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.stamp_path)
+            return stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _check_stamp(self):
+        stamp = self._read_stamp()
+        if stamp == self._stamp:
+            return
+        old, self._stamp = self._stamp, stamp
+        if stamp is None or old is None or stamp[0] != old[0] or stamp[1] < old[1]:
+            self._entries.clear()
+            self._matrix = None
+            return
+        # Hanya baris jurnal yang ditambahkan sejak pemeriksaan terakhir
+        with open(self.stamp_path, "rb") as f:
+            f.seek(old[1])
+            lines = f.read(stamp[1] - old[1]).splitlines()
+        self._evict({i for line in lines if line for i in json.loads(line)})
+
+    def _evict(self, chunk_ids: set):
+        stale = [k for k, e in self._entries.items() if not e["chunk_ids"].isdisjoint(chunk_ids)]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self._matrix = None
+
+    def _alive(self, key: str, entry: Dict) -> bool:
+        if time.monotonic() - entry["created"] > self.ttl:
+            del self._entries[key]
+            self._matrix = None
+            return False
+        return True
+
+    def get_exact(self, query: str, scope: str = "") -> Optional[Tuple[str, List[Dict]]]:
+        """Hit hanya jika teks ternormalisasi sama persis"""
+        self._check_stamp()
+        key = self.make_key(query, scope)
+        entry = self._entries.get(key)
+        if entry is None or not self._alive(key, entry):
+            return None
+        self._entries.move_to_end(key)
+        return entry["answer"], entry["chunks"]
+
+    def get_similar(self, embedding: List[float], chunks: List[Dict], scope: str = "") -> Optional[str]:
+        """Hit jika embedding mirip dan chunk hasil retrieval sama"""
+        self._check_stamp()
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[k]["embedding"] for k in self._matrix_keys])
+
+        chunk_ids = frozenset(c['chunk_id'] for c in chunks)
+        scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+
+        for i in np.argsort(-scores):
+            if scores[i] < self.threshold:
+                break
+            key = self._matrix_keys[i]
+            entry = self._entries.get(key)
+            if entry is None or not self._alive(key, entry):
+                continue
+            if entry["scope"] == scope and entry["chunk_ids"] == chunk_ids:
+                self._entries.move_to_end(key)
+                return entry["answer"]
+        return None
+
+    def put(self, query: str, embedding: List[float], chunks: List[Dict], answer: str, scope: str = ""):
+        key = self.make_key(query, scope)
+        self._entries[key] = {
+            "embedding": np.asarray(embedding, dtype=np.float32),
+            "chunk_ids": frozenset(c['chunk_id'] for c in chunks),
+            "chunks": chunks,
+            "answer": answer,
+            "scope": scope,
+            "created": time.monotonic(),
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def invalidate(self):
+        """Kosongkan cache di semua worker (korpus berubah)"""
+        self._entries.clear()
+        self._matrix = None
+        os.makedirs(os.path.dirname(self.stamp_path) or ".", exist_ok=True)
+        tmp = f"{self.stamp_path}.{os.getpid()}.tmp"
+        open(tmp, "w").close()
+        os.replace(tmp, self.stamp_path)
+        self._stamp = self._read_stamp()
+
+    def evict_chunks(self, chunk_ids):
+        """Buang jawaban yang mengutip chunk ini di semua worker (dokumen dihapus/di-chunk ulang)"""
+        chunk_ids = set(chunk_ids)
+        if not chunk_ids:
+            return
+        self._check_stamp()
+        stamp = self._read_stamp()
+        if stamp is not None and stamp[1] > JOURNAL_MAX_BYTES:
+            # Jurnal dipendekkan sesekali: invalidasi penuh memulai file baru
+            self.invalidate()
+            return
+        self._evict(chunk_ids)
+        with open(self.stamp_path, "a") as f:
+            f.write(json.dumps(sorted(chunk_ids)) + "\n")
+        self._stamp = self._read_stamp()
+
+
+_answer_cache: Optional[AnswerCache] = None
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
@@ -1,119 +1,224 @@
 import re
-from typing import List, Dict
+from bisect import bisect_right
+from typing import List, Dict, Optional, Tuple
+from app.utils.metrics import timed
+from config import settings
+
+# Pattern untuk deteksi awal hadis, dikompilasi sekali per proses
+_BOUNDARY = re.compile(
+    r'\n\s*\d+\.\s*'        # Nomor hadis: "1. ", "123. "
+    r'|\n\s*Hadis\s+\d+'    # "Hadis 123"
+    r'|\n\s*HR\.\s*\w+'     # "HR. Bukhari"
+    r'|حَدَّثَنَا'          # Hadits Arab (haddatsana)
+    r'|عَنْ'                # Arab (an - dari)
+)
+
+# Semua metadata dalam satu pattern; tiap alternatif punya tepat satu group bernama.
+# Kitab didahulukan supaya "Shahih Bukhari" terbaca sebagai nama kitab; kata setelahnya
+# tidak boleh Hadis/No/HR agar "Shahih\nHadis 12" tetap memberi nomor_hadis dan perawi.
+# Lookahead huruf awal membuat alternatif hanya dicoba di awal kata yang mungkin cocok.
+_METADATA = re.compile(
+    r'\b(?=[shmnd])(?:'
+    r'(?P<kitab>(?:Shahih|Sahih|Sunan|Musnad)\s+(?!(?:Hadis|No|HR)\b)\w+)'
+    r'|HR\.\s*(?P<perawi>\w+)'
+    r'|(?:Hadis|No)\s*[:\.]?\s*(?P<nomor_hadis>\d+)'
+    r'|(?P<derajat>shahih|hasan|dhaif|sahih|daif)\b'
+    r')',
+    re.IGNORECASE
+)
+
+# Urutan prioritas jika satu chunk menyebut beberapa derajat
+DERAJAT_PRIORITY = ('shahih', 'hasan', 'dhaif', 'sahih', 'daif')
+
+_SEPARATORS = ('\n\n', '\n', '. ', '، ', ' ')
+
+def extract_metadata(text: str) -> Dict:
+    """Ekstrak metadata dari chunk (perawi, kitab, nomor, derajat) dalam satu scan"""
+    metadata = {}
+    derajat = set()
+
+    for match in _METADATA.finditer(text):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'derajat':
+            derajat.add(value.lower())
+        elif kind == 'kitab':
+            metadata.setdefault('kitab', value)
+            # "Shahih Bukhari" juga menandai derajat shahih
+            derajat.add(value.split(None, 1)[0].lower())
+        else:
+            metadata.setdefault(kind, value)
+        if len(metadata) == 3 and DERAJAT_PRIORITY[0] in derajat:
+            break  # semua field sudah terisi dengan derajat prioritas tertinggi
+
+    for keyword in DERAJAT_PRIORITY:
+        if keyword in derajat:
+            metadata['derajat'] = keyword
+            break
+
+    return metadata
+
+class ChunkStream:
+    """Chunking bertahap per halaman untuk satu dokumen.
+
+    Bagian setelah awal hadis terakhir di halaman ditahan dan digabung dengan
+    halaman berikutnya, jadi hadis yang terpotong pergantian halaman tetap
+    satu chunk (metadata `page_end` mencatat halaman terakhirnya).
+    """
+
+    def __init__(self, chunker: "HadisChunker"):
+        self.chunker = chunker
+        self._carry = ""
+        self._marks: List[Tuple[int, int]] = []  # (offset awal halaman di _carry, nomor halaman)
+        self._index_page: Optional[int] = None
+        self._index = 0
+
+    @property
+    def pending_page(self) -> Optional[int]:
+        """Halaman awal teks yang masih ditahan (belum jadi chunk)"""
+        return self._marks[0][1] if self._carry.strip() else None
+
+    def feed(self, text: str, page_number: int) -> List[Dict]:
+        """Tambahkan satu halaman, kembalikan chunk yang sudah pasti lengkap"""
+        with timed("chunker.chunk"):
+            carry = self._carry
+            if carry and not carry.endswith('\n'):
+                carry += '\n'  # supaya nomor hadis di awal halaman tetap terdeteksi
+            marks = self._marks + [(len(carry), page_number)]
+            buffer = carry + text
+
+            starts = [m.start() for m in _BOUNDARY.finditer(buffer)]
+            stop = len(buffer)
+            if self.chunker.cross_page:
+                tail = starts[-1] if starts else 0
+                # Tahan hadis terakhir, kecuali sudah terlalu panjang untuk ditunda
+                if stop - tail <= self.chunker.chunk_size * 2:
+                    stop = tail
+
+            chunks = self._emit(buffer, starts, marks, stop)
+
+            if stop < len(buffer):
+                first = bisect_right([offset for offset, _ in marks], stop) - 1
+                self._carry = buffer[stop:]
+                self._marks = [(max(offset - stop, 0), page) for offset, page in marks[first:]]
+            else:
+                self._carry, self._marks = "", []
+            return chunks
+
+    def flush(self) -> List[Dict]:
+        """Akhir dokumen: jadikan sisa teks yang ditahan sebagai chunk"""
+        with timed("chunker.chunk"):
+            buffer, marks = self._carry, self._marks
+            self._carry, self._marks = "", []
+            if not buffer.strip():
+                return []
+            starts = [m.start() for m in _BOUNDARY.finditer(buffer)]
+            return self._emit(buffer, starts, marks, len(buffer))
+
+    def _emit(self, buffer: str, starts: List[int], marks: List[Tuple[int, int]], stop: int) -> List[Dict]:
+        offsets = [offset for offset, _ in marks]
+
+        def page_at(pos: int) -> int:
+            return marks[bisect_right(offsets, pos) - 1][1]
 
-class HadisChunker:
-    def __init__(self, chunk_size=1000, overlap=200):
-        self.chunk_size = chunk_size
-        self.overlap = overlap
-    
-    async def chunk_text(self, text: str, page_number: int) -> List[Dict]:
-        """Chunk text dengan deteksi struktur hadis"""
-        
-        # Pattern untuk deteksi hadis (nomor hadis, perawi, dll)
-        hadis_patterns = [
-            r'\n\s*\d+\.\s*',  # Nomor hadis: "1. ", "123. "
-            r'\n\s*Hadis\s+\d+',  # "Hadis 123"
-            r'\n\s*HR\.\s*\w+',  # "HR. Bukhari"
-            r'حَدَّثَنَا',  # Hadits Arab (haddatsana)
-            r'عَنْ',  # Arab (an - dari)
-        ]
-        
-        # Coba split berdasarkan pattern hadis
-        chunks = self._smart_split(text, hadis_patterns)
-        
-        # Jika tidak ada pattern atau chunk terlalu besar, fallback ke character-based
-        if not chunks or any(len(c) > self.chunk_size * 2 for c in chunks):
-            chunks = self._fallback_split(text)
-        
         result = []
-        for i, chunk_text in enumerate(chunks):
-            if chunk_text.strip():
-                # Ekstrak metadata dari chunk
-                metadata = self._extract_metadata(chunk_text)
-                
-                result.append({
-                    "text": chunk_text.strip(),
-                    "chunk_index": i,
-                    "page_number": page_number,
-                    "metadata": metadata
-                })
-        
+        for start, end in self.chunker.spans(buffer, starts, stop):
+            chunk_text = buffer[start:end]
+            stripped = chunk_text.strip()
+            if not stripped:
+                continue
+
+            first = start + len(chunk_text) - len(chunk_text.lstrip())
+            page_start = page_at(first)
+            page_end = page_at(first + len(stripped) - 1)
+
+            if page_start != self._index_page:
+                self._index_page, self._index = page_start, 0
+            metadata = extract_metadata(stripped)
+            if page_end != page_start:
+                metadata['page_end'] = page_end
+
+            result.append({
+                "text": stripped,
+                "chunk_index": self._index,
+                "page_number": page_start,
+                "metadata": metadata
+            })
+            self._index += 1
         return result
-    
-    def _smart_split(self, text: str, patterns: List[str]) -> List[str]:
-        """Split berdasarkan pattern hadis"""
-        combined_pattern = '|'.join(patterns)
-        
-        # Split tapi keep delimiter
-        parts = re.split(f'({combined_pattern})', text)
-        
-        chunks = []
-        current_chunk = ""
-        
-        for part in parts:
-            if len(current_chunk) + len(part) <= self.chunk_size:
-                current_chunk += part
+
+class HadisChunker:
+    def __init__(self, chunk_size: int = None, overlap: int = None, cross_page: bool = None):
+        self.chunk_size = chunk_size or settings.CHUNK_SIZE
+        self.overlap = settings.CHUNK_OVERLAP if overlap is None else overlap
+        self.cross_page = settings.CHUNK_CROSS_PAGE if cross_page is None else cross_page
+        # overlap >= chunk_size membuat _fallback_spans tidak pernah maju (mis. profil koleksi salah)
+        if not 0 <= self.overlap < self.chunk_size:
+            raise ValueError(f"Chunk overlap harus 0 <= overlap < chunk_size "
+                             f"(overlap={self.overlap}, chunk_size={self.chunk_size})")
+
+    @classmethod
+    def for_collection(cls, collection: Optional[str]) -> "HadisChunker":
+        """Chunker dengan override dari CHUNKER_PROFILES[collection] (jika ada)"""
+        return cls(**settings.CHUNKER_PROFILES.get(collection or "", {}))
+
+    def stream(self) -> ChunkStream:
+        return ChunkStream(self)
+
+    async def chunk_text(self, text: str, page_number: int) -> List[Dict]:
+        """Chunk text dengan deteksi struktur hadis (satu halaman saja)"""
+        # Tanpa penahanan lintas halaman: hadis terakhir tetap digabung sampai chunk_size
+        stream = HadisChunker(self.chunk_size, self.overlap, cross_page=False).stream()
+        return stream.feed(text, page_number) + stream.flush()
+
+    def spans(self, text: str, starts: List[int], stop: int) -> List[Tuple[int, int]]:
+        """Rentang [start, end) tiap chunk untuk text[:stop].
+
+        Segmen antar awal hadis digabung sampai chunk_size; segmen yang
+        lebih dari 2x chunk_size dipecah per karakter dengan overlap.
+        """
+        cuts = [0] + [s for s in starts if 0 < s < stop] + [stop]
+        spans = []
+        current = None
+
+        for a, b in zip(cuts, cuts[1:]):
+            if b - a > self.chunk_size * 2:
+                if current:
+                    spans.append(current)
+                    current = None
+                spans.extend(self._fallback_spans(text, a, b))
+            elif current is None:
+                current = (a, b)
+            elif b - current[0] <= self.chunk_size:
+                current = (current[0], b)
             else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = part
-        
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
-    
-    def _fallback_split(self, text: str) -> List[str]:
-        """Fallback: split by character dengan overlap"""
-        chunks = []
-        start = 0
-        
-        while start < len(text):
+                spans.append(current)
+                current = (a, b)
+
+        if current:
+            spans.append(current)
+        return spans
+
+    def _fallback_spans(self, text: str, start: int, stop: int) -> List[Tuple[int, int]]:
+        """Fallback: split by character dengan overlap, cari pemisah natural"""
+        spans = []
+
+        while start < stop:
             end = start + self.chunk_size
-            
-            # Cari pemisah natural (newline, titik, koma)
-            if end < len(text):
-                for sep in ['\n\n', '\n', '. ', '، ', ' ']:
-                    last_sep = text[start:end].rfind(sep)
-                    if last_sep > self.chunk_size // 2:
-                        end = start + last_sep + len(sep)
+
+            if end < stop:
+                for sep in _SEPARATORS:
+                    last_sep = text.rfind(sep, start, end)
+                    if last_sep - start > self.chunk_size // 2:
+                        end = last_sep + len(sep)
                         break
-            
-            chunk = text[start:end]
-            if chunk.strip():
-                chunks.append(chunk)
-            
-            start = end - self.overlap
-        
-        return chunks
-    
-    def _extract_metadata(self, text: str) -> Dict:
-        """Ekstrak metadata dari chunk (perawi, kitab, dll)"""
-        metadata = {}
-        
-        # Deteksi perawi
-        perawi_pattern = r'HR\.\s*(\w+)'
-        match = re.search(perawi_pattern, text, re.IGNORECASE)
-        if match:
-            metadata['perawi'] = match.group(1)
-        
-        # Deteksi nomor hadis
-        nomor_pattern = r'(?:Hadis|No)\s*[:\.]?\s*(\d+)'
-        match = re.search(nomor_pattern, text, re.IGNORECASE)
-        if match:
-            metadata['nomor_hadis'] = match.group(1)
-        
-        # Deteksi derajat hadis
-        derajat_keywords = ['shahih', 'hasan', 'dhaif', 'sahih', 'daif']
-        for keyword in derajat_keywords:
-            if re.search(rf'\b{keyword}\b', text, re.IGNORECASE):
-                metadata['derajat'] = keyword
+            else:
+                end = stop
+
+            spans.append((start, end))
+            if end >= stop:
                 break
-        
-        # Deteksi kitab
-        kitab_pattern = r'(?:Shahih|Sahih|Sunan|Musnad)\s+(\w+)'
-        match = re.search(kitab_pattern, text, re.IGNORECASE)
-        if match:
-            metadata['kitab'] = match.group(0)
-        
-        return metadata
\ No newline at end of file
+            # Pemisah natural bisa memendekkan chunk sampai ~chunk_size/2: tetap harus maju
+            start = max(end - self.overlap, start + 1)
+
+        return spans
@@ -0,0 +1,127 @@
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from app.prompts.hadis import render_source
+from config import settings
+
+_PIECE = re.compile(r'\w+|[^\w\s]')
+_SHINGLE = 5
+_OVERLAP_PROBE = 64
+
+class TokenCounter:
+    """Hitung token dengan tokenizer model (LLM_TOKENIZER) jika tersedia.
+
+    Tanpa tokenizer dipakai perkiraan cepat ala BPE: tiap kata ~1 token per
+    4 karakter, tanda baca 1 token. Perkiraan ini sedikit berlebih, jadi
+    budget tidak terlampaui.
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self._tokenizer = None
+        name = tokenizer_name or settings.LLM_TOKENIZER
+        if name:
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(name)
+            except Exception as e:
+                print(f"✗ Tokenizer {name} tidak bisa dimuat, pakai perkiraan: {e}")
+
+    @staticmethod
+    def _piece_cost(piece: str) -> int:
+        return math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == '_' else 1
+
+    def count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False))
+        return sum(self._piece_cost(m.group()) for m in _PIECE.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Potong text di batas token supaya paling banyak max_tokens"""
+        if self._tokenizer is not None:
+            ids = self._tokenizer.encode(text, add_special_tokens=False)
+            return self._tokenizer.decode(ids[:max_tokens]) if len(ids) > max_tokens else text
+
+        used, end = 0, 0
+        for m in _PIECE.finditer(text):
+            used += self._piece_cost(m.group())
+            if used > max_tokens:
+                return text[:end].rstrip()
+            end = m.end()
+        return text
+
+class ContextBuilder:
+    """Susun blok sumber untuk prompt dalam batas token.
+
+    Chunk diambil sesuai urutan skor. Chunk yang hampir seluruhnya sudah
+    tercakup chunk terpilih dibuang; overlap di awal/akhir (sisa split
+    dengan overlap) dipotong. Chunk terakhir yang tidak muat dipotong
+    sesuai sisa budget.
+    """
+
+    def __init__(self, counter: TokenCounter = None, budget: int = None, max_chunks: int = None):
+        self.counter = counter or TokenCounter()
+        self.budget = budget or settings.LLM_CONTEXT_TOKENS
+        self.max_chunks = max_chunks or settings.LLM_CONTEXT_CHUNKS
+        self.min_tokens = settings.LLM_MIN_SOURCE_TOKENS
+
+    @staticmethod
+    def _shingles(text: str) -> Set[Tuple[str, ...]]:
+        words = text.lower().split()
+        return {tuple(words[i:i + _SHINGLE]) for i in range(max(len(words) - _SHINGLE + 1, 1))}
+
+    def _strip_overlap(self, text: str, selected: List[str], seen: Set) -> Optional[str]:
+        shingles = self._shingles(text)
+        if len(shingles & seen) >= 0.8 * len(shingles):
+            return None
+
+        for prev in selected:
+            # Awal text = ekor chunk sebelumnya
+            pos = prev.find(text[:_OVERLAP_PROBE])
+            if len(text) > _OVERLAP_PROBE and pos != -1 and text.startswith(prev[pos:]):
+                text = text[len(prev) - pos:].lstrip()
+            # Ekor text = awal chunk sebelumnya
+            pos = text.find(prev[:_OVERLAP_PROBE])
+            if len(prev) > _OVERLAP_PROBE and pos != -1 and prev.startswith(text[pos:]):
+                text = text[:pos].rstrip()
+        return text or None
+
+    def build(self, chunks: List[Dict]) -> List[str]:
+        sources: List[str] = []
+        selected: List[str] = []
+        seen: Set = set()
+        remaining = self.budget
+
+        for chunk in chunks:
+            if len(sources) >= self.max_chunks:
+                break
+            text = self._strip_overlap(chunk['text'], selected, seen)
+            if text is None:
+                continue
+
+            nomor = len(sources) + 1
+            available = remaining - self.counter.count(render_source(nomor, chunk, ""))
+            if available < self.min_tokens:
+                break
+            text = self.counter.truncate(text, available)
+
+            block = render_source(nomor, chunk, text)
+            sources.append(block)
+            selected.append(text)
+            seen |= self._shingles(text)
+            remaining -= self.counter.count(block)
+
+        return sources
+
+
+_context_builder: Optional[ContextBuilder] = None
+_context_builder_lock = threading.Lock()
+
+def get_context_builder() -> ContextBuilder:
+    """Satu builder (dan tokenizer) per proses"""
+    global _context_builder
+    if _context_builder is None:
+        with _context_builder_lock:
+            if _context_builder is None:
+                _context_builder = ContextBuilder()
+    return _context_builder
@@ -0,0 +1,252 @@
+import asyncio
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.connection import AsyncSessionLocal
+from app.models.chat_history import ChatHistory, ChatSession
+from app.prompts import conversation as prompts
+from app.services.admission import Priority, get_llm_scheduler
+from app.services.context_builder import get_context_builder
+from app.services.llm_service import LLMService
+from app.utils.text import query_terms
+from config import settings
+
+# Kata rujukan yang menandakan pertanyaan bergantung pada giliran sebelumnya.
+# Sufiks -nya hanya untuk kata yang merujuk hadis sebelumnya; -nya umum
+# ("bagaimana hukumnya puasa") tidak memicu rewrite.
+_FOLLOW_UP = re.compile(
+    r'\b(itu|tersebut|ini|dia|beliau|mereka|lagi|juga|lainnya|sebelumnya|tadi|lanjut\w*'
+    r'|(?:hadis|hadits|perawi|rawi|sanad|kitab|isi|maksud|derajat|arti|penjelasan)nya)\b',
+    re.IGNORECASE
+)
+
+_STOP = object()
+
+@dataclass
+class Conversation:
+    summary: str = ""
+    turns: List[Dict] = field(default_factory=list)  # lama -> baru: user_query, bot_response, timestamp
+
+    def __bool__(self):
+        return bool(self.summary or self.turns)
+
+class ConversationMemory:
+    """Riwayat sesi untuk pertanyaan lanjutan, ukuran prompt tetap terbatas.
+
+    Giliran yang belum diringkas dibaca apa adanya (paling banyak
+    2 x CHAT_HISTORY_TURNS). Begitu lebih dari itu, HistoryWriter melipat
+    semua kecuali CHAT_HISTORY_TURNS terakhir ke ringkasan bergulir di
+    chat_sessions, di background, jadi tidak pernah di jalur respons.
+    Prompt rewrite tetap dibatasi CHAT_HISTORY_TOKENS.
+    """
+
+    def __init__(self, llm: LLMService = None):
+        self.llm = llm or LLMService()
+        self.counter = get_context_builder().counter
+
+    async def load(self, db: AsyncSession, session_id: uuid.UUID) -> Conversation:
+        state = await db.get(ChatSession, session_id)
+        since = state.summarized_until if state else None
+
+        query = select(
+            ChatHistory.user_query, ChatHistory.rewritten_query,
+            ChatHistory.bot_response, ChatHistory.timestamp
+        ).where(ChatHistory.session_id == session_id)
+        if since:
+            query = query.where(ChatHistory.timestamp > since)
+        rows = (await db.execute(
+            query.order_by(ChatHistory.timestamp.desc()).limit(settings.CHAT_HISTORY_TURNS * 2)
+        )).all()
+
+        turns = [row._asdict() for row in reversed(rows)]
+        # Giliran yang masih di buffer writer proses ini belum terlihat di DB
+        stored = {t['timestamp'] for t in turns}
+        turns += [t for t in history_writer.pending(session_id) if t['timestamp'] not in stored]
+        return Conversation(summary=state.summary if state else "",
+                            turns=turns[-settings.CHAT_HISTORY_TURNS * 2:])
+
+    def _needs_rewrite(self, query: str) -> bool:
+        mode = settings.CHAT_REWRITE_MODE.lower()
+        if mode == "always":
+            return True
+        if mode == "off":
+            return False
+        return bool(_FOLLOW_UP.search(query)) or len(query_terms(query)) < 3
+
+    def _render_history(self, conversation: Conversation) -> str:
+        """Ringkasan + giliran terbaru, dipotong dari yang paling lama jika melebihi budget"""
+        budget = settings.CHAT_HISTORY_TOKENS
+        lines = []
+        for turn in reversed(conversation.turns):
+            line = prompts.TURN.format(
+                pertanyaan=turn['rewritten_query'] or turn['user_query'],
+                jawaban=self.counter.truncate(turn['bot_response'], 80)
+            )
+            cost = self.counter.count(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        if conversation.summary and budget > 0:
+            lines.append(prompts.SUMMARY_LINE.format(self.counter.truncate(conversation.summary, budget)))
+        return "".join(reversed(lines))
+
+    async def rewrite(self, query: str, conversation: Conversation) -> str:
+        """Ubah pertanyaan lanjutan menjadi pertanyaan mandiri untuk embedding & retrieval"""
+        if not conversation or not self._needs_rewrite(query):
+            return query
+        prompt = prompts.REWRITE.format(riwayat=self._render_history(conversation), pertanyaan=query)
+        try:
+            # LLM penuh (Overloaded): pakai pertanyaan asli, jangan tolak request
+            with await get_llm_scheduler().acquire(Priority.INTERACTIVE):
+                rewritten = await self.llm.complete(prompt, "llm.rewrite", num_predict=64, stop=["\n"])
+        except Exception as e:
+            print(f"✗ Rewrite pertanyaan gagal: {e}")
+            return query
+        return rewritten.strip().strip('"') or query
+
+    async def summarize(self, session_id: uuid.UUID):
+        """Lipat giliran lama ke ringkasan sesi, sisakan CHAT_HISTORY_TURNS terakhir"""
+        # Session DB hanya dipegang saat baca & tulis, tidak selama menunggu slot LLM
+        async with AsyncSessionLocal() as db:
+            state = await db.get(ChatSession, session_id)
+            query = select(ChatHistory).where(ChatHistory.session_id == session_id)
+            if state and state.summarized_until:
+                query = query.where(ChatHistory.timestamp > state.summarized_until)
+            turns = (await db.execute(query.order_by(ChatHistory.timestamp))).scalars().all()
+        # Dilipat per beberapa giliran sekaligus, bukan satu panggilan LLM tiap giliran
+        if len(turns) <= settings.CHAT_HISTORY_TURNS * 2:
+            return
+
+        fold = turns[:-settings.CHAT_HISTORY_TURNS]
+        percakapan = "".join(
+            prompts.TURN.format(pertanyaan=t.rewritten_query or t.user_query,
+                                jawaban=self.counter.truncate(t.bot_response, 120))
+            for t in fold
+        )
+        with await get_llm_scheduler().acquire(Priority.BACKGROUND):
+            summary = await self.llm.complete(
+                prompts.SUMMARY.format(ringkasan=(state.summary if state else "") or "-",
+                                       percakapan=percakapan),
+                "llm.summary", num_predict=160
+            )
+        summary = self.counter.truncate(summary, settings.CHAT_HISTORY_TOKENS // 2)
+
+        until = fold[-1].timestamp
+        stmt = insert(ChatSession).values(
+            session_id=session_id, summary=summary, summarized_until=until, updated_at=datetime.utcnow()
+        )
+        async with AsyncSessionLocal() as db:
+            # Worker lain mungkin sudah meringkas lebih jauh; jangan mundur
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[ChatSession.session_id],
+                set_={"summary": stmt.excluded.summary, "summarized_until": stmt.excluded.summarized_until,
+                      "updated_at": stmt.excluded.updated_at},
+                where=(ChatSession.summarized_until.is_(None)
+                       | (ChatSession.summarized_until < stmt.excluded.summarized_until))
+            ))
+            await db.commit()
+
+class HistoryWriter:
+    """Tulis ChatHistory di background dalam batch, bukan commit per request.
+
+    Giliran yang belum ter-flush tetap terbaca lewat pending() sehingga
+    pertanyaan lanjutan berikutnya di proses yang sama melihatnya.
+    """
+
+    def __init__(self, flush_ms: float = None, batch_size: int = None):
+        self.flush_interval = (flush_ms or settings.CHAT_HISTORY_FLUSH_MS) / 1000
+        self.batch_size = batch_size or settings.CHAT_HISTORY_BATCH_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[uuid.UUID, List[Dict]] = {}
+        self._summarizing: Dict[uuid.UUID, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush sisa antrian sebelum shutdown"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        for task in list(self._summarizing.values()):
+            task.cancel()
+
+    def write(self, session_id: uuid.UUID, user_query: str, bot_response: str,
+              sources: List[Dict], rewritten_query: Optional[str] = None):
+        entry = {
+            "session_id": session_id,
+            "user_query": user_query,
+            "rewritten_query": rewritten_query if rewritten_query != user_query else None,
+            "bot_response": bot_response,
+            "sources": sources,
+            "timestamp": datetime.utcnow(),
+        }
+        self._pending.setdefault(session_id, []).append(entry)
+        self.start()
+        self._queue.put_nowait(entry)
+
+    def pending(self, session_id: uuid.UUID) -> List[Dict]:
+        return list(self._pending.get(session_id, []))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(items) < self.batch_size and items[-1] is not _STOP:
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+
+            stopping = items[-1] is _STOP
+            items = [item for item in items if item is not _STOP]
+            if items:
+                try:
+                    await self._flush(items, summarize=not stopping)
+                except Exception as e:
+                    print(f"✗ Gagal menyimpan {len(items)} riwayat chat: {e}")
+                    self._forget(items)
+            if stopping:
+                return
+
+    def _forget(self, items: List[Dict]):
+        for item in items:
+            session_id = item["session_id"]
+            entries = [e for e in self._pending.get(session_id, []) if e is not item]
+            if entries:
+                self._pending[session_id] = entries
+            else:
+                self._pending.pop(session_id, None)
+
+    async def _flush(self, items: List[Dict], summarize: bool = True):
+        async with AsyncSessionLocal() as db:
+            db.add_all(ChatHistory(**item) for item in items)
+            await db.commit()
+        self._forget(items)
+
+        if summarize:
+            for session_id in {item["session_id"] for item in items} - self._summarizing.keys():
+                self._summarizing[session_id] = asyncio.create_task(self._summarize(session_id))
+
+    async def _summarize(self, session_id: uuid.UUID):
+        try:
+            await ConversationMemory().summarize(session_id)
+        except Exception as e:
+            print(f"✗ Ringkasan sesi {session_id} gagal: {e}")
+        finally:
+            self._summarizing.pop(session_id, None)
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.chunk import HadisChunk
+from app.models.document import HadisDocument, DocumentStatus, DocumentJob
+from app.services.answer_cache import get_answer_cache
+from app.services.memory_index import get_memory_index
+from app.services.pdf_processor import PageCache
+from config import settings
+
+def original_filename(path: str) -> str:
+    """Nama file asli dari path upload (<uuid hex>_<nama>)"""
+    return os.path.basename(path).split("_", 1)[-1]
+
+async def list_documents(db: AsyncSession, status: Optional[DocumentStatus] = None,
+                         collection: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+    """Dokumen beserta jumlah chunk, terbaru dulu"""
+    counts = (
+        select(HadisChunk.document_id, func.count().label("chunks"))
+        .group_by(HadisChunk.document_id)
+        .subquery()
+    )
+    query = (
+        select(HadisDocument, func.coalesce(counts.c.chunks, 0))
+        .outerjoin(counts, counts.c.document_id == HadisDocument.id)
+        .order_by(HadisDocument.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    if status is not None:
+        query = query.where(HadisDocument.status == status)
+    if collection is not None:
+        query = query.where(HadisDocument.collection == collection)
+    return [{"document": doc, "chunks": chunks} for doc, chunks in (await db.execute(query)).all()]
+
+async def count_chunks(db: AsyncSession, document_id: int) -> int:
+    return (await db.execute(
+        select(func.count()).select_from(HadisChunk).where(HadisChunk.document_id == document_id)
+    )).scalar_one()
+
+async def release_page_cache(db: AsyncSession, content_hash: Optional[str]):
+    """Hapus teks halaman tersimpan jika tidak ada dokumen lain dengan isi file yang sama"""
+    if not content_hash:
+        return
+    shared = (await db.execute(
+        select(HadisDocument.id).where(HadisDocument.content_hash == content_hash).limit(1)
+    )).scalar_one_or_none()
+    if shared is None:
+        PageCache().remove(content_hash)
+
+async def delete_document(db: AsyncSession, doc: HadisDocument) -> int:
+    """Hapus dokumen, chunk & embedding semua versi (FK cascade); index dan cache diperbarui per dokumen"""
+    document_id, content_hash, path = doc.id, doc.content_hash, doc.file_path
+    chunk_ids = (await db.execute(
+        delete(HadisChunk).where(HadisChunk.document_id == document_id).returning(HadisChunk.id)
+    )).scalars().all()
+    await db.execute(delete(HadisDocument).where(HadisDocument.id == document_id))
+    await db.commit()
+
+    if settings.VECTOR_BACKEND == "memory":
+        await get_memory_index().remove_documents([document_id])
+    get_answer_cache().evict_chunks(chunk_ids)
+    await release_page_cache(db, content_hash)
+    if path and os.path.exists(path):
+        os.remove(path)
+    return len(chunk_ids)
+
+def can_rechunk(doc: HadisDocument) -> bool:
+    """Re-chunk butuh teks semua halaman di page cache (PDF asli dihapus setelah ingest)"""
+    return bool(doc.content_hash and doc.total_pages) and PageCache().has_pages(doc.content_hash, doc.total_pages)
+
+async def enqueue_job(db: AsyncSession, doc: HadisDocument, job: DocumentJob, file_path: str = None,
+                      collection: Optional[str] = None, claimed_by: str = None):
+    """Jadikan dokumen job lagi; chunk lama tetap dipakai pencarian sampai job selesai.
+
+    claimed_by langsung mengklaim job (CLI yang memprosesnya sendiri).
+    """
+    doc.job = job
+    doc.status = DocumentStatus.PROCESSING
+    doc.processed_pages = 0
+    doc.error = None
+    doc.claimed_by = claimed_by
+    doc.heartbeat_at = datetime.utcnow() if claimed_by else None
+    if file_path:
+        doc.file_path = file_path
+    if collection is not None:
+        doc.collection = collection
+    await db.commit()
@@ -1,37 +1,219 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from config import settings
-import re
+from app.database.connection import AsyncSessionLocal
+from app.database.embedding_store import EmbeddingStore, current_store, use_store, active_store
+from app.utils.batcher import MicroBatcher
+from app.utils.text import normalize_text
+from app.utils.metrics import timed, EMBED_BATCH_SIZE
+import asyncio
+import contextvars
+import threading
+
+def load_embedding_model(backend: str = None, onnx_file: str = None, threads: int = None,
+                         model_name: str = None):
+    """SentenceTransformer dengan runtime CPU pilihan.
+
+    backend: torch (fp32), torch-int8 (quantisasi dinamis Linear), onnx
+    (ONNX Runtime; onnx_file mis. "onnx/model_qint8_avx512_vnni.onnx" untuk int8).
+    threads > 0 mengatur jumlah thread intra-op per proses worker.
+    """
+    # Import di sini: torch baru dimuat saat model benar-benar dipakai
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    model_name = model_name or settings.EMBEDDING_MODEL
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    onnx_file = onnx_file or settings.EMBEDDING_ONNX_FILE
+    threads = settings.EMBEDDING_THREADS if threads is None else threads
+    if threads > 0:
+        torch.set_num_threads(threads)
+    
+    if backend == "onnx":
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                   model_kwargs=model_kwargs)
+    
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend != "torch":
+        raise ValueError(f"EMBEDDING_BACKEND tidak dikenal: {backend}")
+    return model
+
+def check_embedding_dim(model, store: EmbeddingStore = None) -> int:
+    """Pastikan dimensi output model sama dengan kolom vector versi embedding"""
+    store = store or EmbeddingStore.base()
+    actual = len(model.encode(["cek dimensi"], normalize_embeddings=True)[0])
+    if actual != store.dim:
+        raise RuntimeError(
+            f"Model {store.model} menghasilkan {actual} dimensi, {store.table_name} Vector({store.dim})"
+        )
+    return actual
 
 class EmbeddingService:
-    def __init__(self):
-        print(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    """Model embedding untuk satu versi (store): query & chunk baru memakai versi yang sama"""
+
+    def __init__(self, store: EmbeddingStore = None, check_dim: bool = True, threads: int = None):
+        self.store = store or current_store()
+        print(f"Loading embedding model: {self.store.model} ({settings.EMBEDDING_BACKEND}, v{self.store.version})")
+        self.model = load_embedding_model(model_name=self.store.model, threads=threads)
+        # check_dim=False: tanpa inference (preload di proses master sebelum fork), cek di warmup()
+        if check_dim:
+            check_embedding_dim(self.model, self.store)
         print("✓ Model loaded")
+        
+        # Satu thread inference per worker supaya encode tidak memblokir event loop;
+        # batch besar (ingest, migrasi) punya thread sendiri supaya query chat
+        # tidak antri di belakang encode ratusan chunk
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._batch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batch")
+        self._batcher = MicroBatcher(
+            self._encode_async,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+        )
     
     def _preprocess_text(self, text: str) -> str:
         """Preprocess text untuk embedding yang lebih baik"""
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove harakat Arab (tashkil) untuk consistency
-        arabic_diacritics = re.compile(r'[\u064B-\u065F\u0670]')
-        text = arabic_diacritics.sub('', text)
-        
-        # Normalize Arabic letters
-        text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
-        text = text.replace('ة', 'ه')
-        
-        return text.strip()
+        return normalize_text(text)
+    
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode sinkron, dijalankan di thread inference"""
+        EMBED_BATCH_SIZE.observe(len(texts))
+        with timed("embedding.preprocess"):
+            processed_texts = [self._preprocess_text(t) for t in texts]
+        # encode mengurutkan teks per panjang sebelum dibagi batch, jadi satu
+        # panggilan berisi banyak teks (ingest) meminimalkan padding
+        with timed("embedding.encode"):
+            embeddings = self.model.encode(
+                processed_texts,
+                batch_size=settings.EMBED_ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        return embeddings.tolist()
+    
+    async def _encode_async(self, texts: List[str], executor: ThreadPoolExecutor = None) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        # run_in_executor tidak menyalin contextvars: tanpa ini span encode tidak masuk Server-Timing
+        return await loop.run_in_executor(executor or self._executor, contextvars.copy_context().run,
+                                          self._encode, texts)
     
     async def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding dengan preprocessing"""
-        processed_text = self._preprocess_text(text)
-        embedding = self.model.encode(processed_text, convert_to_numpy=True, normalize_embeddings=True)
-        return embedding.tolist()
+        """Generate embedding dengan preprocessing (digabung lewat micro-batch)"""
+        return await self._batcher.submit(text)
     
     async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Batch embedding generation"""
-        processed_texts = [self._preprocess_text(t) for t in texts]
-        embeddings = self.model.encode(processed_texts, convert_to_numpy=True, normalize_embeddings=True)
-        return [emb.tolist() for emb in embeddings]
\ No newline at end of file
+        """Batch embedding generation (thread inference batch)"""
+        if not texts:
+            return []
+        return await self._encode_async(texts, self._batch_executor)
+    
+    async def warmup(self):
+        """Inference pertama (alokasi & thread pool runtime) + cek dimensi, di thread inference"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, check_embedding_dim, self.model, self.store)
+
+    async def close(self):
+        await self._batcher.close()
+        self._executor.shutdown(wait=False)
+        self._batch_executor.shutdown(wait=False)
+
+
+_embedding_service: EmbeddingService = None
+_embedding_lock = threading.Lock()
+
+def get_embedding_service(check_dim: bool = True) -> EmbeddingService:
+    """Satu instance model per proses worker (atau per master yang di-fork, lihat app/lifecycle.py)"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService(check_dim=check_dim)
+    return _embedding_service
+
+class EmbeddingVersionWatcher:
+    """Ikuti versi embedding aktif di DB dan ganti model proses ini tanpa restart.
+
+    Model baru dimuat di thread selagi request tetap dilayani model lama;
+    setelah siap, singleton ditukar sekaligus (model + store), jadi satu
+    request tidak pernah mencampur query embedding versi lain. Model lama
+    dilepas setelah request yang masih memakainya selesai.
+    """
+
+    RETIRE_DELAY = 30.0
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.EMBEDDING_VERSION_CHECK_INTERVAL
+        self._task: Optional[asyncio.Task] = None
+        self._retiring: set = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._retiring) + ([self._task] if self._task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def load(self):
+        """Pakai versi aktif di DB sebagai versi awal proses (sebelum model dimuat)"""
+        async with AsyncSessionLocal() as db:
+            use_store(await active_store(db))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"✗ Cek versi embedding gagal: {e}")
+
+    async def sync(self) -> bool:
+        """Muat model versi aktif jika berbeda dari yang dipakai proses ini"""
+        global _embedding_service
+        async with AsyncSessionLocal() as db:
+            store = await active_store(db)
+        old = get_embedding_service()
+        if old.store == store:
+            return False
+
+        print(f"Versi embedding aktif berubah: v{old.store.version} -> v{store.version}")
+        service = await asyncio.to_thread(EmbeddingService, store)
+        with _embedding_lock:
+            _embedding_service = service
+            use_store(store)
+
+        # Jawaban & index in-memory dihitung dengan embedding versi lama
+        from app.services.answer_cache import get_answer_cache
+        from app.services.memory_index import get_memory_index
+        get_answer_cache().invalidate()
+        if settings.VECTOR_BACKEND == "memory":
+            await get_memory_index().refresh(store)
+        print(f"✓ Embedding v{store.version} ({store.model}) aktif")
+
+        # Dilepas di task terpisah supaya loop cek versi tidak tertahan RETIRE_DELAY
+        task = asyncio.create_task(self._retire(old))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+        return True
+
+    async def _retire(self, old: EmbeddingService):
+        # Pipeline ingest yang sedang berjalan boleh menyelesaikan dokumennya
+        # dengan model lama; setelah itu batcher & thread inference dihentikan
+        await asyncio.sleep(self.RETIRE_DELAY)
+        await old.close()
+
+
+embedding_version_watcher = EmbeddingVersionWatcher()
@@ -0,0 +1,247 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from sqlalchemy import delete, select, text, update
+from app.database.bulk import copy_records
+from app.database.connection import AsyncSessionLocal
+from app.models.chunk import HadisChunk
+from app.models.document import HadisDocument
+from app.services.chunker import HadisChunker
+from app.services.embedding_service import EmbeddingService
+from app.services.pdf_processor import PDFProcessor
+from app.utils.text import normalize_text, text_hash
+from app.utils.metrics import timed
+from config import settings
+
+CHUNK_COLUMNS = [
+    "document_id", "chunk_text", "chunk_index", "page_number",
+    "embedding", "chunk_metadata", "created_at", "lexical_text", "text_hash"
+]
+
+# Versi embedding > 0: vector ditulis ke tabel versi, id chunk dipesan dulu dari sequence
+_RESERVE_IDS = text("SELECT nextval(pg_get_serial_sequence('hadis_chunks', 'id')) FROM generate_series(1, :n)")
+
+_DONE = object()
+
+class IngestionPipeline:
+    """Pipeline ingest: ekstraksi -> chunking -> embedding batch -> COPY.
+
+    Ketiga tahap berjalan bersamaan lewat antrian terbatas, jadi embedding
+    batch berikutnya jalan selagi batch sebelumnya ditulis ke DB. Setiap
+    batch di-commit sendiri bersama progres halaman dokumen. Chunk yang
+    teksnya (ternormalisasi) sudah ada di korpus memakai ulang embedding
+    yang tersimpan, tidak di-encode lagi.
+    """
+
+    def __init__(self, embed: EmbeddingService, pdf: PDFProcessor = None,
+                 chunker: HadisChunker = None, batch_size: int = None,
+                 queue_size: int = None, session_factory=AsyncSessionLocal):
+        self.embed = embed
+        self.pdf = pdf or PDFProcessor()
+        self.chunker = chunker or HadisChunker()
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+        self.session_factory = session_factory
+
+    async def run(self, pdf_path: str, document_id: int, start_page: int = 1,
+                  file_hash: Optional[str] = None) -> Dict:
+        """Jalankan pipeline untuk satu dokumen mulai dari start_page"""
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue = asyncio.Queue(maxsize=self.queue_size)
+        stats = {"total_pages": 0, "total_chunks": 0, "reused_embeddings": 0}
+
+        tasks = [
+            asyncio.create_task(self._produce(pdf_path, start_page, file_hash, embed_queue, stats)),
+            asyncio.create_task(self._embed(embed_queue, write_queue, stats)),
+            asyncio.create_task(self._write(write_queue, document_id, stats)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return stats
+
+    async def _produce(self, pdf_path: str, start_page: int, file_hash: Optional[str],
+                       out: asyncio.Queue, stats: Dict):
+        # Setiap batch membawa nomor halaman terakhir yang seluruh chunk-nya
+        # sudah masuk batch ini atau sebelumnya, untuk titik resume
+        batch: List[Dict] = []
+        last_page = start_page - 1
+        stream = self.chunker.stream()
+
+        async for page in self.pdf.extract_text(pdf_path, start_page, file_hash):
+            stats["total_pages"] += 1
+            last_page = page['page_number']
+            batch.extend(stream.feed(page['text'], last_page))
+
+            while len(batch) >= self.batch_size:
+                head, batch = batch[:self.batch_size], batch[self.batch_size:]
+                # Teks yang masih ditahan chunker (hadis lintas halaman) belum aman
+                pending = batch[0]['page_number'] if batch else stream.pending_page
+                complete_through = pending - 1 if pending else last_page
+                await out.put((head, complete_through))
+
+        batch.extend(stream.flush())
+        while len(batch) > self.batch_size:
+            head, batch = batch[:self.batch_size], batch[self.batch_size:]
+            await out.put((head, batch[0]['page_number'] - 1))
+
+        # Batch terakhir dikirim walau kosong supaya progres mencapai halaman akhir
+        await out.put((batch, last_page))
+        await out.put(_DONE)
+
+    async def _known_embeddings(self, hashes: Set[str]) -> Dict[str, List[float]]:
+        """Embedding (versi model yang sama) yang sudah tersimpan untuk text_hash tertentu"""
+        if not hashes:
+            return {}
+        store = self.embed.store
+        async with self.session_factory() as db:
+            result = await db.execute(
+                store.join(select(HadisChunk.text_hash, store.column))
+                .where(HadisChunk.text_hash.in_(hashes), store.column.is_not(None))
+                .distinct(HadisChunk.text_hash)
+            )
+            return {h: emb for h, emb in result.all()}
+
+    async def _embed_batch(self, batch: List[Dict], stats: Dict) -> List[List[float]]:
+        for c in batch:
+            c['text_hash'] = text_hash(c['text'])
+        embeddings = await self._known_embeddings({c['text_hash'] for c in batch})
+        stats["reused_embeddings"] += sum(1 for c in batch if c['text_hash'] in embeddings)
+
+        # Encode hanya teks yang belum pernah ada, duplikat dalam batch cukup sekali
+        missing = {c['text_hash']: c['text'] for c in batch if c['text_hash'] not in embeddings}
+        if missing:
+            encoded = await self.embed.generate_embeddings_batch(list(missing.values()))
+            embeddings.update(zip(missing.keys(), encoded))
+        return [embeddings[c['text_hash']] for c in batch]
+
+    async def _embed(self, inp: asyncio.Queue, out: asyncio.Queue, stats: Dict):
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                await out.put(_DONE)
+                return
+            batch, complete_through = item
+            await out.put((batch, await self._embed_batch(batch, stats), complete_through))
+
+    def _records(self, document_id: int, batch: List[Dict], embeddings: List, now: datetime) -> List[tuple]:
+        store = self.embed.store
+        return [
+            (document_id, c['text'], c['chunk_index'], c['page_number'],
+             emb if store.is_base else None, json.dumps(c.get('metadata', {})), now,
+             normalize_text(c['text']), c['text_hash'])
+            for c, emb in zip(batch, embeddings)
+        ]
+
+    async def _write(self, inp: asyncio.Queue, document_id: int, stats: Dict):
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                return
+            batch, embeddings, complete_through = item
+
+            now = datetime.utcnow()
+            store = self.embed.store
+            records = self._records(document_id, batch, embeddings, now)
+            with timed("db.copy"):
+                async with self.session_factory() as db:
+                    if records and store.is_base:
+                        await copy_records(db, "hadis_chunks", CHUNK_COLUMNS, records)
+                    elif records:
+                        ids = (await db.execute(_RESERVE_IDS, {"n": len(records)})).scalars().all()
+                        await copy_records(db, "hadis_chunks", ["id"] + CHUNK_COLUMNS,
+                                           [(i,) + r for i, r in zip(ids, records)])
+                        await copy_records(db, store.table_name, ["chunk_id", "embedding"],
+                                           list(zip(ids, embeddings)))
+                    await db.execute(
+                        update(HadisDocument)
+                        .where(HadisDocument.id == document_id)
+                        .values(processed_pages=complete_through, heartbeat_at=now)
+                    )
+                    await db.commit()
+
+            stats["total_chunks"] += len(records)
+
+    async def reconcile(self, document_id: int, pages: AsyncIterator[Dict],
+                        progress: Callable[[int], Awaitable] = None) -> Dict:
+        """Chunk ulang satu dokumen lalu tukar hanya chunk yang berubah, dalam satu transaksi.
+
+        Chunk lama dengan teks, halaman dan metadata yang sama dipertahankan
+        (id & embedding tetap, chunk_index diperbarui jika bergeser). Sisanya
+        dihapus/ditambah; chunk baru memakai ulang embedding lewat text_hash,
+        jadi hanya teks ternormalisasi yang benar-benar baru yang di-encode.
+        Sampai commit, pencarian tetap melihat chunk lama. progress(halaman)
+        dipanggil berkala sebagai heartbeat job.
+        """
+        stats = {"total_pages": 0, "total_chunks": 0, "kept": 0, "reused_embeddings": 0,
+                 "added_ids": [], "removed_ids": []}
+        chunks: List[Dict] = []
+        stream = self.chunker.stream()
+        async for page in pages:
+            stats["total_pages"] += 1
+            chunks.extend(stream.feed(page['text'], page['page_number']))
+            if progress and stats["total_pages"] % settings.PDF_PAGES_PER_TASK == 0:
+                await progress(stats["total_pages"])
+        chunks.extend(stream.flush())
+        stats["total_chunks"] = len(chunks)
+
+        def key(chunk_text: str, page_number: int, metadata: Optional[Dict]):
+            return chunk_text, page_number, json.dumps(metadata or {}, sort_keys=True)
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(HadisChunk.id, HadisChunk.chunk_text, HadisChunk.chunk_index,
+                       HadisChunk.page_number, HadisChunk.chunk_metadata)
+                .where(HadisChunk.document_id == document_id)
+                .order_by(HadisChunk.id)
+            )
+            existing = defaultdict(list)
+            for row in result.all():
+                existing[key(row.chunk_text, row.page_number, row.chunk_metadata)].append(row)
+
+        added, moved = [], []
+        for c in chunks:
+            matches = existing.get(key(c['text'], c['page_number'], c.get('metadata')))
+            if not matches:
+                added.append(c)
+                continue
+            row = matches.pop(0)
+            if row.chunk_index != c['chunk_index']:
+                moved.append({"id": row.id, "chunk_index": c['chunk_index']})
+        removed = [row.id for rows in existing.values() for row in rows]
+        stats["kept"] = len(chunks) - len(added)
+
+        embeddings = []
+        for start in range(0, len(added), self.batch_size):
+            embeddings.extend(await self._embed_batch(added[start:start + self.batch_size], stats))
+            if progress:
+                await progress(stats["total_pages"])
+
+        store = self.embed.store
+        with timed("db.copy"):
+            async with self.session_factory() as db:
+                if added:
+                    ids = (await db.execute(_RESERVE_IDS, {"n": len(added)})).scalars().all()
+                    records = self._records(document_id, added, embeddings, datetime.utcnow())
+                    await copy_records(db, "hadis_chunks", ["id"] + CHUNK_COLUMNS,
+                                       [(i,) + r for i, r in zip(ids, records)])
+                    if not store.is_base:
+                        await copy_records(db, store.table_name, ["chunk_id", "embedding"],
+                                           list(zip(ids, embeddings)))
+                    stats["added_ids"] = list(ids)
+                # Per potongan: batas parameter bind asyncpg
+                for start in range(0, len(removed), 10000):
+                    await db.execute(delete(HadisChunk).where(HadisChunk.id.in_(removed[start:start + 10000])))
+                if moved:
+                    await db.execute(update(HadisChunk), moved)
+                await db.commit()
+
+        stats["removed_ids"] = removed
+        return stats
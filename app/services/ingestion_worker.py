@@ -0,0 +1,251 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, update, delete, func, or_
+from app.database.connection import AsyncSessionLocal
+from app.models.chunk import HadisChunk
+from app.models.document import HadisDocument, DocumentStatus, DocumentJob
+from app.services.embedding_service import get_embedding_service
+from app.services.chunker import HadisChunker
+from app.services.ingestion import IngestionPipeline
+from app.services.memory_index import get_memory_index
+from app.services.answer_cache import get_answer_cache
+from app.services.documents import original_filename, release_page_cache
+from app.services.pdf_processor import PDFProcessor, file_sha256
+from config import settings
+
+class IngestionWorker:
+    """Worker ingest lokal yang mengambil job dari tabel hadis_documents.
+
+    Dokumen berstatus PROCESSING adalah job. Klaim memakai
+    FOR UPDATE SKIP LOCKED + heartbeat, jadi beberapa proses uvicorn bisa
+    berbagi antrian dan job dari worker yang mati diambil alih lalu
+    dilanjutkan dari halaman terakhir yang sudah di-commit. Job RECHUNK /
+    REPLACE ditukar dalam satu transaksi, jadi diambil alih dari awal.
+    """
+
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        self.concurrency = concurrency or settings.INGEST_WORKERS
+        self.poll_interval = poll_interval or settings.INGEST_POLL_INTERVAL
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Bangunkan worker segera setelah ada upload baru"""
+        self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                document_id = await self._claim()
+            except Exception as e:
+                print(f"✗ Gagal klaim job ingest: {e}")
+                document_id = None
+
+            if document_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self._process(document_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Job tetap diklaim; diambil alih lagi setelah heartbeat-nya basi
+                print(f"✗ Job ingest dokumen {document_id} gagal: {e}")
+
+    async def _claim(self) -> Optional[int]:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+
+        candidate = (
+            select(HadisDocument.id)
+            .where(
+                HadisDocument.status == DocumentStatus.PROCESSING,
+                or_(HadisDocument.claimed_by.is_(None), HadisDocument.heartbeat_at < stale)
+            )
+            .order_by(HadisDocument.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(HadisDocument)
+                .where(HadisDocument.id == candidate)
+                .values(claimed_by=self.worker_id, heartbeat_at=now)
+                .returning(HadisDocument.id)
+            )
+            document_id = result.scalar_one_or_none()
+            await db.commit()
+            return document_id
+
+    async def _process(self, document_id: int):
+        async with AsyncSessionLocal() as db:
+            doc = await db.get(HadisDocument, document_id)
+            if doc is None:
+                return
+            path = doc.file_path
+            content_hash = doc.content_hash
+            collection = doc.collection
+            processed = doc.processed_pages or 0
+            job, total_pages = doc.job, doc.total_pages
+
+            resume = processed + 1
+            if job == DocumentJob.INGEST:
+                # Buang sisa halaman yang belum sempat di-commit, juga chunk lintas
+                # halaman yang berlanjut ke halaman resume, sebelum melanjutkan
+                resume = await self._resume_page(db, document_id, processed)
+                await db.execute(
+                    delete(HadisChunk)
+                    .where(HadisChunk.document_id == document_id, HadisChunk.page_number >= resume)
+                )
+                await db.commit()
+
+        if job != DocumentJob.INGEST:
+            await self._reprocess(document_id, job, path, content_hash, collection, total_pages)
+            return
+
+        try:
+            pipeline = IngestionPipeline(get_embedding_service(),
+                                         chunker=HadisChunker.for_collection(collection))
+            await pipeline.run(path, document_id, start_page=resume, file_hash=content_hash)
+        except asyncio.CancelledError:
+            # Shutdown: biarkan status PROCESSING supaya dilanjutkan nanti
+            raise
+        except Exception as e:
+            print(f"✗ Ingest dokumen {document_id} gagal: {e}")
+            await self._finish(document_id, DocumentStatus.FAILED, path, error=str(e))
+            return
+
+        await self._finish(document_id, DocumentStatus.COMPLETED, path)
+
+    @staticmethod
+    async def _resume_page(db, document_id: int, processed: int) -> int:
+        """Halaman awal resume yang tidak memotong chunk tersimpan.
+
+        Chunker memulai stream baru di halaman resume, jadi teks awal halaman
+        itu akan di-chunk lagi. Kalau teks tersebut sudah ada di chunk lintas
+        halaman (metadata page_end) yang mulai lebih awal, resume mundur ke
+        halaman awal chunk itu (berulang untuk rantai chunk lintas halaman).
+        """
+        page_end = HadisChunk.chunk_metadata['page_end'].as_integer()
+        resume = processed + 1
+        while True:
+            start = (await db.execute(
+                select(func.min(HadisChunk.page_number))
+                .where(HadisChunk.document_id == document_id,
+                       HadisChunk.page_number < resume, page_end >= resume)
+            )).scalar()
+            if start is None:
+                return resume
+            resume = start
+
+    async def _finish(self, document_id: int, status: DocumentStatus, path: str, error: str = None):
+        async with AsyncSessionLocal() as db:
+            if status == DocumentStatus.FAILED:
+                await db.execute(delete(HadisChunk).where(HadisChunk.document_id == document_id))
+            await db.execute(
+                update(HadisDocument)
+                .where(HadisDocument.id == document_id)
+                .values(status=status, error=error, claimed_by=None)
+            )
+            await db.commit()
+
+        if status == DocumentStatus.COMPLETED and settings.VECTOR_BACKEND == "memory":
+            await get_memory_index().refresh()
+
+        # Korpus berubah (chunk baru, atau chunk parsial yang dibuang)
+        get_answer_cache().invalidate()
+
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    async def _heartbeat(self, document_id: int, pages: int):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(HadisDocument)
+                .where(HadisDocument.id == document_id)
+                .values(processed_pages=pages, heartbeat_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    async def _reprocess(self, document_id: int, job: DocumentJob, path: Optional[str],
+                         content_hash: Optional[str], collection: Optional[str], total_pages: Optional[int]):
+        """RECHUNK (teks dari page cache) / REPLACE (PDF baru): hanya chunk yang berubah ditukar"""
+        pdf = PDFProcessor()
+        values = {}
+        try:
+            pipeline = IngestionPipeline(get_embedding_service(), pdf=pdf,
+                                         chunker=HadisChunker.for_collection(collection))
+            if job == DocumentJob.REPLACE:
+                new_hash = await asyncio.to_thread(file_sha256, path)
+                values = {"content_hash": new_hash, "filename": original_filename(path),
+                          "total_pages": await pdf.get_page_count(path)}
+                pages = pdf.extract_text(path, 1, new_hash)
+            else:
+                pages = pdf.stored_text(content_hash, total_pages)
+            stats = await pipeline.reconcile(document_id, pages,
+                                             progress=lambda n: self._heartbeat(document_id, n))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Chunk lama belum tersentuh (swap hanya saat commit): dokumen tetap bisa dicari
+            print(f"✗ {job.value} dokumen {document_id} gagal: {e}")
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(HadisDocument)
+                    .where(HadisDocument.id == document_id)
+                    .values(status=DocumentStatus.COMPLETED, error=f"{job.value} gagal: {e}",
+                            claimed_by=None, processed_pages=total_pages)
+                )
+                await db.commit()
+                if values:
+                    await release_page_cache(db, values["content_hash"])
+            if job == DocumentJob.REPLACE and path and os.path.exists(path):
+                os.remove(path)
+            return
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(HadisDocument)
+                .where(HadisDocument.id == document_id)
+                .values(status=DocumentStatus.COMPLETED, error=None, claimed_by=None,
+                        processed_pages=stats["total_pages"], **values)
+            )
+            await db.commit()
+            if job == DocumentJob.REPLACE and values["content_hash"] != content_hash:
+                await release_page_cache(db, content_hash)
+
+        # Update per chunk: index memori di-append/tombstone, cache hanya membuang
+        # jawaban yang mengutip chunk lama (chunk baru ikut retrieval berikutnya)
+        if settings.VECTOR_BACKEND == "memory":
+            await get_memory_index().update_chunks(document_id, stats["removed_ids"], stats["added_ids"])
+        get_answer_cache().evict_chunks(stats["removed_ids"])
+
+        print(f"✓ {job.value} dokumen {document_id}: {stats['kept']} chunk tetap, "
+              f"{len(stats['added_ids'])} baru ({stats['reused_embeddings']} embedding dipakai ulang), "
+              f"{len(stats['removed_ids'])} dihapus")
+        if job == DocumentJob.REPLACE and path and os.path.exists(path):
+            os.remove(path)
+
+
+ingestion_worker = IngestionWorker()
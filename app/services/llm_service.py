@@ -1,62 +1,80 @@
 import ollama
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 from config import settings
+from app.prompts.hadis import render_prompt
+from app.services.context_builder import get_context_builder
+from app.utils.metrics import timed, record_ollama_stats
+
+_client: ollama.AsyncClient = None
+
+def get_ollama_client() -> ollama.AsyncClient:
+    """Satu AsyncClient (connection pool httpx) per proses"""
+    global _client
+    if _client is None:
+        _client = ollama.AsyncClient(host=settings.OLLAMA_HOST)
+    return _client
 
 class LLMService:
+    ERROR_PREFIX = "Maaf, terjadi kesalahan dalam menghasilkan jawaban"
+
+    GENERATE_OPTIONS = {
+        "temperature": 0.3,  # Lower untuk akurasi lebih tinggi
+        "top_p": 0.9,
+        "top_k": 40,
+        "num_predict": 600,
+        "stop": ["\n\nPERTANYAAN:", "KONTEKS:"]
+    }
+
+    def __init__(self):
+        self.client = get_ollama_client()
+
+    def _build_prompt(self, query: str, context_chunks: List[Dict]) -> str:
+        # Konteks dalam budget token; prefix instruksi statis (lihat app/prompts/hadis.py)
+        return render_prompt(query, get_context_builder().build(context_chunks))
+
     async def generate_response(self, query: str, context_chunks: List[Dict]) -> str:
         """Generate response dengan prompt khusus hadis"""
-        
-        # Build rich context dengan metadata
-        context_parts = []
-        for i, chunk in enumerate(context_chunks[:3], 1):
-            meta = chunk.get('metadata', {})
-            
-            # Format context dengan metadata
-            context_str = f"\n=== Sumber {i} (Halaman {chunk['page_number']}) ===\n"
-            
-            if meta.get('kitab'):
-                context_str += f"Kitab: {meta['kitab']}\n"
-            if meta.get('nomor_hadis'):
-                context_str += f"Nomor Hadis: {meta['nomor_hadis']}\n"
-            if meta.get('perawi'):
-                context_str += f"Perawi: HR. {meta['perawi']}\n"
-            if meta.get('derajat'):
-                context_str += f"Derajat: {meta['derajat']}\n"
-            
-            context_str += f"\nTeks:\n{chunk['text'][:500]}\n"
-            context_parts.append(context_str)
-        
-        context = "\n".join(context_parts)
-        
-        # Enhanced prompt untuk hadis
-        prompt = f"""Anda adalah asisten ahli hadis Islam yang membantu menjawab pertanyaan tentang hadis dengan akurat dan terpercaya.
-
-KONTEKS HADIS:
-{context}
-
-PERTANYAAN: {query}
-
-INSTRUKSI:
-1. Jawab berdasarkan HANYA konteks hadis yang diberikan di atas
-2. Jika ada informasi perawi, kitab, atau nomor hadis, sebutkan dalam jawaban
-3. Jika konteks tidak cukup untuk menjawab, katakan dengan jujur
-4. Gunakan bahasa yang sopan dan mudah dipahami
-5. Jika relevan, sebutkan derajat hadis (shahih/hasan/dhaif)
-
-JAWABAN:"""
-        
+        prompt = self._build_prompt(query, context_chunks)
+
         try:
-            response = ollama.generate(
+            with timed("llm.generate"):
+                response = await self.client.generate(
+                    model=settings.OLLAMA_MODEL,
+                    prompt=prompt,
+                    options=self.GENERATE_OPTIONS,
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE
+                )
+            record_ollama_stats(response)
+            return response['response'].strip()
+        except Exception as e:
+            return f"{self.ERROR_PREFIX}: {str(e)}"
+
+    async def complete(self, prompt: str, stage: str, **options) -> str:
+        """Generate singkat untuk tugas bantu (rewrite, ringkasan); error diteruskan ke pemanggil"""
+        with timed(stage):
+            response = await self.client.generate(
                 model=settings.OLLAMA_MODEL,
                 prompt=prompt,
-                options={
-                    "temperature": 0.3,  # Lower untuk akurasi lebih tinggi
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "num_predict": 600,
-                    "stop": ["\n\nPERTANYAAN:", "KONTEKS:"]
-                }
+                options={**self.GENERATE_OPTIONS, "temperature": 0.0, **options},
+                keep_alive=settings.OLLAMA_KEEP_ALIVE
             )
-            return response['response'].strip()
-        except Exception as e:
-            return f"Maaf, terjadi kesalahan dalam menghasilkan jawaban: {str(e)}"
\ No newline at end of file
+        record_ollama_stats(response)
+        return response['response'].strip()
+
+    async def stream_response(self, query: str, context_chunks: List[Dict]) -> AsyncIterator[str]:
+        """Stream token jawaban begitu dihasilkan Ollama"""
+        prompt = self._build_prompt(query, context_chunks)
+
+        stream = await self.client.generate(
+            model=settings.OLLAMA_MODEL,
+            prompt=prompt,
+            options=self.GENERATE_OPTIONS,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            stream=True
+        )
+        with timed("llm.stream"):
+            async for part in stream:
+                if part['response']:
+                    yield part['response']
+                if part.get('done'):
+                    record_ollama_stats(part)
@@ -0,0 +1,336 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import select
+from app.database.connection import AsyncSessionLocal
+from app.database.embedding_store import EmbeddingStore, current_store
+from app.models.chunk import HadisChunk
+from app.models.document import HadisDocument, DocumentStatus
+from config import settings
+from app.utils.metrics import timed
+
+BLOCK_ROWS = 65536
+INT8_SCALE = 127.0
+
+class MemoryVectorIndex:
+    """Index vector in-process berbasis file memory-mapped.
+
+    Embedding disimpan sebagai matriks float32/int8 yang di-mmap, jadi
+    beberapa worker uvicorn berbagi page cache yang sama. Teks & metadata
+    chunk ikut disimpan (JSONL + offset) sehingga search tidak perlu ke DB.
+    Dokumen ditambah secara append; dokumen/chunk yang dihapus hanya ditandai
+    (tombstone) dan di-mask saat search, chunk hasil re-chunk di-append.
+    Index berlaku untuk satu versi
+    embedding; begitu versi aktif berganti, refresh membangunnya ulang.
+    """
+
+    def __init__(self, path: str = None, dtype: str = None):
+        self.path = path or settings.MEMORY_INDEX_DIR
+        self.dtype = np.dtype(dtype or settings.MEMORY_INDEX_DTYPE)
+        self.count = 0
+        self.documents: set = set()
+        self.deleted_documents: set = set()
+        self.deleted_chunks: set = set()
+        self._meta_mtime = None
+        self._last_check = 0.0
+        self._lock = asyncio.Lock()
+        self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_meta(self) -> Dict:
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"count": 0, "text_bytes": 0, "documents": [], "deleted_documents": [], "deleted_chunks": []}
+
+    _FILES = ("vectors.bin", "ids.i64", "docs.i64", "offsets.i64", "chunks.jsonl", "meta.json")
+
+    def _map(self, name: str, dtype, shape):
+        if not shape[0]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+
+    def _load(self):
+        meta = self._read_meta()
+        if meta.get("dtype", self.dtype.name) != self.dtype.name:
+            raise ValueError(f"Index di {self.path} memakai dtype {meta['dtype']}, bukan {self.dtype.name}")
+
+        self.count = meta["count"]
+        # Index lama (sebelum ada versi embedding) selalu versi 0
+        self.version = meta.get("embedding_version", 0)
+        self.dim = meta.get("dim", EmbeddingStore.base().dim)
+        self.model = meta.get("model", settings.EMBEDDING_MODEL)
+        self.documents = set(meta["documents"])
+        self.deleted_documents = set(meta["deleted_documents"])
+        self.deleted_chunks = set(meta.get("deleted_chunks", []))
+        self._text_bytes = meta["text_bytes"]
+
+        self.vectors = self._map("vectors.bin", self.dtype, (self.count, self.dim))
+        self.chunk_ids = self._map("ids.i64", np.int64, (self.count,))
+        self.document_ids = self._map("docs.i64", np.int64, (self.count,))
+        self.offsets = self._map("offsets.i64", np.int64, (self.count,))
+        self.records = self._map("chunks.jsonl", np.uint8, (self._text_bytes,))
+
+        self._deleted_mask = None
+        if self.deleted_documents and self.count:
+            self._deleted_mask = np.isin(self.document_ids, list(self.deleted_documents))
+        if self.deleted_chunks and self.count:
+            chunks = np.isin(self.chunk_ids, list(self.deleted_chunks))
+            self._deleted_mask = chunks if self._deleted_mask is None else self._deleted_mask | chunks
+
+        meta_path = self._file("meta.json")
+        self._meta_mtime = os.stat(meta_path).st_mtime_ns if os.path.exists(meta_path) else None
+
+    def _maybe_reload(self):
+        """Remap kalau worker lain sudah memperbarui index"""
+        now = time.monotonic()
+        if now - self._last_check < settings.MEMORY_INDEX_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._meta_mtime:
+            self._load()
+
+    def serves(self, version: int) -> bool:
+        """True jika index (setelah remap terbaru) berisi embedding versi ini"""
+        self._maybe_reload()
+        return self.version == version
+
+    def _record(self, i: int) -> Dict:
+        start = int(self.offsets[i])
+        end = int(self.offsets[i + 1]) if i + 1 < self.count else self._text_bytes
+        return json.loads(self.records[start:end].tobytes())
+
+    def search(self, query_embedding: List[float], top_k: int) -> List[Dict]:
+        """Top-k cosine: perkalian matriks-vector per blok + argpartition"""
+        with timed("search.memory"):
+            return self._search_many([query_embedding], top_k)[0]
+
+    def search_many(self, query_embeddings: List[List[float]], top_k: int) -> List[List[Dict]]:
+        """Top-k untuk banyak query dengan satu perkalian matriks per blok"""
+        with timed("search.memory"):
+            return self._search_many(query_embeddings, top_k)
+
+    def _search_many(self, query_embeddings: List[List[float]], top_k: int) -> List[List[Dict]]:
+        self._maybe_reload()
+        if not self.count:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).T  # (dim, n_query)
+        cand_scores, cand_idx = [], []
+
+        for start in range(0, self.count, BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            scores = block.astype(np.float32, copy=False) @ queries  # (baris blok, n_query)
+            if self.dtype == np.int8:
+                scores /= INT8_SCALE
+            if self._deleted_mask is not None:
+                scores[self._deleted_mask[start:start + BLOCK_ROWS]] = -np.inf
+
+            k = min(top_k, len(scores))
+            idx = np.argpartition(-scores, k - 1, axis=0)[:k]
+            cand_scores.append(np.take_along_axis(scores, idx, axis=0))
+            cand_idx.append(idx + start)
+
+        scores = np.concatenate(cand_scores)
+        idx = np.concatenate(cand_idx)
+        order = np.argsort(-scores, axis=0)[:top_k]
+
+        all_results = []
+        for q in range(scores.shape[1]):
+            results = []
+            for pos in order[:, q]:
+                if not np.isfinite(scores[pos, q]):
+                    break
+                i = int(idx[pos, q])
+                record = self._record(i)
+                results.append({
+                    "chunk_id": int(self.chunk_ids[i]),
+                    "text": record["text"],
+                    "page_number": record["page_number"],
+                    "similarity": float(scores[pos, q]),
+                    "metadata": record["metadata"] or {}
+                })
+            all_results.append(results)
+        return all_results
+
+    def _truncate_to_meta(self):
+        # Buang sisa append yang tidak sempat tercatat di meta (crash di tengah refresh)
+        for name, size in (
+            ("vectors.bin", self.count * self.dim * self.dtype.itemsize),
+            ("ids.i64", self.count * 8),
+            ("docs.i64", self.count * 8),
+            ("offsets.i64", self.count * 8),
+            ("chunks.jsonl", self._text_bytes),
+        ):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def _append(self, rows: List[tuple], state: Dict):
+        # state menyimpan count/text_bytes yang sedang ditulis, terpisah dari
+        # view yang sedang dipakai search sampai meta baru ditulis
+        vectors = np.asarray([r[4] for r in rows], dtype=np.float32)
+        if self.dtype == np.int8:
+            vectors = np.clip(np.round(vectors * INT8_SCALE), -127, 127)
+        vectors = vectors.astype(self.dtype)
+
+        blobs = [
+            (json.dumps({"text": r[2], "page_number": r[3], "metadata": r[5]}, ensure_ascii=False) + "\n").encode()
+            for r in rows
+        ]
+        offsets = np.cumsum([0] + [len(b) for b in blobs[:-1]], dtype=np.int64) + state["text_bytes"]
+
+        for name, data in (
+            ("vectors.bin", vectors.tobytes()),
+            ("ids.i64", np.asarray([r[0] for r in rows], dtype=np.int64).tobytes()),
+            ("docs.i64", np.asarray([r[1] for r in rows], dtype=np.int64).tobytes()),
+            ("offsets.i64", offsets.tobytes()),
+            ("chunks.jsonl", b"".join(blobs)),
+        ):
+            with open(self._file(name), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        state["count"] += len(rows)
+        state["text_bytes"] += sum(len(b) for b in blobs)
+
+    def _write_meta(self, state: Dict = None):
+        state = state or {"count": self.count, "text_bytes": self._text_bytes,
+                          "store": EmbeddingStore(self.version, self.model, self.dim)}
+        # Tulis meta terakhir & atomik: pembaca hanya melihat baris yang sudah lengkap
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "count": state["count"],
+                "dim": state["store"].dim,
+                "dtype": self.dtype.name,
+                "model": state["store"].model,
+                "embedding_version": state["store"].version,
+                "text_bytes": state["text_bytes"],
+                "documents": sorted(self.documents),
+                "deleted_documents": sorted(self.deleted_documents),
+                "deleted_chunks": sorted(self.deleted_chunks),
+            }, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    async def _exclusive(self):
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(self._file(".lock"), os.O_CREAT | os.O_RDWR)
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _release(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _reset(self):
+        """Kosongkan index (ganti versi embedding); pembaca tetap memakai mmap lama"""
+        for name in self._FILES:
+            path = self._file(name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._load()
+
+    async def refresh(self, store: EmbeddingStore = None) -> int:
+        """Tambahkan chunk dari dokumen COMPLETED yang belum ada di index"""
+        store = store or current_store()
+        async with self._lock:
+            fd = await self._exclusive()
+            try:
+                self._load()
+                if store.version != self.version and self.count:
+                    self._reset()
+                self._truncate_to_meta()
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(HadisDocument.id).where(HadisDocument.status == DocumentStatus.COMPLETED)
+                    )
+                    pending = sorted(set(result.scalars().all()) - self.documents - self.deleted_documents)
+
+                    self.dim = store.dim
+                    state = {"count": self.count, "text_bytes": self._text_bytes, "store": store}
+                    for document_id in pending:
+                        stream = await db.stream(
+                            store.join(select(HadisChunk.id, HadisChunk.document_id, HadisChunk.chunk_text,
+                                              HadisChunk.page_number, store.column, HadisChunk.chunk_metadata))
+                            .where(HadisChunk.document_id == document_id)
+                            .order_by(HadisChunk.id)
+                            .execution_options(yield_per=5000)
+                        )
+                        async for rows in stream.partitions():
+                            await asyncio.to_thread(self._append, rows, state)
+                        self.documents.add(document_id)
+
+                added = state["count"] - self.count
+                if pending or store.version != self.version:
+                    self._write_meta(state)
+                    self._load()
+                return added
+            finally:
+                self._release(fd)
+
+    async def remove_documents(self, document_ids: Iterable[int]):
+        """Tandai dokumen sebagai terhapus (tanpa rebuild)"""
+        async with self._lock:
+            fd = await self._exclusive()
+            try:
+                self._load()
+                self.deleted_documents.update(document_ids)
+                self._write_meta()
+                self._load()
+            finally:
+                self._release(fd)
+
+    async def update_chunks(self, document_id: int, removed: Iterable[int], added: Iterable[int],
+                            store: EmbeddingStore = None) -> int:
+        """Hasil re-chunk satu dokumen: tombstone chunk lama, append chunk baru, satu meta"""
+        store = store or current_store()
+        async with self._lock:
+            fd = await self._exclusive()
+            try:
+                self._load()
+                # Dokumen yang belum masuk index (atau versi lain) diurus refresh() biasa
+                if document_id not in self.documents or store.version != self.version:
+                    return 0
+                self._truncate_to_meta()
+                self.deleted_chunks.update(removed)
+                state = {"count": self.count, "text_bytes": self._text_bytes, "store": store}
+                added = sorted(added)
+                async with AsyncSessionLocal() as db:
+                    for start in range(0, len(added), 10000):
+                        result = await db.execute(
+                            store.join(select(HadisChunk.id, HadisChunk.document_id, HadisChunk.chunk_text,
+                                              HadisChunk.page_number, store.column, HadisChunk.chunk_metadata))
+                            .where(HadisChunk.id.in_(added[start:start + 10000]))
+                            .order_by(HadisChunk.id)
+                        )
+                        rows = result.all()
+                        if rows:
+                            await asyncio.to_thread(self._append, rows, state)
+                self._write_meta(state)
+                self._load()
+                return len(added)
+            finally:
+                self._release(fd)
+
+
+_memory_index: Optional[MemoryVectorIndex] = None
+
+def get_memory_index() -> MemoryVectorIndex:
+    global _memory_index
+    if _memory_index is None:
+        _memory_index = MemoryVectorIndex()
+    return _memory_index
@@ -1,10 +1,169 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
 import fitz
+from app.utils.metrics import timed
+from config import settings
+
+def _extract_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Ekstrak halaman [start, end) (0-based); dijalankan di thread atau proses worker"""
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+def file_sha256(path: str) -> str:
+    """Hash isi file, dibaca per blok supaya memori tetap kecil"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: proses induk sudah punya thread (model embedding), fork tidak aman
+            _pool = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+class PageCache:
+    """Cache teks per halaman di disk, dikunci hash isi file.
+
+    Upload ulang file yang sama atau retry job tidak perlu ekstraksi ulang.
+    Layout: <dir>/<sha256>/<nomor_halaman>.txt
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(settings.UPLOAD_DIR, ".page_cache")
+
+    def _path(self, file_hash: str, page_number: int) -> str:
+        return os.path.join(self.directory, file_hash, f"{page_number}.txt")
+
+    def get_range(self, file_hash: str, start: int, end: int) -> Optional[List[str]]:
+        """Teks halaman [start, end) (0-based), None jika ada yang belum tersimpan"""
+        texts = []
+        for i in range(start, end):
+            try:
+                with open(self._path(file_hash, i + 1), encoding="utf-8") as f:
+                    texts.append(f.read())
+            except FileNotFoundError:
+                return None
+        return texts
+
+    def put_range(self, file_hash: str, start: int, texts: List[str]):
+        os.makedirs(os.path.join(self.directory, file_hash), exist_ok=True)
+        for i, text in enumerate(texts, start):
+            path = self._path(file_hash, i + 1)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+    def has_pages(self, file_hash: str, total_pages: int) -> bool:
+        return all(os.path.exists(self._path(file_hash, i)) for i in range(1, total_pages + 1))
+
+    def remove(self, file_hash: str):
+        shutil.rmtree(os.path.join(self.directory, file_hash), ignore_errors=True)
 
 class PDFProcessor:
-    async def extract_text(self, pdf_path: str):
-        doc = fitz.open(pdf_path)
-        pages = []
-        for i in range(len(doc)):
-            pages.append({"page_number": i + 1, "text": doc[i].get_text()})
-        doc.close()
-        return {"pages": pages, "total_pages": len(pages)}
\ No newline at end of file
+    def __init__(self, page_cache: Optional[bool] = None):
+        use_cache = settings.PDF_PAGE_CACHE if page_cache is None else page_cache
+        self.cache = PageCache() if use_cache else None
+
+    async def extract_text(self, pdf_path: str, start_page: int = 1,
+                           file_hash: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Stream halaman berurutan mulai start_page, ekstraksi di luar event loop.
+
+        Halaman diproses per rentang PDF_PAGES_PER_TASK; untuk PDF besar rentang
+        dibagi ke process pool. Paling banyak PDF_EXTRACT_WORKERS rentang yang
+        sedang diproses atau menunggu dikonsumsi, jadi memori tidak bergantung
+        pada tebal kitab. file_hash (jika sudah diketahui) menghindari hash ulang.
+        """
+        total = await self.get_page_count(pdf_path)
+        first = start_page - 1
+        if first >= total:
+            return
+
+        if not self.cache:
+            file_hash = None
+        elif file_hash is None:
+            file_hash = await asyncio.to_thread(file_sha256, pdf_path)
+        parallel = (settings.PDF_EXTRACT_WORKERS > 1
+                    and total - first >= settings.PDF_PARALLEL_MIN_PAGES)
+        step = settings.PDF_PAGES_PER_TASK
+        ranges = iter([(s, min(s + step, total)) for s in range(first, total, step)])
+        window = max(settings.PDF_EXTRACT_WORKERS, 1)
+
+        pending = deque()
+        try:
+            for start, end in ranges:
+                pending.append(asyncio.create_task(self._load_range(pdf_path, file_hash, start, end, parallel)))
+                if len(pending) >= window:
+                    break
+
+            while pending:
+                start, texts = await pending.popleft()
+                # Isi kembali jendela sebelum yield supaya worker tetap sibuk
+                nxt = next(ranges, None)
+                if nxt:
+                    pending.append(asyncio.create_task(self._load_range(pdf_path, file_hash, *nxt, parallel)))
+                for offset, text in enumerate(texts):
+                    yield {"page_number": start + offset + 1, "text": text}
+        finally:
+            for task in pending:
+                task.cancel()
+            # Tunggu range yang masih jalan selesai dibatalkan supaya exception-nya
+            # tidak hilang ("never retrieved") dan file tidak dibaca setelah dihapus
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stored_text(self, file_hash: str, total_pages: int) -> AsyncIterator[Dict]:
+        """Stream halaman dari page cache saja (PDF asli sudah dihapus setelah ingest)"""
+        cache = self.cache or PageCache()
+        step = settings.PDF_PAGES_PER_TASK
+        for start in range(0, total_pages, step):
+            texts = await asyncio.to_thread(cache.get_range, file_hash, start, min(start + step, total_pages))
+            if texts is None:
+                raise FileNotFoundError(f"Teks halaman {file_hash} tidak lengkap di page cache")
+            for offset, text in enumerate(texts):
+                yield {"page_number": start + offset + 1, "text": text}
+
+    async def _load_range(self, pdf_path: str, file_hash: Optional[str], start: int, end: int,
+                          parallel: bool):
+        if file_hash:
+            cached = await asyncio.to_thread(self.cache.get_range, file_hash, start, end)
+            if cached is not None:
+                return start, cached
+
+        with timed("pdf.extract_range"):
+            if parallel:
+                loop = asyncio.get_running_loop()
+                texts = await loop.run_in_executor(_get_pool(), _extract_range, pdf_path, start, end)
+            else:
+                texts = await asyncio.to_thread(_extract_range, pdf_path, start, end)
+
+        if file_hash:
+            await asyncio.to_thread(self.cache.put_range, file_hash, start, texts)
+        return start, texts
+
+    async def get_page_count(self, pdf_path: str) -> int:
+        def count():
+            with fitz.open(pdf_path) as doc:
+                return len(doc)
+        return await asyncio.to_thread(count)
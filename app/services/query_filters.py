@@ -0,0 +1,50 @@
+import re
+from typing import Dict, Optional
+
+# Sinonim derajat seperti yang dihasilkan chunker.extract_metadata
+DERAJAT_GROUPS = {
+    'shahih': ['shahih', 'sahih'],
+    'sahih': ['shahih', 'sahih'],
+    'hasan': ['hasan'],
+    'dhaif': ['dhaif', 'daif'],
+    'daif': ['dhaif', 'daif'],
+}
+
+PERAWI_NAMES = [
+    'bukhari', 'muslim', 'abu dawud', 'abu daud', 'tirmidzi', 'tirmidhi',
+    'nasai', "nasa'i", 'ibnu majah', 'ibn majah', 'ahmad', 'malik', 'darimi',
+]
+
+# "Shahih Bukhari/Muslim" adalah nama kitab, bukan derajat
+_DERAJAT_PATTERN = re.compile(r'\b(shahih|sahih|hasan|dhaif|daif)\b(?!\s+(?:bukhari|muslim)\b)', re.IGNORECASE)
+_PERAWI_PATTERN = re.compile(
+    r'\b(?:riwayat|diriwayatkan\s+oleh|hr\.?|perawi)\s+(' + '|'.join(re.escape(n) for n in PERAWI_NAMES) + r')\b',
+    re.IGNORECASE
+)
+
+def _perawi_key(name: str) -> str:
+    # Chunker hanya menangkap satu kata setelah "HR." (mis. "Abu" untuk Abu Dawud)
+    return name.split()[0].lower()
+
+def normalize_filters(filters: Optional[Dict]) -> Dict:
+    """Samakan bentuk nilai filter dengan isi chunk_metadata"""
+    result = {k: v for k, v in (filters or {}).items() if v not in (None, '')}
+    if 'perawi' in result:
+        result['perawi'] = _perawi_key(result['perawi'])
+    if 'kitab' in result:
+        result['kitab'] = result['kitab'].lower()
+    if 'derajat' in result:
+        derajat = result['derajat'].lower()
+        result['derajat'] = DERAJAT_GROUPS.get(derajat, [derajat])
+    return result
+
+def extract_filters(query: str) -> Dict:
+    """Tebak filter dari teks, mis. "hadis shahih riwayat Muslim tentang ..." """
+    filters = {}
+    match = _DERAJAT_PATTERN.search(query)
+    if match:
+        filters['derajat'] = match.group(1)
+    match = _PERAWI_PATTERN.search(query)
+    if match:
+        filters['perawi'] = match.group(1)
+    return filters
@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.utils.metrics import timed, RERANK_RESULTS
+from app.utils.text import text_hash
+from config import settings
+
+class HeuristicReranker:
+    """Re-rank berdasarkan quality signals (metadata lengkap, panjang teks)"""
+
+    async def rerank(self, query: Optional[str], candidates: List[Dict]) -> List[Dict]:
+        return self.score(candidates)
+
+    @staticmethod
+    def score(candidates: List[Dict]) -> List[Dict]:
+        for candidate in candidates:
+            score = candidate.get('fused_score', candidate['similarity'])
+            meta = candidate['metadata']
+
+            # Boost jika ada metadata lengkap
+            if meta.get('nomor_hadis'):
+                score += 0.05
+            if meta.get('perawi'):
+                score += 0.05
+            if meta.get('kitab'):
+                score += 0.05
+            if meta.get('derajat') in ['shahih', 'sahih']:
+                score += 0.1
+
+            # Boost jika text lebih panjang (lebih informatif)
+            text_length = len(candidate['text'])
+            if text_length > 500:
+                score += 0.03
+
+            candidate['final_score'] = min(score, 1.0)
+
+        # Sort by final score
+        return sorted(candidates, key=lambda x: x['final_score'], reverse=True)
+
+class CrossEncoderReranker:
+    """Re-rank dengan cross-encoder kecil di CPU, dibatasi anggaran latensi.
+
+    Kandidat di-skor per batch sesuai urutan retrieval. Sebelum tiap batch
+    sisa waktu dibandingkan dengan durasi batch sebelumnya; jika tidak cukup,
+    sisa kandidat tidak di-skor dan diurutkan dengan heuristik di belakang
+    kandidat yang sudah di-skor. Skor di-cache per (hash query, chunk_id).
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None,
+                 budget_ms: float = None, cache_size: int = None):
+        # Import di sini: torch baru dimuat jika cross-encoder benar-benar dipakai
+        from sentence_transformers import CrossEncoder
+
+        model_name = model_name or settings.RERANK_MODEL
+        print(f"Loading rerank model: {model_name}")
+        self.model = CrossEncoder(model_name, device="cpu", max_length=settings.RERANK_MAX_LENGTH)
+        print("✓ Rerank model loaded")
+
+        self.batch_size = batch_size or settings.RERANK_BATCH_SIZE
+        self.budget = (budget_ms or settings.RERANK_BUDGET_MS) / 1000
+        self.cache_size = cache_size or settings.RERANK_CACHE_SIZE
+        self._scores: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._batch_seconds: Optional[float] = None  # rata-rata bergerak durasi satu batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def _predict(self, query: str, texts: List[str]) -> List[float]:
+        """Inference sinkron, dijalankan di thread rerank"""
+        with timed("rerank.predict"):
+            scores = self.model.predict([(query, t) for t in texts], batch_size=len(texts),
+                                        show_progress_bar=False)
+        return [float(s) for s in scores]
+
+    def _remember(self, key: Tuple[str, int], score: float):
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        while len(self._scores) > self.cache_size:
+            self._scores.popitem(last=False)
+
+    async def rerank(self, query: Optional[str], candidates: List[Dict]) -> List[Dict]:
+        if not query or not candidates:
+            return HeuristicReranker.score(candidates)
+
+        deadline = time.monotonic() + self.budget
+        qhash = text_hash(query)
+        scores: Dict[int, float] = {}
+        missing = []
+        for c in candidates:
+            key = (qhash, c['chunk_id'])
+            if key in self._scores:
+                self._scores.move_to_end(key)
+                scores[c['chunk_id']] = self._scores[key]
+            else:
+                missing.append(c)
+
+        loop = asyncio.get_running_loop()
+        truncated = False
+        for i in range(0, len(missing), self.batch_size):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._batch_seconds and self._batch_seconds > remaining):
+                truncated = True
+                break
+
+            batch = missing[i:i + self.batch_size]
+            start = time.perf_counter()
+            # Context request disalin supaya span rerank.predict masuk Server-Timing
+            batch_scores = await loop.run_in_executor(
+                self._executor, contextvars.copy_context().run, self._predict, query, [c['text'] for c in batch]
+            )
+            elapsed = time.perf_counter() - start
+            self._batch_seconds = elapsed if self._batch_seconds is None else 0.8 * self._batch_seconds + 0.2 * elapsed
+
+            for c, score in zip(batch, batch_scores):
+                scores[c['chunk_id']] = score
+                self._remember((qhash, c['chunk_id']), score)
+
+        if not scores:
+            RERANK_RESULTS.labels("skipped").inc()
+            return HeuristicReranker.score(candidates)
+        RERANK_RESULTS.labels("truncated" if truncated else "full").inc()
+
+        scored = [c for c in candidates if c['chunk_id'] in scores]
+        for c in scored:
+            c['final_score'] = scores[c['chunk_id']]
+        scored.sort(key=lambda x: x['final_score'], reverse=True)
+        rest = HeuristicReranker.score([c for c in candidates if c['chunk_id'] not in scores])
+        return scored + rest
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    """Reranker sesuai settings.RERANKER (heuristic | cross-encoder), satu per proses"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                if settings.RERANKER.lower() == "cross-encoder":
+                    _reranker = CrossEncoderReranker()
+                else:
+                    _reranker = HeuristicReranker()
+    return _reranker
@@ -1,65 +1,265 @@
-from sqlalchemy import select
+import asyncio
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Integer, Text, cast, column, select, func, literal_column, true, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.chunk import HadisChunk
-from typing import List, Dict
+from app.database.embedding_store import EmbeddingStore, current_store
+from app.database.indexes import set_search_params
+from app.services.memory_index import get_memory_index
+from app.services.reranker import get_reranker
+from app.utils.text import query_terms, text_hash
+from app.utils.metrics import timed
+from typing import List, Dict, Optional
 from config import settings
 
 class VectorSearch:
-    async def search_similar(self, query_embedding: List[float], db: AsyncSession, top_k: int = None) -> List[Dict]:
-        """Search dengan re-ranking"""
+    def __init__(self, backend: str = None):
+        # "pgvector" (query ke DB) atau "memory" (matriks mmap in-process)
+        self.backend = (backend or settings.VECTOR_BACKEND).lower()
+    
+    async def search_similar(self, query_embedding: List[float], db: AsyncSession, top_k: int = None,
+                             ann_param: Optional[int] = None, query_text: str = None,
+                             filters: Optional[Dict] = None, store: EmbeddingStore = None) -> List[Dict]:
+        """Search dengan re-ranking.
+        
+        ann_param meng-override ef_search (HNSW) / probes (IVFFlat) untuk query ini saja.
+        Jika query_text diberikan, hasil lexical (tsvector) ikut digabung lewat RRF.
+        filters (hasil normalize_filters) diterapkan langsung di SQL.
+        store adalah versi embedding yang menghasilkan query_embedding (EmbeddingService.store).
+        """
+        store = store or current_store()
         if top_k is None:
-            top_k = settings.TOP_K_RESULTS * 2  # Ambil lebih banyak untuk re-rank
+            top_k = settings.RERANK_CANDIDATES  # Ambil lebih banyak untuk re-rank
+        
+        terms = query_terms(query_text) if query_text and settings.HYBRID_SEARCH else []
         
-        # Initial retrieval
-        query = select(
-            HadisChunk,
-            (1 - HadisChunk.embedding.cosine_distance(query_embedding)).label("similarity")
+        # Filter metadata hanya ada di DB, jadi query ber-filter selalu lewat pgvector;
+        # begitu juga selama index in-memory belum dibangun ulang untuk versi embedding ini
+        if self.backend == "memory" and not filters and get_memory_index().serves(store.version):
+            # Matmul numpy melepas GIL, jadi tidak memblokir event loop
+            vector_task = asyncio.to_thread(get_memory_index().search, query_embedding, top_k)
+            if terms:
+                rows, lexical = await asyncio.gather(
+                    vector_task, self._search_lexical(terms, query_embedding, db, store)
+                )
+            else:
+                rows, lexical = await vector_task, []
+        else:
+            rows = await self._search_pgvector(query_embedding, db, top_k, ann_param, store, filters)
+            lexical = await self._search_lexical(terms, query_embedding, db, store, filters) if terms else []
+        
+        return await self._finish(query_text, rows, lexical)
+    
+    async def search_many(self, query_embeddings: List[List[float]], db: AsyncSession,
+                          query_texts: List[str], top_k: int = None, filters: Optional[Dict] = None,
+                          store: EmbeddingStore = None) -> List[List[Dict]]:
+        """search_similar untuk banyak query sekaligus (filter yang sama untuk semua).
+        
+        Semua vector lookup jadi satu SQL (LATERAL per query) atau satu matmul
+        index in-memory, lexical juga satu SQL; fusion & re-rank tetap per query.
+        """
+        store = store or current_store()
+        top_k = top_k or settings.RERANK_CANDIDATES
+        terms = [query_terms(t) if t and settings.HYBRID_SEARCH else [] for t in query_texts]
+        
+        if self.backend == "memory" and not filters and get_memory_index().serves(store.version):
+            rows = await asyncio.to_thread(get_memory_index().search_many, query_embeddings, top_k)
+        else:
+            rows = await self._search_pgvector_many(query_embeddings, db, top_k, store, filters)
+        if any(terms):
+            lexical = await self._search_lexical_many(terms, query_embeddings, db, store, filters)
+        else:
+            lexical = [[] for _ in query_texts]
+        
+        return [await self._finish(text, r, lex) for text, r, lex in zip(query_texts, rows, lexical)]
+    
+    async def _finish(self, query_text: Optional[str], rows: List[Dict], lexical: List[Dict]) -> List[Dict]:
+        if lexical:
+            candidates = self._fuse(rows, lexical)
+        else:
+            candidates = [c for c in rows if c['similarity'] >= 0.6]  # Lower threshold untuk re-ranking
+        
+        # Re-rank (heuristik metadata atau cross-encoder, lihat RERANKER)
+        with timed("search.rerank"):
+            ranked = await get_reranker().rerank(query_text, candidates)
+        
+        # Return top K setelah re-rank, satu hasil per teks (kitab/edisi yang tumpang tindih)
+        return self._collapse_duplicates(ranked)[:settings.TOP_K_RESULTS]
+    
+    def _filter_clauses(self, filters: Optional[Dict]) -> List:
+        """WHERE untuk filter metadata; ekspresi sama persis dengan index di HadisChunk"""
+        if not filters:
+            return []
+        
+        def meta_field(name):
+            # Key harus literal (bukan bind param) supaya cocok dengan expression index
+            return func.lower(HadisChunk.chunk_metadata.op('->>')(literal_column(f"'{name}'")))
+        
+        clauses = []
+        if filters.get('kitab'):
+            clauses.append(meta_field('kitab') == filters['kitab'])
+        if filters.get('perawi'):
+            clauses.append(meta_field('perawi') == filters['perawi'])
+        if filters.get('derajat'):
+            clauses.append(meta_field('derajat').in_(filters['derajat']))
+        if filters.get('document_id'):
+            clauses.append(HadisChunk.document_id == filters['document_id'])
+        if filters.get('page_from'):
+            clauses.append(HadisChunk.page_number >= filters['page_from'])
+        if filters.get('page_to'):
+            clauses.append(HadisChunk.page_number <= filters['page_to'])
+        return clauses
+    
+    async def _search_pgvector(self, query_embedding: List[float], db: AsyncSession, top_k: int,
+                               ann_param: Optional[int], store: EmbeddingStore,
+                               filters: Optional[Dict] = None) -> List[Dict]:
+        if ann_param:
+            await set_search_params(db, ann_param)
+        
+        # Initial retrieval: hanya kolom yang dipakai, tanpa entity ORM & tanpa vector chunk
+        distance = store.column.cosine_distance(query_embedding)
+        query = store.join(select(
+            HadisChunk.id,
+            HadisChunk.chunk_text,
+            HadisChunk.page_number,
+            HadisChunk.chunk_metadata,
+            (1 - distance).label("similarity")
+        )).where(
+            *self._filter_clauses(filters)
         ).order_by(
-            HadisChunk.embedding.cosine_distance(query_embedding)
+            distance
         ).limit(top_k)
         
-        result = await db.execute(query)
-        rows = result.all()
-        
-        candidates = []
-        for chunk, similarity in rows:
-            if similarity >= 0.6:  # Lower threshold untuk re-ranking
-                candidates.append({
-                    "chunk_id": chunk.id,
-                    "text": chunk.chunk_text,
-                    "page_number": chunk.page_number,
-                    "similarity": float(similarity),
-                    "metadata": chunk.chunk_metadata or {}
-                })
-        
-        # Re-rank berdasarkan metadata quality
-        ranked = self._rerank(candidates)
-        
-        # Return top K setelah re-rank
-        return ranked[:settings.TOP_K_RESULTS]
+        with timed("search.vector"):
+            result = await db.execute(query)
+            rows = result.all()
+        return [self._row(row) for row in rows]
+    
+    async def _search_lexical(self, terms: List[str], query_embedding: List[float],
+                              db: AsyncSession, store: EmbeddingStore,
+                              filters: Optional[Dict] = None) -> List[Dict]:
+        """Full-text match (GIN) atas teks ternormalisasi, diurutkan ts_rank_cd"""
+        # Term hanya berisi karakter \w, aman dirangkai jadi tsquery OR
+        tsquery = func.to_tsquery('simple', ' | '.join(terms))
+        query = store.join(select(
+            HadisChunk.id,
+            HadisChunk.chunk_text,
+            HadisChunk.page_number,
+            HadisChunk.chunk_metadata,
+            (1 - store.column.cosine_distance(query_embedding)).label("similarity")
+        )).where(
+            HadisChunk.search_vector.op('@@')(tsquery),
+            *self._filter_clauses(filters)
+        ).order_by(
+            func.ts_rank_cd(HadisChunk.search_vector, tsquery).desc()
+        ).limit(settings.LEXICAL_TOP_K)
+        
+        with timed("search.lexical"):
+            result = await db.execute(query)
+            rows = result.all()
+        return [self._row(row) for row in rows]
+    
+    @staticmethod
+    def _row(row) -> Dict:
+        return {
+            "chunk_id": row.id,
+            "text": row.chunk_text,
+            "page_number": row.page_number,
+            "similarity": float(row.similarity),
+            "metadata": row.chunk_metadata or {}
+        }
+    
+    @staticmethod
+    def _group(rows, count: int) -> List[List[Dict]]:
+        """Hasil LATERAL (urut per query) -> list hasil per indeks query"""
+        grouped = [[] for _ in range(count)]
+        for row in rows:
+            grouped[row.idx].append(VectorSearch._row(row))
+        return grouped
+    
+    async def _search_pgvector_many(self, query_embeddings: List[List[float]], db: AsyncSession, top_k: int,
+                                    store: EmbeddingStore, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        queries = values(
+            column("idx", Integer), column("embedding", Vector(store.dim)), name="q"
+        ).data(list(enumerate(query_embeddings)))
+        
+        # Subquery per baris q: ORDER BY jarak LIMIT k tetap memakai index ANN.
+        # Parameter di VALUES tidak bertipe bagi asyncpg, jadi di-cast eksplisit
+        distance = store.column.cosine_distance(cast(queries.c.embedding, Vector(store.dim)))
+        nearest = store.join(select(
+            HadisChunk.id,
+            HadisChunk.chunk_text,
+            HadisChunk.page_number,
+            HadisChunk.chunk_metadata,
+            (1 - distance).label("similarity")
+        )).where(
+            *self._filter_clauses(filters)
+        ).order_by(
+            distance
+        ).limit(top_k).lateral("nearest")
+        
+        query = select(queries.c.idx, nearest).select_from(queries).join(nearest, true())
+        with timed("search.vector"):
+            result = await db.execute(query)
+            rows = result.all()
+        return self._group(rows, len(query_embeddings))
+    
+    async def _search_lexical_many(self, terms: List[List[str]], query_embeddings: List[List[float]],
+                                   db: AsyncSession, store: EmbeddingStore,
+                                   filters: Optional[Dict] = None) -> List[List[Dict]]:
+        queries = values(
+            column("idx", Integer), column("embedding", Vector(store.dim)), column("tsq", Text), name="q"
+        ).data([(i, emb, ' | '.join(t)) for i, (emb, t) in enumerate(zip(query_embeddings, terms)) if t])
+        
+        tsquery = func.to_tsquery('simple', queries.c.tsq)
+        matches = store.join(select(
+            HadisChunk.id,
+            HadisChunk.chunk_text,
+            HadisChunk.page_number,
+            HadisChunk.chunk_metadata,
+            (1 - store.column.cosine_distance(cast(queries.c.embedding, Vector(store.dim)))).label("similarity")
+        )).where(
+            HadisChunk.search_vector.op('@@')(tsquery),
+            *self._filter_clauses(filters)
+        ).order_by(
+            func.ts_rank_cd(HadisChunk.search_vector, tsquery).desc()
+        ).limit(settings.LEXICAL_TOP_K).lateral("matches")
+        
+        query = select(queries.c.idx, matches).select_from(queries).join(matches, true())
+        with timed("search.lexical"):
+            result = await db.execute(query)
+            rows = result.all()
+        return self._group(rows, len(terms))
+    
+    def _fuse(self, vector_rows: List[Dict], lexical_rows: List[Dict]) -> List[Dict]:
+        """Reciprocal rank fusion hasil vector & lexical"""
+        k = settings.RRF_K
+        fused: Dict[int, Dict] = {}
+        
+        # Kandidat vector tetap memakai threshold; hasil lexical selalu ikut
+        vector_rows = [c for c in vector_rows if c['similarity'] >= 0.6]
+        for rows in (vector_rows, lexical_rows):
+            for rank, row in enumerate(rows, 1):
+                entry = fused.setdefault(row['chunk_id'], dict(row, rrf=0.0))
+                entry['rrf'] += 1.0 / (k + rank)
+        
+        if not fused:
+            return []
+        
+        # Skala ke rentang similarity supaya boost metadata di _rerank tetap sebanding
+        top = max(c['rrf'] for c in fused.values())
+        best_similarity = max(c['similarity'] for c in fused.values())
+        for c in fused.values():
+            c['fused_score'] = c.pop('rrf') / top * best_similarity
+        return sorted(fused.values(), key=lambda x: x['fused_score'], reverse=True)
     
-    def _rerank(self, candidates: List[Dict]) -> List[Dict]:
-        """Re-rank berdasarkan quality signals"""
-        for candidate in candidates:
-            score = candidate['similarity']
-            meta = candidate['metadata']
-            
-            # Boost jika ada metadata lengkap
-            if meta.get('nomor_hadis'):
-                score += 0.05
-            if meta.get('perawi'):
-                score += 0.05
-            if meta.get('kitab'):
-                score += 0.05
-            if meta.get('derajat') in ['shahih', 'sahih']:
-                score += 0.1
-            
-            # Boost jika text lebih panjang (lebih informatif)
-            text_length = len(candidate['text'])
-            if text_length > 500:
-                score += 0.03
-            
-            candidate['final_score'] = min(score, 1.0)
-        
-        # Sort by final score
-        return sorted(candidates, key=lambda x: x['final_score'], reverse=True)
\ No newline at end of file
+    def _collapse_duplicates(self, ranked: List[Dict]) -> List[Dict]:
+        """Buang chunk yang teks ternormalisasinya sama dengan hasil di atasnya"""
+        seen = set()
+        unique = []
+        for candidate in ranked:
+            key = text_hash(candidate['text'])
+            if key not in seen:
+                seen.add(key)
+                unique.append(candidate)
+        return unique
@@ -0,0 +1,91 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class MicroBatcher:
+    """Gabungkan panggilan yang datang berdekatan jadi satu batch"""
+
+    def __init__(self, process_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batch: list = []  # batch yang sedang diproses worker
+        self._closed = False
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # Worker tidak boleh mewarisi context (mis. timing) request yang kebetulan memicunya
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Masukkan satu item ke antrian dan tunggu hasilnya"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher sudah ditutup")
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Ambil yang sudah antri tanpa menunggu
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._batch = await self._collect()
+            items = [item for item, _ in batch]
+
+            try:
+                results = await self.process_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._batch = []
+
+    async def close(self):
+        """Hentikan worker; pemanggil yang masih menunggu menerima RuntimeError"""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        waiting = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher ditutup sebelum item diproses"))
@@ -0,0 +1,116 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "hadis_stage_seconds", "Durasi per tahap pemrosesan", ["stage"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS = Counter(
+    "hadis_http_requests_total", "Jumlah request HTTP", ["method", "route", "status"]
+)
+HTTP_SECONDS = Histogram(
+    "hadis_http_request_seconds", "Durasi request HTTP", ["route"], buckets=LATENCY_BUCKETS
+)
+EMBED_BATCH_SIZE = Histogram(
+    "hadis_embedding_batch_size", "Jumlah teks per panggilan encode",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+CACHE_LOOKUPS = Counter(
+    "hadis_answer_cache_total", "Hasil lookup cache jawaban", ["result"]
+)
+RERANK_RESULTS = Counter(
+    "hadis_rerank_total", "Hasil re-rank cross-encoder terhadap anggaran latensi", ["result"]
+)
+ADMISSIONS = Counter(
+    "hadis_admission_total", "Keputusan admission control (slot LLM & rate limit)", ["result"]
+)
+CHAT_MODES = Counter(
+    "hadis_chat_mode_total", "Mode chat yang diminta vs yang dilayani", ["requested", "served"]
+)
+LLM_TOKENS = Counter(
+    "hadis_llm_tokens_total", "Token yang diproses Ollama", ["kind"]
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "hadis_llm_tokens_per_second", "Kecepatan generate Ollama (eval_count / eval_duration)",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+)
+
+# Timing per request untuk header Server-Timing (diisi MetricsMiddleware)
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def timed(stage: str):
+    """Catat durasi tahap ke histogram dan ke Server-Timing request berjalan"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def record_ollama_stats(response):
+    """Ambil statistik token dari response Ollama (non-stream atau chunk terakhir stream)"""
+    prompt_tokens = response.get('prompt_eval_count') or 0
+    eval_tokens = response.get('eval_count') or 0
+    eval_ns = response.get('eval_duration') or 0
+    LLM_TOKENS.labels("prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels("completion").inc(eval_tokens)
+    if eval_tokens and eval_ns:
+        LLM_TOKENS_PER_SECOND.observe(eval_tokens / (eval_ns / 1e9))
+
+def _server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    parts = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition format Prometheus; gabungkan semua worker jika PROMETHEUS_MULTIPROC_DIR di-set"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """ASGI middleware: hitung request, durasi per route, dan header Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = _server_timing(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], path, str(status)).inc()
+            HTTP_SECONDS.labels(path).observe(time.perf_counter() - start)
+            _request_timings.reset(token)
@@ -0,0 +1,37 @@
+import hashlib
+import re
+from typing import List
+
+_WHITESPACE = re.compile(r'\s+')
+_ARABIC_DIACRITICS = re.compile(r'[\u064B-\u065F\u0670]')
+_ARABIC_FOLD = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ة': 'ه'})
+_WORD = re.compile(r'\w+')
+
+# Kata tanya/sambung yang hampir selalu muncul di pertanyaan, tidak berguna untuk lexical match
+QUERY_STOPWORDS = {
+    'apa', 'apakah', 'bagaimana', 'mengapa', 'kenapa', 'siapa', 'kapan', 'dimana',
+    'yang', 'dan', 'atau', 'di', 'ke', 'dari', 'dengan', 'untuk', 'tentang', 'mengenai',
+    'ini', 'itu', 'ada', 'adalah', 'dalam', 'pada', 'hadis', 'hadits', 'tolong', 'jelaskan',
+}
+
+def normalize_text(text: str) -> str:
+    """Normalisasi teks Arab/Indonesia (whitespace, tashkil, alef & ta marbuta)"""
+    # Normalize whitespace
+    text = _WHITESPACE.sub(' ', text)
+    
+    # Remove harakat Arab (tashkil) untuk consistency
+    text = _ARABIC_DIACRITICS.sub('', text)
+    
+    # Normalize Arabic letters
+    text = text.translate(_ARABIC_FOLD)
+    
+    return text.strip()
+
+def query_terms(text: str) -> List[str]:
+    """Term pencarian lexical dari pertanyaan yang sudah dinormalisasi"""
+    terms = [t.lower() for t in _WORD.findall(normalize_text(text))]
+    return list(dict.fromkeys(t for t in terms if t not in QUERY_STOPWORDS))
+
+def text_hash(text: str) -> str:
+    """SHA-256 teks ternormalisasi, kunci deteksi chunk duplikat lintas dokumen"""
+    return hashlib.sha256(normalize_text(text).lower().encode('utf-8')).hexdigest()
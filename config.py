@@ -1,14 +1,141 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, Optional
+import os
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Replika baca untuk jalur chat/search (default: DATABASE_URL)
+    DATABASE_READ_URL: Optional[str] = None
     OLLAMA_MODEL: str
+    OLLAMA_HOST: Optional[str] = None  # default ollama: http://localhost:11434
     EMBEDDING_MODEL: str
     APP_PORT: int = 8000
     SECRET_KEY: str
     UPLOAD_DIR: str = "uploads"
     TOP_K_RESULTS: int = 5
     
+    # Pool koneksi async per proses worker (berlaku untuk engine tulis & baca)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 256  # prepared statement asyncpg per koneksi; 0 untuk pgbouncer mode transaction
+    
+    # Runtime embedding: torch | torch-int8 | onnx (butuh sentence-transformers[onnx];
+    # EMBEDDING_ONNX_FILE mis. "onnx/model_qint8_avx512_vnni.onnx" untuk int8)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_FILE: Optional[str] = None
+    EMBEDDING_THREADS: int = 0  # 0 = default runtime; set ~ jumlah core / jumlah worker
+    
+    # Micro-batching embedding
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBED_ENCODE_BATCH_SIZE: int = 32  # batch internal per forward pass
+
+    # Versi embedding aktif (lihat scripts/migrate_embeddings.py); EMBEDDING_MODEL
+    # adalah model versi 0 (kolom hadis_chunks.embedding)
+    EMBEDDING_VERSION_CHECK_INTERVAL: float = 10.0
+
+    # Pipeline ingest PDF
+    INGEST_BATCH_SIZE: int = 64
+    INGEST_QUEUE_SIZE: int = 4
+    INGEST_WORKERS: int = 1
+    INGEST_POLL_INTERVAL: float = 2.0
+    INGEST_JOB_STALE_SECONDS: int = 120
+    # False: worker API tidak mengambil job ingest; jalankan scripts/ingest_worker.py
+    # sebagai proses terpisah (job baru terambil lewat polling INGEST_POLL_INTERVAL)
+    INGEST_IN_PROCESS: bool = True
+    
+    # Ekstraksi PDF: rentang halaman dibagi ke process pool untuk PDF besar
+    PDF_EXTRACT_WORKERS: int = min(4, os.cpu_count() or 1)
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_PARALLEL_MIN_PAGES: int = 64
+    PDF_PAGE_CACHE: bool = True  # cache teks per halaman di UPLOAD_DIR/.page_cache
+    
+    # Chunking; CHUNKER_PROFILES (JSON) meng-override per koleksi,
+    # mis. {"bulughul_maram": {"chunk_size": 800, "cross_page": false}}
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    CHUNK_CROSS_PAGE: bool = True
+    CHUNKER_PROFILES: Dict[str, Dict] = {}
+    
+    # Index ANN pgvector: hnsw | ivfflat | none
+    VECTOR_INDEX_TYPE: str = "hnsw"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"  # kosongkan untuk pgvector < 0.8
+    
+    # Backend vector search: pgvector | memory
+    VECTOR_BACKEND: str = "pgvector"
+    MEMORY_INDEX_DIR: str = "vector_index"
+    MEMORY_INDEX_DTYPE: str = "float32"  # float32 | int8
+    MEMORY_INDEX_CHECK_INTERVAL: float = 1.0
+    
+    # Hybrid retrieval (lexical tsvector + vector, digabung RRF)
+    HYBRID_SEARCH: bool = True
+    LEXICAL_TOP_K: int = 10
+    RRF_K: int = 60
+    
+    # Re-ranking kandidat: heuristic | cross-encoder
+    RERANKER: str = "heuristic"
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    RERANK_MAX_LENGTH: int = 512
+    RERANK_CANDIDATES: int = 20
+    RERANK_BATCH_SIZE: int = 8
+    RERANK_BUDGET_MS: float = 150
+    RERANK_CACHE_SIZE: int = 10000
+    LLM_CONTEXT_CHUNKS: int = 3  # chunk terbaik yang masuk prompt
+    
+    # Prompt LLM: budget token konteks, tokenizer HF opsional (nama sesuai model Ollama)
+    LLM_CONTEXT_TOKENS: int = 600
+    LLM_MIN_SOURCE_TOKENS: int = 48
+    LLM_TOKENIZER: Optional[str] = None
+    OLLAMA_KEEP_ALIVE: str = "30m"  # model & KV-cache prefix tetap di memori antar request
+    
+    # Memori percakapan per session_id
+    CHAT_HISTORY_TURNS: int = 4  # giliran terakhir yang dipakai apa adanya, sisanya diringkas
+    CHAT_HISTORY_TOKENS: int = 400  # batas riwayat + ringkasan di prompt rewrite
+    CHAT_REWRITE_MODE: str = "auto"  # auto (hanya pertanyaan lanjutan) | always | off
+    CHAT_HISTORY_FLUSH_MS: float = 200
+    CHAT_HISTORY_BATCH_SIZE: int = 100
+    
+    # POST /api/chat/batch
+    CHAT_BATCH_MAX_QUERIES: int = 5000
+    CHAT_BATCH_SIZE: int = 64  # pertanyaan per panggilan embedding + SQL retrieval
+    CHAT_BATCH_LLM_CONCURRENCY: int = 4  # generate LLM paralel per request batch
+    
+    # Deteksi filter (derajat/perawi) otomatis dari teks pertanyaan
+    AUTO_QUERY_FILTERS: bool = True
+    
+    # Cache jawaban (exact + semantic)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL: float = 3600
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+    
+    # Admission control generate LLM (per proses worker: total = nilai x jumlah worker)
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_QUEUE_SIZE: int = 16  # request chat yang boleh menunggu slot; lebih dari itu 503
+    LLM_QUEUE_TIMEOUT: float = 20.0  # detik menunggu slot sebelum 503
+    CHAT_AUTO_BUDGET_MS: float = 3000  # mode auto: batas waktu sampai generate mulai, lewat -> sumber saja
+    
+    # Token bucket per session_id (atau IP klien tanpa sesi); 0 = tanpa batas
+    RATE_LIMIT_PER_MINUTE: float = 20
+    RATE_LIMIT_BURST: int = 10
+    
+    # Server produksi (serve.py: gunicorn + worker uvicorn)
+    SERVER_WORKERS: int = 2
+    SERVER_PRELOAD: bool = True  # muat model di master lalu fork: bobot dibagi copy-on-write antar worker
+    SERVER_TIMEOUT: int = 120  # detik; mencakup warmup worker sebelum ready
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5
+    WARMUP_DB_CONNECTIONS: int = 2  # koneksi pool yang dibuka per worker sebelum ready
+    WARMUP_OLLAMA: bool = True  # muat model Ollama (keep_alive) saat startup
+    
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,76 @@
+"""Jalankan banyak pertanyaan lewat POST /api/chat/batch, hasil ditulis sebagai NDJSON.
+
+Input: file teks (satu pertanyaan per baris) atau JSONL ({"query": ..., "id": ...}).
+    python scripts/batch_chat.py pertanyaan.txt --output jawaban.ndjson
+    python scripts/batch_chat.py eval.jsonl --output retrieval.ndjson --retrieve-only
+Pertanyaan dikirim per --chunk-size; dengan --resume, id yang sudah ada di
+--output dilewati (id default = nomor baris).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import httpx
+
+
+def read_queries(path: str) -> list:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith("{") else {"query": line}
+            item["id"] = str(item.get("id") or n)
+            queries.append(item)
+    return queries
+
+
+def done_ids(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {json.loads(line)["id"] for line in f if line.strip()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--url", default="http://localhost:8000/api/chat/batch")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Pertanyaan per request")
+    parser.add_argument("--filters", help='JSON SearchFilters untuk semua pertanyaan, mis. {"kitab": "bukhari"}')
+    parser.add_argument("--retrieve-only", action="store_true", help="Hanya sumber, tanpa generate LLM")
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+
+    queries = read_queries(args.input)
+    if args.resume:
+        skip = done_ids(args.output)
+        queries = [q for q in queries if q["id"] not in skip]
+    filters = json.loads(args.filters) if args.filters else None
+
+    start = time.perf_counter()
+    errors = 0
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as out, \
+            httpx.Client(timeout=None) as client:
+        for offset in range(0, len(queries), args.chunk_size):
+            chunk = queries[offset:offset + args.chunk_size]
+            body = {"queries": chunk, "filters": filters, "generate": not args.retrieve_only}
+            with client.stream("POST", args.url, json=body) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    errors += bool(result["error"])
+                    out.write(line + "\n")
+                out.flush()
+            print(f"{offset + len(chunk)}/{len(queries)} pertanyaan "
+                  f"({time.perf_counter() - start:.0f} detik, {errors} error)", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Benchmark jalur ingest & query tanpa download model maupun Ollama sungguhan.
+
+- PDF hadis sintetis dibuat dengan PyMuPDF (jumlah halaman bisa diatur)
+- Embedder stub deterministik (feature hashing, 384 dim) menggantikan SentenceTransformer
+- Server Ollama palsu (HTTP lokal) dengan kecepatan token yang bisa diatur
+- Butuh Postgres + pgvector lokal (DATABASE_URL); --backend memory memakai index in-process
+
+Hasil dicetak sebagai JSON supaya bisa dibandingkan antar commit:
+    python scripts/benchmark.py --pages 200 --concurrency 1 4 16 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta
+sys.path.insert(0, '.')
+
+import numpy as np
+
+DIM = 384
+PERAWI = ["Bukhari", "Muslim", "Tirmidzi", "Ahmad", "Malik", "Nasai"]
+DERAJAT = ["shahih", "hasan", "dhaif"]
+SAHABAT = ["Abu Hurairah", "Umar bin Khattab", "Aisyah", "Anas bin Malik", "Ibnu Abbas", "Abdullah bin Umar"]
+TOPICS = [
+    "niat", "shalat", "puasa", "zakat", "sedekah", "wudhu", "sabar", "ilmu", "akhlak", "jujur",
+    "orang tua", "tetangga", "makan", "tidur", "doa", "dzikir", "haji", "jihad", "taubat", "malu",
+]
+WORDS = (
+    "amal perbuatan tergantung pada dan setiap orang akan mendapatkan apa yang ia niatkan barangsiapa "
+    "hijrahnya kepada Allah Rasul-Nya maka mukmin yang kuat lebih baik dicintai daripada lemah bersabda "
+    "sesungguhnya tidaklah beriman salah seorang kalian hingga mencintai saudaranya sebagaimana dirinya"
+).split()
+
+
+class StubEmbedder:
+    """Embedder deterministik: jumlah vector acak per token (seed = crc32 token), dinormalisasi"""
+
+    def __init__(self):
+        from app.database.embedding_store import EmbeddingStore
+        self.store = EmbeddingStore.base()
+        self._cache = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._cache.get(token)
+        if vec is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode()))
+            vec = self._cache[token] = rng.standard_normal(DIM).astype(np.float32)
+        return vec
+
+    def _embed(self, text: str) -> list:
+        vec = np.zeros(DIM, dtype=np.float32)
+        for token in text.lower().split():
+            vec += self._token_vector(token)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    async def generate_embedding(self, text: str) -> list:
+        return self._embed(text)
+
+    async def generate_embeddings_batch(self, texts: list) -> list:
+        return [self._embed(t) for t in texts]
+
+
+def hadis_entry(n: int, rng: random.Random) -> str:
+    topic = rng.choice(TOPICS)
+    body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 60)))
+    return (
+        f"{n}. Hadis tentang {topic}\n"
+        f"Dari {rng.choice(SAHABAT)} radhiyallahu 'anhu, Rasulullah bersabda: {body}.\n"
+        f"HR. {rng.choice(PERAWI)} No. {n}. Derajat: {rng.choice(DERAJAT)}\n"
+    )
+
+
+def make_pdf(path: str, pages: int, seed: int) -> None:
+    """PDF sintetis bergaya kitab hadis (teks Latin; font bawaan tidak punya glyph Arab)"""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    n = 1
+    for _ in range(pages):
+        page = doc.new_page()
+        entries = []
+        for _ in range(rng.randint(3, 6)):
+            entries.append(hadis_entry(n, rng))
+            n += 1
+        page.insert_textbox(fitz.Rect(40, 40, 555, 800), "\n".join(entries), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def fake_ollama_app(token_delay: float):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    answer = ("Berdasarkan konteks hadis di atas, amal perbuatan tergantung pada niatnya. "
+              "Hadis ini diriwayatkan oleh Bukhari dan derajatnya shahih.").split(" ")
+
+    def part(text, done=False):
+        data = {"model": "fake", "created_at": "2024-01-01T00:00:00Z", "response": text, "done": done}
+        if done:
+            data.update(eval_count=len(answer), eval_duration=int(len(answer) * token_delay * 1e9) or 1,
+                        prompt_eval_count=512, prompt_eval_duration=1)
+        return data
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        if not body.get("stream"):
+            await asyncio.sleep(len(answer) * token_delay)
+            return part(" ".join(answer), done=True)
+
+        async def stream():
+            for token in answer:
+                await asyncio.sleep(token_delay)
+                yield json.dumps(part(token + " ")) + "\n"
+            yield json.dumps(part("", done=True)) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def summarize(latencies: list, wall: float) -> dict:
+    if not latencies:
+        return {"requests": 0, "qps": 0.0}
+    arr = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "qps": round(len(latencies) / wall, 2),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+    }
+
+
+async def bench_extract(pdf_path: str) -> dict:
+    from app.services.pdf_processor import PDFProcessor
+    from app.services.chunker import HadisChunker
+
+    pdf, chunker = PDFProcessor(page_cache=False), HadisChunker()
+    pages = chunks = 0
+    start = time.perf_counter()
+    async for page in pdf.extract_text(pdf_path):
+        chunks += len(await chunker.chunk_text(page['text'], page['page_number']))
+        pages += 1
+    wall = time.perf_counter() - start
+    return {"pages": pages, "chunks": chunks, "pages_per_s": round(pages / wall, 2)}
+
+
+async def bench_embed(embedder, pdf_path: str) -> dict:
+    from app.services.pdf_processor import PDFProcessor
+    from app.services.chunker import HadisChunker
+
+    texts = []
+    chunker = HadisChunker()
+    async for page in PDFProcessor(page_cache=False).extract_text(pdf_path):
+        texts.extend(c['text'] for c in await chunker.chunk_text(page['text'], page['page_number']))
+
+    start = time.perf_counter()
+    for i in range(0, len(texts), 64):
+        await embedder.generate_embeddings_batch(texts[i:i + 64])
+    wall = time.perf_counter() - start
+    return {"chunks": len(texts), "chunks_per_s": round(len(texts) / wall, 2)}
+
+
+async def bench_ingest(embedder, pdf_path: str, pages: int):
+    from app.database.connection import AsyncSessionLocal, init_db
+    from app.models.document import HadisDocument, DocumentStatus
+    from app.services.ingestion import IngestionPipeline
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        # Diklaim atas nama benchmark supaya worker ingest server yang sedang jalan tidak mengambilnya
+        doc = HadisDocument(filename=f"benchmark-{int(time.time())}.pdf", total_pages=pages,
+                            claimed_by="benchmark", heartbeat_at=datetime.utcnow() + timedelta(days=1))
+        db.add(doc)
+        await db.commit()
+
+    start = time.perf_counter()
+    stats = await IngestionPipeline(embedder).run(pdf_path, doc.id)
+    wall = time.perf_counter() - start
+
+    async with AsyncSessionLocal() as db:
+        doc = await db.get(HadisDocument, doc.id)
+        doc.status = DocumentStatus.COMPLETED
+        await db.commit()
+
+    return doc.id, {
+        "chunks": stats["total_chunks"],
+        "chunks_per_s": round(stats["total_chunks"] / wall, 2),
+        "pages_per_s": round(stats["total_pages"] / wall, 2),
+    }
+
+
+async def bench_chat(embedder, levels: list, requests_per_level: int, seed: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.services.embedding_service import get_embedding_service
+
+    # Override dependency FastAPI, jadi endpoint memakai embedder stub
+    app.dependency_overrides[get_embedding_service] = lambda: embedder
+    rng = random.Random(seed)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for level in levels:
+            total = max(requests_per_level, level * 4)
+            queries = [f"hadis tentang {rng.choice(TOPICS)} {rng.choice(WORDS)}" for _ in range(total)]
+            semaphore = asyncio.Semaphore(level)
+            latencies, errors = [], 0
+
+            async def one(query):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/api/chat/", json={"query": query})
+                    # Respons error (429/503) cepat, tidak boleh ikut statistik latensi
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(q) for q in queries))
+            results[str(level)] = dict(summarize(latencies, time.perf_counter() - start), errors=errors)
+
+    app.dependency_overrides.clear()
+    return results
+
+
+async def cleanup(document_id: int):
+    from sqlalchemy import delete
+    from app.database.connection import AsyncSessionLocal
+    from app.models.document import HadisDocument
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(HadisDocument).where(HadisDocument.id == document_id))
+        await db.commit()
+
+
+async def run(args) -> dict:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(fake_ollama_app(args.token_delay), port=args.ollama_port,
+                                           log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    if args.real_embedder:
+        from app.services.embedding_service import get_embedding_service
+        embedder = get_embedding_service()
+    else:
+        embedder = StubEmbedder()
+
+    result = {}
+    document_id = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = os.path.join(tmp, "kitab.pdf")
+            make_pdf(pdf_path, args.pages, args.seed)
+
+            result["extract_chunk"] = await bench_extract(pdf_path)
+            result["embed"] = await bench_embed(embedder, pdf_path)
+            document_id, result["ingest"] = await bench_ingest(embedder, pdf_path, args.pages)
+
+        if args.backend == "memory":
+            from app.services.memory_index import get_memory_index
+            start = time.perf_counter()
+            await get_memory_index().refresh()
+            result["memory_index_refresh_s"] = round(time.perf_counter() - start, 3)
+
+        result["chat"] = await bench_chat(embedder, args.concurrency, args.requests, args.seed)
+    finally:
+        if document_id is not None and not args.keep:
+            await cleanup(document_id)
+        server.should_exit = True
+        await server_task
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=100, help="Request minimal per level concurrency")
+    parser.add_argument("--backend", choices=["pgvector", "memory"], default="pgvector")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Detik per token di Ollama palsu")
+    parser.add_argument("--ollama-port", type=int, default=11999)
+    parser.add_argument("--real-embedder", action="store_true", help="Pakai SentenceTransformer asli")
+    parser.add_argument("--cache", action="store_true", help="Aktifkan cache jawaban saat benchmark chat")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Jangan hapus dokumen benchmark dari DB")
+    parser.add_argument("--output", help="Simpan hasil JSON ke file")
+    args = parser.parse_args()
+
+    # Harus di-set sebelum modul app (dan config.settings) di-import
+    memory_dir = tempfile.mkdtemp(prefix="bench_index_")
+    # Page cache & stamp cache jawaban ikut di sini, bukan di UPLOAD_DIR sungguhan
+    upload_dir = tempfile.mkdtemp(prefix="bench_uploads_")
+    os.environ.update({
+        "OLLAMA_HOST": f"http://127.0.0.1:{args.ollama_port}",
+        "VECTOR_BACKEND": args.backend,
+        "MEMORY_INDEX_DIR": memory_dir,
+        "UPLOAD_DIR": upload_dir,
+        "ANSWER_CACHE_ENABLED": "true" if args.cache else "false",
+        # Semua request datang dari satu IP tanpa session_id: rate limit & admission
+        # control dibuka supaya yang diukur jalur chat, bukan penolakan 429/503
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "LLM_MAX_CONCURRENCY": str(max(args.concurrency)),
+        "LLM_QUEUE_SIZE": str(max(args.concurrency) * 4),
+    })
+
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        commit = None
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+    output = {
+        "commit": commit,
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark index ANN pgvector: recall@k terhadap exact search dan latensi p50/p99.
+
+Contoh:
+    python scripts/benchmark_ann.py --sizes 10000 100000 1000000 --params 20 40 80 160
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+sys.path.insert(0, '.')
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from app.database.indexes import vector_index_ddl, search_param_sql
+from config import settings
+
+DIM = 384
+TABLE = "bench_chunks"
+INDEX = "ix_bench_chunks_embedding"
+INSERT_BATCH = 50_000
+
+def synthetic_vectors(rng, centers, n):
+    """Vector ter-cluster & ter-normalisasi, mirip distribusi embedding teks"""
+    labels = rng.integers(0, len(centers), n)
+    vecs = centers[labels] + rng.normal(scale=0.35, size=(n, DIM)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+async def timed_search(conn, query, k, exact=False, param_sql=None):
+    async with conn.transaction():
+        if exact:
+            await conn.execute("SET LOCAL enable_indexscan = off")
+        elif param_sql:
+            await conn.execute(param_sql.replace("SET ", "SET LOCAL ", 1))
+        start = time.perf_counter()
+        rows = await conn.fetch(
+            f"SELECT id FROM {TABLE} ORDER BY embedding <=> $1 LIMIT $2", query, k
+        )
+        elapsed = time.perf_counter() - start
+    return [r['id'] for r in rows], elapsed
+
+async def run(args):
+    conn = await asyncpg.connect(settings.DATABASE_URL)
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    await register_vector(conn)
+    await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await conn.execute(f"CREATE UNLOGGED TABLE {TABLE} (id serial PRIMARY KEY, embedding vector({DIM}))")
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.clusters, DIM)).astype(np.float32)
+    queries = synthetic_vectors(rng, centers, args.queries)
+    results = []
+    loaded = 0
+
+    for size in sorted(args.sizes):
+        # Korpus tumbuh bertahap: cukup tambah selisihnya
+        while loaded < size:
+            n = min(INSERT_BATCH, size - loaded)
+            vecs = synthetic_vectors(rng, centers, n)
+            await conn.copy_records_to_table(TABLE, records=[(v,) for v in vecs], columns=["embedding"])
+            loaded += n
+
+        await conn.execute(f"DROP INDEX IF EXISTS {INDEX}")
+        start = time.perf_counter()
+        ddl = vector_index_ddl(table=TABLE, name=INDEX)
+        if ddl:
+            await conn.execute(ddl)
+        build_seconds = time.perf_counter() - start
+        await conn.execute(f"ANALYZE {TABLE}")
+
+        exact_ids, exact_lat = [], []
+        for q in queries:
+            ids, elapsed = await timed_search(conn, q, args.k, exact=True)
+            exact_ids.append(set(ids))
+            exact_lat.append(elapsed)
+
+        entry = {
+            "size": size,
+            "index": settings.VECTOR_INDEX_TYPE,
+            "index_build_s": round(build_seconds, 2),
+            "exact": {"p50_ms": percentile_ms(exact_lat, 50), "p99_ms": percentile_ms(exact_lat, 99)},
+            "ann": [],
+        }
+        for param in args.params:
+            param_sql = search_param_sql(param)
+            recalls, lat = [], []
+            for q, truth in zip(queries, exact_ids):
+                ids, elapsed = await timed_search(conn, q, args.k, param_sql=param_sql)
+                recalls.append(len(truth & set(ids)) / max(len(truth), 1))
+                lat.append(elapsed)
+            entry["ann"].append({
+                "param": param,
+                f"recall@{args.k}": round(float(np.mean(recalls)), 4),
+                "p50_ms": percentile_ms(lat, 50),
+                "p99_ms": percentile_ms(lat, 99),
+            })
+
+        results.append(entry)
+        print(json.dumps(entry), flush=True)
+
+    if not args.keep:
+        await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await conn.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--params", type=int, nargs="+", default=[20, 40, 80, 160],
+                        help="Nilai ef_search (HNSW) atau probes (IVFFlat) yang diuji")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Simpan hasil sebagai JSON")
+    parser.add_argument("--keep", action="store_true", help="Jangan hapus tabel benchmark")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,147 @@
+"""Benchmark throughput HadisChunker (halaman/detik & MB/detik) tanpa PDF maupun DB.
+
+Halaman sintetis memakai generator teks yang sama dengan scripts/benchmark.py.
+--baseline REV membandingkan dengan HadisChunker dari revisi git lain:
+    python scripts/benchmark_chunker.py --pages 2000 --page-entries 5 40 --baseline HEAD~1
+
+--check-metadata REV membandingkan hasil extract_metadata per chunk dengan revisi
+lain di korpus yang sama (exit 1 jika ada field yang berbeda):
+    python scripts/benchmark_chunker.py --check-metadata 03a99f5
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import types
+sys.path.insert(0, '.')
+
+from benchmark import hadis_entry
+from app.services.chunker import HadisChunker, extract_metadata
+
+
+def make_pages(count: int, entries: int, seed: int) -> list:
+    rng = random.Random(seed)
+    n = 1
+    pages = []
+    for _ in range(count):
+        page = []
+        for _ in range(entries):
+            page.append(hadis_entry(n, rng))
+            n += 1
+        pages.append("\n".join(page))
+    return pages
+
+
+def load_module(rev: str):
+    """app/services/chunker.py dari revisi git lain (dimuat sebagai modul terpisah)"""
+    source = subprocess.check_output(["git", "show", f"{rev}:app/services/chunker.py"], text=True)
+    module = types.ModuleType(f"chunker_{rev}")
+    exec(compile(source, f"{rev}:app/services/chunker.py", "exec"), module.__dict__)
+    return module
+
+
+def load_baseline(rev: str):
+    return load_module(rev).HadisChunker
+
+
+def check_metadata(rev: str, pages: list, examples: int = 5) -> dict:
+    """Selisih metadata per field antara revisi ini dan REV untuk chunk yang sama"""
+    module = load_module(rev)
+    # Revisi lama mengekstrak lewat method, revisi baru lewat fungsi modul
+    old = getattr(module, "extract_metadata", None) or module.HadisChunker()._extract_metadata
+    chunks = asyncio.run(run_chunks(HadisChunker(cross_page=False), pages))
+    diffs = {}
+    for chunk in chunks:
+        before, after = old(chunk["text"]), extract_metadata(chunk["text"])
+        for field in sorted(set(before) | set(after)):
+            if before.get(field) != after.get(field):
+                row = diffs.setdefault(field, {"count": 0, "examples": []})
+                row["count"] += 1
+                if len(row["examples"]) < examples:
+                    row["examples"].append({"text": chunk["text"][:200], "before": before.get(field),
+                                            "after": after.get(field)})
+    return {"baseline": rev, "chunks": len(chunks), "diffs": diffs}
+
+
+async def run_chunks(chunker, pages: list) -> list:
+    chunks = []
+    for i, text in enumerate(pages, 1):
+        chunks.extend(await chunker.chunk_text(text, i))
+    return chunks
+
+
+async def run_per_page(chunker, pages: list) -> int:
+    chunks = 0
+    for i, text in enumerate(pages, 1):
+        chunks += len(await chunker.chunk_text(text, i))
+    return chunks
+
+
+async def run_stream(chunker, pages: list) -> int:
+    stream = chunker.stream()
+    chunks = 0
+    for i, text in enumerate(pages, 1):
+        chunks += len(stream.feed(text, i))
+    return chunks + len(stream.flush())
+
+
+def measure(fn, chunker, pages: list, repeat: int) -> dict:
+    size_mb = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = asyncio.run(fn(chunker, pages))
+        best = min(best, time.perf_counter() - start)
+    return {
+        "chunks": chunks,
+        "seconds": round(best, 4),
+        "pages_per_s": round(len(pages) / best, 1),
+        "mb_per_s": round(size_mb / best, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--page-entries", type=int, nargs="+", default=[5, 40],
+                        help="Jumlah hadis per halaman (banyak nilai = banyak skenario)")
+    parser.add_argument("--repeat", type=int, default=3, help="Ambil waktu terbaik dari N kali")
+    parser.add_argument("--baseline", help="Revisi git pembanding, mis. HEAD~1")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Simpan hasil JSON ke file")
+    parser.add_argument("--check-metadata", metavar="REV",
+                        help="Bandingkan extract_metadata dengan revisi git lain, tanpa benchmark")
+    args = parser.parse_args()
+
+    if args.check_metadata:
+        pages = [p for entries in args.page_entries for p in make_pages(args.pages, entries, args.seed)]
+        report = check_metadata(args.check_metadata, pages)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        sys.exit(1 if report["diffs"] else 0)
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    results = []
+    for entries in args.page_entries:
+        pages = make_pages(args.pages, entries, args.seed)
+        row = {
+            "pages": args.pages,
+            "entries_per_page": entries,
+            "per_page": measure(run_per_page, HadisChunker(cross_page=False), pages, args.repeat),
+            "cross_page": measure(run_stream, HadisChunker(cross_page=True), pages, args.repeat),
+        }
+        if baseline:
+            row["baseline"] = measure(run_per_page, baseline(), pages, args.repeat)
+            row["speedup"] = round(row["baseline"]["seconds"] / row["per_page"]["seconds"], 2)
+        results.append(row)
+        print(json.dumps(row), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"baseline": args.baseline, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
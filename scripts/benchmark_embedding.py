@@ -0,0 +1,90 @@
+"""Benchmark runtime embedding: embeddings/detik dan kecocokan cosine terhadap PyTorch fp32.
+
+Varian ditulis sebagai BACKEND atau BACKEND:ONNX_FILE, contoh:
+    python scripts/benchmark_embedding.py --variants torch torch-int8 onnx \\
+        onnx:onnx/model_qint8_avx512_vnni.onnx --threads 4 --texts 2000
+Varian pertama dipakai sebagai acuan cosine (biasanya torch).
+"""
+import argparse
+import json
+import random
+import sys
+import time
+sys.path.insert(0, '.')
+
+import numpy as np
+from benchmark import hadis_entry
+from app.services.embedding_service import load_embedding_model, check_embedding_dim
+from config import settings
+
+
+def make_texts(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    # Panjang bervariasi (1-4 hadis per teks) supaya efek padding terlihat
+    return ["\n".join(hadis_entry(i * 4 + j, rng) for j in range(rng.randint(1, 4))) for i in range(count)]
+
+
+def run_variant(variant: str, texts: list, batch_size: int, threads: int, repeat: int):
+    backend, _, onnx_file = variant.partition(":")
+    start = time.perf_counter()
+    model = load_embedding_model(backend, onnx_file or None, threads)
+    load_s = time.perf_counter() - start
+    dim = check_embedding_dim(model)
+
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warmup
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                  normalize_embeddings=True)
+        best = min(best, time.perf_counter() - start)
+
+    # Latensi satu query (jalur chat), bukan throughput batch
+    single = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        model.encode([text], normalize_embeddings=True)
+        single.append(time.perf_counter() - start)
+
+    return embeddings, {
+        "variant": variant,
+        "dim": dim,
+        "load_s": round(load_s, 2),
+        "embeddings_per_s": round(len(texts) / best, 1),
+        "single_p50_ms": round(float(np.percentile(single, 50)) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBED_ENCODE_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Simpan hasil JSON ke file")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.seed)
+    reference = None
+    results = []
+    for variant in args.variants:
+        embeddings, row = run_variant(variant, texts, args.batch_size, args.threads, args.repeat)
+        if reference is None:
+            reference = embeddings
+        else:
+            # Embedding sudah dinormalisasi: dot product = cosine
+            cosine = np.sum(reference * embeddings, axis=1)
+            row.update(cosine_mean=round(float(cosine.mean()), 5), cosine_min=round(float(cosine.min()), 5))
+        results.append(row)
+        print(json.dumps(row), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": settings.EMBEDDING_MODEL, "texts": args.texts,
+                       "threads": args.threads, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
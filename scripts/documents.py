@@ -0,0 +1,134 @@
+"""Kelola dokumen langsung di database: daftar, hapus, ganti PDF, chunk ulang.
+
+    python scripts/documents.py list --status completed
+    python scripts/documents.py delete 12
+    python scripts/documents.py rechunk 12 --collection bulughul_maram
+    python scripts/documents.py replace 12 kitab_revisi.pdf
+
+rechunk   chunk ulang dari teks halaman di page cache dengan CHUNKER_PROFILES
+          saat ini (--collection mengganti profil dokumen)
+replace   ganti PDF dokumen, id dokumen tetap
+
+rechunk/replace diproses di proses ini (job diklaim dulu supaya worker API
+tidak ikut mengambil). Hanya chunk yang berubah yang ditukar; embedding
+dipakai ulang lewat text_hash, jadi hanya teks yang benar-benar baru yang
+di-encode. Worker API melihat perubahan index memori dan cache jawaban
+lewat file bersama, tanpa restart. Output JSON per dokumen.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import uuid
+sys.path.insert(0, '.')
+
+from app.database.connection import AsyncSessionLocal, init_db
+from app.models.document import HadisDocument, DocumentStatus, DocumentJob
+from app.services.documents import (list_documents, count_chunks, delete_document,
+                                    can_rechunk, enqueue_job)
+from app.services.pdf_processor import file_sha256
+from config import settings
+
+
+def describe(doc: HadisDocument, chunks: int) -> dict:
+    return {"document_id": doc.id, "filename": doc.filename, "collection": doc.collection,
+            "status": doc.status.value, "job": doc.job.value, "total_pages": doc.total_pages,
+            "chunks": chunks, "error": doc.error}
+
+
+async def get_idle(db, document_id: int) -> HadisDocument:
+    doc = await db.get(HadisDocument, document_id)
+    if doc is None:
+        sys.exit(f"✗ Dokumen {document_id} tidak ada")
+    if doc.status == DocumentStatus.PROCESSING:
+        sys.exit(f"✗ Dokumen {document_id} sedang diproses")
+    return doc
+
+
+async def list_(args):
+    async with AsyncSessionLocal() as db:
+        status = DocumentStatus(args.status) if args.status else None
+        for row in await list_documents(db, status, args.collection, args.limit, 0):
+            print(json.dumps(describe(row["document"], row["chunks"]), ensure_ascii=False))
+
+
+async def delete(args):
+    async with AsyncSessionLocal() as db:
+        doc = await get_idle(db, args.document_id)
+        deleted = await delete_document(db, doc)
+    print(json.dumps({"document_id": args.document_id, "deleted_chunks": deleted}))
+
+
+async def process(document_id: int, job: DocumentJob, **kwargs):
+    from app.services.embedding_service import embedding_version_watcher
+    from app.services.ingestion_worker import IngestionWorker
+
+    worker = IngestionWorker()
+    async with AsyncSessionLocal() as db:
+        doc = await get_idle(db, document_id)
+        if job == DocumentJob.RECHUNK and not can_rechunk(doc):
+            sys.exit("✗ Teks halaman tidak tersimpan di page cache, gunakan replace dengan PDF-nya")
+        await enqueue_job(db, doc, job, claimed_by=worker.worker_id, **kwargs)
+
+    # Model versi embedding aktif, sama seperti startup API
+    await embedding_version_watcher.load()
+    await worker._process(document_id)
+
+    async with AsyncSessionLocal() as db:
+        doc = await db.get(HadisDocument, document_id)
+        print(json.dumps(describe(doc, await count_chunks(db, document_id)), ensure_ascii=False))
+
+
+async def rechunk(args):
+    await process(args.document_id, DocumentJob.RECHUNK, collection=args.collection)
+
+
+async def replace(args):
+    async with AsyncSessionLocal() as db:
+        doc = await get_idle(db, args.document_id)
+    if file_sha256(args.pdf) == doc.content_hash:
+        sys.exit("✗ PDF identik dengan versi sekarang")
+
+    # Salinan di UPLOAD_DIR dihapus worker setelah selesai, file asli tidak tersentuh
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}_{os.path.basename(args.pdf)}")
+    shutil.copyfile(args.pdf, path)
+    await process(args.document_id, DocumentJob.REPLACE, file_path=path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("list", help="Daftar dokumen (JSON per baris)")
+    p.add_argument("--status", choices=[s.value for s in DocumentStatus])
+    p.add_argument("--collection")
+    p.add_argument("--limit", type=int, default=1000)
+    p.set_defaults(func=list_)
+
+    p = commands.add_parser("delete", help="Hapus dokumen beserta chunk & embedding")
+    p.add_argument("document_id", type=int)
+    p.set_defaults(func=delete)
+
+    p = commands.add_parser("rechunk", help="Chunk ulang dari teks halaman tersimpan")
+    p.add_argument("document_id", type=int)
+    p.add_argument("--collection", help="Profil CHUNKER_PROFILES baru untuk dokumen ini")
+    p.set_defaults(func=rechunk)
+
+    p = commands.add_parser("replace", help="Ganti PDF dokumen")
+    p.add_argument("document_id", type=int)
+    p.add_argument("pdf")
+    p.set_defaults(func=replace)
+
+    args = parser.parse_args()
+
+    async def run():
+        await init_db()
+        await args.func(args)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Worker ingest sebagai proses terpisah dari server API.
+
+    INGEST_IN_PROCESS=false python serve.py    # worker API hanya melayani request
+    python scripts/ingest_worker.py            # di host/container yang sama atau lain
+    python scripts/ingest_worker.py --concurrency 2
+
+Mengambil job dari tabel hadis_documents (upload, rechunk, replace) dengan
+klaim SKIP LOCKED yang sama seperti worker di dalam API, jadi beberapa proses
+boleh jalan bersamaan dan job dari proses yang mati diambil alih. Model
+embedding dimuat di proses ini sendiri, jadi encode ingest tidak berbagi CPU
+maupun thread inference dengan query chat. Worker API melihat chunk baru
+lewat index memori dan cache jawaban (file bersama). Berhenti dengan
+SIGINT/SIGTERM; job yang sedang berjalan dilanjutkan saat start berikutnya.
+"""
+import argparse
+import asyncio
+import signal
+import sys
+sys.path.insert(0, '.')
+
+from app.database.connection import engine, init_db
+from app.services.embedding_service import embedding_version_watcher, get_embedding_service
+from app.services.ingestion_worker import IngestionWorker
+from app.services.pdf_processor import shutdown_pdf_pool
+from config import settings
+
+
+async def run(args):
+    await init_db()
+    await embedding_version_watcher.load()
+    await asyncio.to_thread(get_embedding_service)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker = IngestionWorker(concurrency=args.concurrency)
+    worker.start()
+    embedding_version_watcher.start()
+    print(f"✓ Worker ingest {worker.worker_id} berjalan ({worker.concurrency} job paralel)")
+
+    await stop.wait()
+    print("Menghentikan worker ingest...")
+    await worker.stop()
+    await embedding_version_watcher.stop()
+    shutdown_pdf_pool()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=settings.INGEST_WORKERS,
+                        help="Jumlah job yang diproses bersamaan")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
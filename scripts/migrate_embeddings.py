@@ -0,0 +1,294 @@
+"""Ganti model embedding tanpa downtime: embed ulang korpus ke tabel versi baru.
+
+    python scripts/migrate_embeddings.py create --model intfloat/multilingual-e5-small
+    python scripts/migrate_embeddings.py run --version 1 --max-rate 200 --threads 2
+    python scripts/migrate_embeddings.py activate --version 1
+    python scripts/migrate_embeddings.py status
+    python scripts/migrate_embeddings.py drop --version 0   # index versi lama, setelah yakin
+
+create    daftarkan versi baru di embedding_versions dan buat tabel
+          hadis_chunk_embeddings_vN (dimensi dibaca dari model)
+run       embed chunk yang belum punya vector versi ini per batch, urut chunk id
+          (titik resume disimpan tiap batch), susul chunk yang masuk selama
+          backfill, lalu CREATE INDEX CONCURRENTLY -> status ready
+activate  susul chunk terakhir lalu tukar versi aktif dalam satu transaksi;
+          worker API memuat model baru sendiri dalam EMBEDDING_VERSION_CHECK_INTERVAL.
+          Rollback = activate versi lama (selama tabelnya belum di-drop)
+drop      hapus tabel versi N (versi 0: hanya index ANN kolom hadis_chunks.embedding)
+
+Versi 0 adalah kolom hadis_chunks.embedding dengan EMBEDDING_MODEL. Beban
+dibatasi lewat --max-rate (chunk/detik) dan --threads (thread inference);
+tiap batch adalah transaksi pendek sehingga query live tidak tertahan.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+sys.path.insert(0, '.')
+
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from app.database.connection import AsyncSessionLocal, engine, init_db
+from app.database.embedding_store import EmbeddingStore, version_table
+from app.database.indexes import vector_index_ddl
+from app.models.chunk import HadisChunk
+from app.models.embedding_version import EmbeddingVersion, EmbeddingVersionStatus
+from config import settings
+
+
+async def load_store(version: int) -> EmbeddingStore:
+    if version == 0:
+        return EmbeddingStore.base()
+    async with AsyncSessionLocal() as db:
+        row = await db.get(EmbeddingVersion, version)
+    if row is None or row.status == EmbeddingVersionStatus.RETIRED:
+        sys.exit(f"✗ Versi {version} tidak ada atau sudah di-drop")
+    return EmbeddingStore.from_version(row)
+
+
+def missing_chunks(store: EmbeddingStore, after: int, limit: int):
+    """Chunk tanpa vector versi ini, urut id (anti-join ke tabel versi)"""
+    query = select(HadisChunk.id, HadisChunk.chunk_text).where(HadisChunk.id > after)
+    if store.is_base:
+        query = query.where(HadisChunk.embedding.is_(None))
+    else:
+        query = query.outerjoin(store.table, store.table.c.chunk_id == HadisChunk.id) \
+                     .where(store.table.c.chunk_id.is_(None))
+    return query.order_by(HadisChunk.id).limit(limit)
+
+
+async def save_vectors(db, store: EmbeddingStore, ids, embeddings):
+    if store.is_base:
+        await db.execute(
+            update(HadisChunk.__table__).where(HadisChunk.__table__.c.id == bindparam("chunk_id")),
+            [{"chunk_id": i, "embedding": e} for i, e in zip(ids, embeddings)]
+        )
+    else:
+        # Ingest yang sudah memakai versi ini bisa menulis chunk yang sama lebih dulu
+        await db.execute(
+            insert(store.table).on_conflict_do_nothing(),
+            [{"chunk_id": i, "embedding": e} for i, e in zip(ids, embeddings)]
+        )
+
+
+async def fill(store: EmbeddingStore, embed, batch_size: int, max_rate: float, resume: bool) -> int:
+    """Embed semua chunk yang belum punya vector versi ini; resume=True memakai & menyimpan cursor"""
+    after = 0
+    if resume and not store.is_base:
+        async with AsyncSessionLocal() as db:
+            after = (await db.get(EmbeddingVersion, store.version)).cursor
+
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count(HadisChunk.id)))).scalar()
+
+    done = 0
+    started = time.perf_counter()
+    while True:
+        batch_start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(missing_chunks(store, after, batch_size))).all()
+        if not rows:
+            return done
+
+        ids = [r.id for r in rows]
+        embeddings = await embed.generate_embeddings_batch([r.chunk_text for r in rows])
+        after = ids[-1]
+        async with AsyncSessionLocal() as db:
+            await save_vectors(db, store, ids, embeddings)
+            if resume and not store.is_base:
+                await db.execute(update(EmbeddingVersion)
+                                 .where(EmbeddingVersion.id == store.version).values(cursor=after))
+            await db.commit()
+
+        done += len(rows)
+        rate = done / (time.perf_counter() - started)
+        print(f"  v{store.version}: {done} chunk di-embed (id <= {after} dari {total} chunk, {rate:.0f}/s)",
+              flush=True)
+
+        # Throttle: batch berikutnya menunggu supaya rata-rata <= max_rate chunk/detik
+        if max_rate:
+            await asyncio.sleep(max(0.0, len(rows) / max_rate - (time.perf_counter() - batch_start)))
+
+
+async def index_state(conn, name: str):
+    """None jika index belum ada, selain itu indisvalid (False = sisa CONCURRENTLY yang gagal)"""
+    return (await conn.execute(
+        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+        {"name": name}
+    )).scalar()
+
+
+async def build_index(store: EmbeddingStore):
+    ddl = vector_index_ddl(table=store.table_name, column="embedding", name=store.index_name, concurrently=True)
+    if ddl is None:
+        return
+    # CONCURRENTLY: tulis (ingest) ke tabel tetap jalan selama index dibangun
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await index_state(conn, store.index_name) is False:
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY {store.index_name}"))
+        print(f"Membangun index {store.index_name}...", flush=True)
+        await conn.execute(text(ddl))
+        await conn.execute(text(f"ANALYZE {store.table_name}"))
+    print(f"✓ Index {store.index_name} siap")
+
+
+def load_service(store: EmbeddingStore, threads: int):
+    from app.services.embedding_service import EmbeddingService
+    return EmbeddingService(store, threads=threads)
+
+
+async def create(args):
+    from app.services.embedding_service import load_embedding_model
+
+    await init_db()
+    model = load_embedding_model(model_name=args.model)
+    dim = len(model.encode(["cek dimensi"], normalize_embeddings=True)[0])
+
+    async with AsyncSessionLocal() as db:
+        row = EmbeddingVersion(model=args.model, dim=dim, status=EmbeddingVersionStatus.BUILDING)
+        db.add(row)
+        await db.commit()
+    async with engine.begin() as conn:
+        await conn.run_sync(version_table(row.id, dim).create)
+    print(f"✓ Versi {row.id}: {args.model} ({dim} dimensi) -> hadis_chunk_embeddings_v{row.id}")
+
+
+async def run(args):
+    store = await load_store(args.version)
+    embed = load_service(store, args.threads)
+
+    print(f"Backfill v{store.version} ({store.model})...")
+    done = await fill(store, embed, args.batch_size, args.max_rate, resume=True)
+    # Chunk yang masuk selama backfill punya id di atas cursor dan sudah ikut;
+    # pass kedua menyusul chunk yang terlewat (mis. transaksi ingest yang commit belakangan)
+    done += await fill(store, embed, args.batch_size, args.max_rate, resume=False)
+    await build_index(store)
+
+    if not store.is_base:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(EmbeddingVersion)
+                .where(EmbeddingVersion.id == store.version,
+                       EmbeddingVersion.status == EmbeddingVersionStatus.BUILDING)
+                .values(status=EmbeddingVersionStatus.READY)
+            )
+            await db.commit()
+    print(f"✓ v{store.version} lengkap ({done} chunk baru di-embed)")
+
+
+async def activate(args):
+    store = await load_store(args.version)
+    if not store.is_base:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(EmbeddingVersion, store.version)
+        if row.status == EmbeddingVersionStatus.BUILDING:
+            sys.exit(f"✗ v{store.version} belum selesai, jalankan `run --version {store.version}` dulu")
+
+    async with engine.connect() as conn:
+        if vector_index_ddl() and not await index_state(conn, store.index_name):
+            sys.exit(f"✗ Index {store.index_name} belum ada/invalid, jalankan `run --version {store.version}`")
+
+    embed = load_service(store, args.threads)
+    caught_up = await fill(store, embed, args.batch_size, args.max_rate, resume=False)
+    print(f"✓ {caught_up} chunk disusulkan")
+
+    # Satu transaksi: tidak pernah ada dua versi aktif, atau tanpa versi aktif
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(EmbeddingVersion)
+            .where(EmbeddingVersion.status == EmbeddingVersionStatus.ACTIVE)
+            .values(status=EmbeddingVersionStatus.READY)
+        )
+        if not store.is_base:
+            await db.execute(
+                update(EmbeddingVersion)
+                .where(EmbeddingVersion.id == store.version)
+                .values(status=EmbeddingVersionStatus.ACTIVE, activated_at=datetime.utcnow())
+            )
+        await db.commit()
+    print(f"✓ v{store.version} ({store.model}) aktif")
+
+    # Ingest yang berjalan sebelum worker berpindah masih menulis ke versi lama
+    wait = settings.EMBEDDING_VERSION_CHECK_INTERVAL * 2
+    print(f"Menunggu {wait:.0f} detik sampai semua worker berpindah...", flush=True)
+    await asyncio.sleep(wait)
+    caught_up = await fill(store, embed, args.batch_size, args.max_rate, resume=False)
+    print(f"✓ {caught_up} chunk disusulkan setelah switch "
+          f"(dokumen yang masih di-ingest dengan model lama: jalankan `run` lagi setelah selesai)")
+
+
+async def status(args):
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count(HadisChunk.id)))).scalar()
+        rows = (await db.execute(select(EmbeddingVersion).order_by(EmbeddingVersion.id))).scalars().all()
+        stores = [(EmbeddingStore.base(), None)] + [(EmbeddingStore.from_version(r), r) for r in rows]
+        active = next((r.id for r in rows if r.status == EmbeddingVersionStatus.ACTIVE), 0)
+
+        print(f"Total chunk: {total}")
+        for store, row in stores:
+            if row is not None and row.status == EmbeddingVersionStatus.RETIRED:
+                print(f"  v{store.version} {store.model}: retired")
+                continue
+            embedded = (await db.execute(select(func.count()).select_from(store.table)
+                                         .where(store.table.c.embedding.is_not(None)))).scalar()
+            state = "active" if store.version == active else (row.status.value if row else "ready")
+            print(f"  v{store.version} {store.model} ({store.dim}d): {state}, {embedded}/{total} chunk")
+
+
+async def drop(args):
+    store = await load_store(args.version)
+    async with AsyncSessionLocal() as db:
+        active = await db.execute(select(EmbeddingVersion.id)
+                                  .where(EmbeddingVersion.status == EmbeddingVersionStatus.ACTIVE))
+        active = active.scalar() or 0
+    if store.version == active:
+        sys.exit(f"✗ v{store.version} sedang aktif, aktifkan versi lain dulu")
+
+    if store.is_base:
+        # Vector versi 0 tetap di kolomnya (rollback: run --version 0 membangun index lagi)
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {store.index_name}"))
+        print(f"✓ Index {store.index_name} dihapus")
+        return
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(text(f"DROP TABLE IF EXISTS {store.table_name}"))
+        await db.execute(update(EmbeddingVersion).where(EmbeddingVersion.id == store.version)
+                         .values(status=EmbeddingVersionStatus.RETIRED))
+        await db.commit()
+    print(f"✓ {store.table_name} dihapus")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("create", help="Daftarkan versi baru untuk sebuah model")
+    p.add_argument("--model", required=True)
+    p.set_defaults(func=create)
+
+    for name, func_, help_ in (("run", run, "Backfill + index versi"),
+                               ("activate", activate, "Jadikan versi ini aktif")):
+        p = commands.add_parser(name, help=help_)
+        p.add_argument("--version", type=int, required=True)
+        p.add_argument("--batch-size", type=int, default=256)
+        p.add_argument("--max-rate", type=float, default=0, help="Chunk per detik, 0 = tanpa batas")
+        p.add_argument("--threads", type=int, default=1, help="Thread inference (sisakan core untuk API)")
+        p.set_defaults(func=func_)
+
+    p = commands.add_parser("status", help="Progres semua versi")
+    p.set_defaults(func=status)
+
+    p = commands.add_parser("drop", help="Hapus vector/index versi yang tidak aktif")
+    p.add_argument("--version", type=int, required=True)
+    p.set_defaults(func=drop)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
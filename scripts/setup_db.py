@@ -1,17 +1,72 @@
+import argparse
 import asyncio
 import sys
 sys.path.insert(0, '.')
 
-from app.database.connection import engine, Base
+from sqlalchemy import text, select, update, bindparam
+from app.database.connection import engine, Base, AsyncSessionLocal, init_db
+from app.database.indexes import ensure_vector_index, rebuild_vector_index
 from app.models.document import HadisDocument
 from app.models.chunk import HadisChunk
-from app.models.chat_history import ChatHistory
+from app.models.chat_history import ChatHistory, ChatSession
+from app.models.embedding_version import EmbeddingVersion
+from app.utils.text import normalize_text, text_hash
 
 async def setup_database():
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        # Tabel versi embedding (scripts/migrate_embeddings.py) bergantung pada hadis_chunks
+        await conn.execute(text(
+            "DO $$ DECLARE t text; BEGIN "
+            "FOR t IN SELECT tablename FROM pg_tables WHERE tablename LIKE 'hadis\\_chunk\\_embeddings\\_v%' "
+            "LOOP EXECUTE format('DROP TABLE %I', t); END LOOP; END $$"
+        ))
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_vector_index(conn)
     print("✓ Database ready")
 
+async def reindex():
+    async with engine.begin() as conn:
+        await rebuild_vector_index(conn)
+        await conn.execute(text("ANALYZE hadis_chunks"))
+    print("✓ Vector index rebuilt")
+
+async def backfill(batch_size: int = 1000):
+    """Isi lexical_text & text_hash chunk lama (sebelum kolomnya ada) tanpa chunk ulang"""
+    await init_db()
+    total, last_id = 0, 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(HadisChunk.id, HadisChunk.chunk_text)
+                .where(HadisChunk.id > last_id, HadisChunk.lexical_text.is_(None))
+                .order_by(HadisChunk.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            await db.execute(
+                update(HadisChunk.__table__)
+                .where(HadisChunk.__table__.c.id == bindparam("chunk_id"))
+                .values(lexical_text=bindparam("lexical"), text_hash=bindparam("hash")),
+                [{"chunk_id": r.id, "lexical": normalize_text(r.chunk_text), "hash": text_hash(r.chunk_text)}
+                 for r in rows]
+            )
+            await db.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+        print(f"  {total} chunk")
+    print(f"✓ Backfill selesai: {total} chunk")
+
 if __name__ == "__main__":
-    asyncio.run(setup_database())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reindex", action="store_true",
+                        help="Buat ulang index vector tanpa menghapus data")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Upgrade skema lalu isi kolom lexical/text_hash chunk lama, tanpa menghapus data")
+    args = parser.parse_args()
+    if args.backfill:
+        asyncio.run(backfill())
+    else:
+        asyncio.run(reindex() if args.reindex else setup_database())
@@ -0,0 +1,77 @@
+"""Server produksi: gunicorn dengan worker uvicorn, model dimuat sekali sebelum fork.
+
+    python serve.py                 # SERVER_WORKERS worker, port APP_PORT
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+
+Dengan SERVER_PRELOAD master menjalankan app.lifecycle.preload() (skema DB,
+versi embedding aktif, bobot model) lalu fork; bobot dibagi copy-on-write
+antar worker. Tiap worker baru menerima koneksi setelah lifespan warmup
+selesai (inference pertama, pool DB, Ollama, index memori). Probe:
+/health/live dan /health/ready. Metrik semua worker digabung lewat
+PROMETHEUS_MULTIPROC_DIR (dikosongkan tiap start). Dengan
+INGEST_IN_PROCESS=false ingest dijalankan terpisah lewat
+scripts/ingest_worker.py. run.py tetap untuk development (reload).
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+from config import settings
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        if settings.SERVER_PRELOAD:
+            from app.lifecycle import preload
+            preload()
+        return app
+
+
+def metrics_dir() -> str:
+    """Direktori metrik multiprocess yang bersih; harus di-set sebelum prometheus_client di-import"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or \
+        os.path.join(tempfile.gettempdir(), f"hadis_metrics_{settings.APP_PORT}")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def child_exit(server, worker):
+    # File gauge worker yang mati dibuang; counter/histogram-nya tetap terhitung
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument("--bind", default=f"0.0.0.0:{settings.APP_PORT}")
+    args = parser.parse_args()
+    metrics_dir()
+
+    Server({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": settings.SERVER_PRELOAD,
+        "timeout": settings.SERVER_TIMEOUT,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "child_exit": child_exit,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
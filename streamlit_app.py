@@ -1,5 +1,7 @@
 import streamlit as st
+import json
 import requests
+import time
 import uuid
 
 # Config
@@ -23,18 +25,36 @@ with st.sidebar:
     
     if uploaded_file:
         if st.button("Upload & Proses", use_container_width=True):
-            with st.spinner("Memproses PDF..."):
-                files = {"file": (uploaded_file.name, uploaded_file, "application/pdf")}
-                try:
-                    response = requests.post(f"{API_URL}/upload/", files=files)
-                    if response.status_code == 200:
-                        data = response.json()
+            files = {"file": (uploaded_file.name, uploaded_file, "application/pdf")}
+            try:
+                response = requests.post(f"{API_URL}/upload/", files=files)
+                if response.status_code in (200, 202):
+                    data = response.json()
+                    st.info(f"Total halaman: {data.get('total_pages', 'N/A')}")
+                    
+                    # Ingest berjalan di background, pantau progres per halaman
+                    progress = st.progress(0.0, text="Memproses PDF...")
+                    while data["status"] == "processing":
+                        time.sleep(1)
+                        data = requests.get(f"{API_URL}/upload/{data['document_id']}").json()
+                        progress.progress(
+                            min(data["progress"], 1.0),
+                            text=f"Memproses halaman {data['processed_pages']}/{data['total_pages']}"
+                        )
+                    
+                    if data["status"] == "completed":
                         st.success(f"✅ {data['filename']} berhasil diupload!")
-                        st.info(f"Total halaman: {data.get('total_pages', 'N/A')}")
                     else:
-                        st.error(f"❌ Error: {response.text}")
-                except Exception as e:
-                    st.error(f"❌ Gagal upload: {str(e)}")
+                        st.error(f"❌ Gagal memproses: {data.get('error')}")
+                else:
+                    st.error(f"❌ Error: {response.text}")
+            except Exception as e:
+                st.error(f"❌ Gagal upload: {str(e)}")
+    
+    st.markdown("---")
+    MODES = {"Jawaban": "answer", "Otomatis (sumber saja saat sibuk)": "auto", "Hanya sumber (cepat)": "retrieve"}
+    mode_label = st.radio("Mode", list(MODES), help="Hanya sumber tidak memakai LLM sama sekali")
+    mode = MODES[mode_label]
     
     st.markdown("---")
     if st.button("🗑️ Hapus Riwayat Chat", use_container_width=True):
@@ -42,6 +62,27 @@ with st.sidebar:
         st.session_state.session_id = str(uuid.uuid4())
         st.rerun()
 
+def show_sources(sources):
+    for i, src in enumerate(sources, 1):
+        meta = src.get("metadata") or {}
+        info = ", ".join(f"{k.title()}: {meta[k]}" for k in ("kitab", "perawi", "derajat") if meta.get(k))
+        st.markdown(f"**Sumber {i}** (Halaman {src['page_number']}, Similarity: {src['similarity_score']:.2f})"
+                    + (f"  \n{info}" if info else ""))
+        st.text(src['text'])
+        st.markdown("---")
+
+def iter_sse(response):
+    """Parse Server-Sent Events dari response requests (stream=True)"""
+    event, data = None, []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
 # Main content
 st.title("💬 Chat dengan Hadis")
 st.caption("Tanyakan tentang hadis yang telah diupload")
@@ -51,11 +92,8 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
         if message["role"] == "assistant" and "sources" in message:
-            with st.expander("📚 Lihat Sumber"):
-                for i, src in enumerate(message["sources"], 1):
-                    st.markdown(f"**Sumber {i}** (Halaman {src['page_number']}, Similarity: {src['similarity_score']:.2f})")
-                    st.text(src['text'])
-                    st.markdown("---")
+            with st.expander("📚 Lihat Sumber", expanded=not message.get("answered", True)):
+                show_sources(message["sources"])
 
 # Chat input
 if prompt := st.chat_input("Tanyakan tentang hadis..."):
@@ -64,44 +102,64 @@ if prompt := st.chat_input("Tanyakan tentang hadis..."):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Get bot response
+    # Get bot response (streaming SSE: sumber dulu, lalu token bertahap)
     with st.chat_message("assistant"):
-        with st.spinner("Mencari jawaban..."):
-            try:
-                response = requests.post(
-                    f"{API_URL}/chat/",
-                    json={"query": prompt, "session_id": st.session_state.session_id}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    answer = data["answer"]
-                    sources = data["sources"]
-                    
-                    st.markdown(answer)
-                    
-                    # Save to history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": answer,
-                        "sources": sources
-                    })
-                    
-                    # Show sources
-                    with st.expander("📚 Lihat Sumber"):
-                        for i, src in enumerate(sources, 1):
-                            st.markdown(f"**Sumber {i}** (Halaman {src['page_number']}, Similarity: {src['similarity_score']:.2f})")
-                            st.text(src['text'])
-                            st.markdown("---")
-                else:
-                    error_msg = f"Error {response.status_code}: {response.text}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        try:
+            response = requests.post(
+                f"{API_URL}/chat/stream",
+                json={"query": prompt, "session_id": st.session_state.session_id, "mode": mode},
+                stream=True
+            )
             
-            except Exception as e:
-                error_msg = f"Gagal menghubungi server: {str(e)}"
+            if response.status_code == 200:
+                answer_box = st.empty()
+                answer_box.markdown("_Mencari sumber..._")
+                sources_box = st.empty()
+                answer, sources, served = "", [], mode
+                
+                for event, data in iter_sse(response):
+                    if event == "sources":
+                        # Sumber tampil segera, terbuka selama jawaban belum ada
+                        sources = data
+                        with sources_box.container():
+                            with st.expander("📚 Lihat Sumber", expanded=not answer):
+                                show_sources(sources)
+                        if mode != "retrieve":
+                            answer_box.markdown("_Menyusun jawaban..._")
+                    elif event == "token":
+                        answer += data["text"]
+                        answer_box.markdown(answer + "▌")
+                    elif event == "error":
+                        answer = answer or data["detail"]
+                    elif event == "done":
+                        served = data.get("mode", served)
+                
+                if not answer and served == "retrieve":
+                    answer = ("_Menampilkan sumber saja_" if mode == "retrieve"
+                              else "_Server sedang sibuk, menampilkan sumber saja_")
+                answer_box.markdown(answer)
+                
+                # Save to history
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": answer,
+                    "sources": sources,
+                    "answered": served != "retrieve"
+                })
+            elif response.status_code in (429, 503):
+                retry = response.headers.get("Retry-After", "beberapa")
+                error_msg = f"{response.json().get('detail')} (coba lagi dalam {retry} detik)"
+                st.warning(error_msg)
+                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+            else:
+                error_msg = f"Error {response.status_code}: {response.text}"
                 st.error(error_msg)
                 st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        
+        except Exception as e:
+            error_msg = f"Gagal menghubungi server: {str(e)}"
+            st.error(error_msg)
+            st.session_state.messages.append({"role": "assistant", "content": error_msg})
 
 # Footer
 st.markdown("---")